@@ -1,162 +1,275 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
 from typing import Literal
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, START, StateGraph
 from langgraph.types import Send
 
-from agent.nodes import MainInputState, MainOverallState, OverallState, QuestionOverallState, check_relevance_accuracy, check_relevance_questions, choose_best_questions, choose_best_response, continue_subtopic_gen, generate_questions_1, generate_questions_2, generate_response1, generate_response2, generate_subtopics, initialize_db, output_to_csv, output_to_jsonl, retrieve_base_dataset, retrieve_dataset, retrieve_next_subtopic, retrieve_subtopics, route_gen_answer, route_input_mode, save_answers_to_db, save_as_jsonl, save_questions_to_db, save_response_to_db, save_subtopic_to_db, score_subtopics
+from agent.config import ANSWER_CASCADE, CASCADE_MIN_SCORE, GROUNDED_ANSWERS, MAX_ANSWER_ATTEMPTS, MAX_QUESTION_ATTEMPTS, QUESTION_GENERATION_CONCURRENCY, RESPONSE_GENERATION_WINDOW
+from agent.db import get_db
+from agent.ratelimit import concurrency_window
+from agent.scheduler import run_sliding_window
+from agent.writer import get_writer
+from agent.nodes import AnswerTaskState, MainInputState, MainOverallState, OverallState, QuestionOverallState, QuestionTaskState, check_relevance_accuracy, check_relevance_questions, choose_best_questions, choose_best_response, close_db, continue_subtopic_gen, draft_response, generate_question_sets, generate_responses, generate_subtopics, grade_draft, initialize_db, num_candidates, output_to_columnar, output_to_csv, output_to_jsonl, retrieve_base_dataset, retrieve_passages, retrieve_pending_answers, retrieve_subtopics, route_input_mode, run_response_batch, save_as_jsonl, save_questions_to_db, save_subtopic_to_db, score_subtopics
+from agent.queries import select_unanswered
+
+logger = logging.getLogger(__name__)
 
 def dummy_node(state: OverallState):
     return state
 
 def regenerate_response(state: OverallState) -> Literal[END, "dummy_node"]: # type: ignore
-    if state["is_relevant_accurate"]:
+    if state["is_relevant_accurate"] or state["attempts"] >= MAX_ANSWER_ATTEMPTS:
         return END
     else:
         return "dummy_node"
 
 
 gen_response_builder = StateGraph(OverallState)
-gen_response_builder.add_node("generate_response1", generate_response1)
-gen_response_builder.add_node("generate_response2", generate_response2)
+gen_response_builder.add_node("generate_responses", generate_responses)
 gen_response_builder.add_node("choose_best_response", choose_best_response)
 gen_response_builder.add_node("check_relevance_accuracy", check_relevance_accuracy)
 gen_response_builder.add_node("dummy_node", dummy_node)
 
-gen_response_builder.add_edge(START, "dummy_node")
-gen_response_builder.add_edge("dummy_node", "generate_response1")
-gen_response_builder.add_edge("dummy_node", "generate_response2")
-gen_response_builder.add_edge("generate_response1", "choose_best_response")
-gen_response_builder.add_edge("generate_response2", "choose_best_response")
+if GROUNDED_ANSWERS:
+    gen_response_builder.add_node("retrieve_passages", retrieve_passages)
+    gen_response_builder.add_edge(START, "retrieve_passages")
+    gen_response_builder.add_edge("retrieve_passages", "dummy_node")
+else:
+    gen_response_builder.add_edge(START, "dummy_node")
+gen_response_builder.add_edge("dummy_node", "generate_responses")
+gen_response_builder.add_edge("generate_responses", "choose_best_response")
 gen_response_builder.add_edge("choose_best_response", "check_relevance_accuracy")
 gen_response_builder.add_conditional_edges("check_relevance_accuracy", regenerate_response)
 
 gen_response = gen_response_builder.compile()
+# Invoked from inside the cascade subgraph. Under a checkpointer it would store
+# every step again in a namespace of its own; the escalate_response step is
+# checkpointed as a whole instead and simply reruns after an interruption.
+escalation_graph = gen_response_builder.compile(checkpointer=False)
 
 def dummy_questions_node(state: QuestionOverallState):
     return state
 
 def regenerate_questions(state: QuestionOverallState) -> Literal[END, "dummy_questions_node"]: # type: ignore
-    if state["is_relevant"]:
+    if state["is_relevant"] or state["attempts"] >= MAX_QUESTION_ATTEMPTS:
         return END
     else:
         return "dummy_questions_node"
 
 gen_questions_builder = StateGraph(QuestionOverallState)
-gen_questions_builder.add_node("generate_questions1", generate_questions_1)
-gen_questions_builder.add_node("generate_questions2", generate_questions_2)
+gen_questions_builder.add_node("generate_question_sets", generate_question_sets)
 gen_questions_builder.add_node("choose_best_questions", choose_best_questions)
 gen_questions_builder.add_node("check_relevance_questions", check_relevance_questions)
 gen_questions_builder.add_node("dummy_questions_node", dummy_questions_node)
 
 gen_questions_builder.add_edge(START, "dummy_questions_node")
-gen_questions_builder.add_edge("dummy_questions_node", "generate_questions1")
-gen_questions_builder.add_edge("dummy_questions_node", "generate_questions2")
-gen_questions_builder.add_edge("generate_questions1", "choose_best_questions")
-gen_questions_builder.add_edge("generate_questions2", "choose_best_questions")
+gen_questions_builder.add_edge("dummy_questions_node", "generate_question_sets")
+gen_questions_builder.add_edge("generate_question_sets", "choose_best_questions")
 gen_questions_builder.add_edge("choose_best_questions", "check_relevance_questions")
 gen_questions_builder.add_conditional_edges("check_relevance_questions", regenerate_questions)
 
 gen_questions = gen_questions_builder.compile()
 
-async def call_gen_response_subgraph(state: OverallState):
-    response = await gen_response.ainvoke({
+def escalate_draft(state: OverallState) -> Literal[END, "escalate_response"]: # type: ignore
+    if state["is_relevant_accurate"] and state["draft_score"] >= CASCADE_MIN_SCORE:
+        return END
+    else:
+        return "escalate_response"
+
+async def escalate_response(state: OverallState):
+    # A relevant but low-scoring draft still competes as a candidate; an
+    # irrelevant one is only passed along as rejected context.
+    draft = {"responses": [state["best_response"]]} if state["is_relevant_accurate"] else {"rejected_responses": [state["best_response"]]}
+    response = await escalation_graph.ainvoke({
         "topic": state["topic"],
         "subtopic": state["subtopic"],
         "question": state["question"],
+        "num_candidates": state["num_candidates"],
+        **({"passages": state["passages"]} if "passages" in state else {}),
+        **draft,
     })
     return {
-        "best_responses": [{
-            "question": state["question"],
-            "response": response["best_response"],
-            "subtopic_id": state["subtopic_id"],
-        }]
+        "best_response": response["best_response"],
+        "attempts": state["attempts"] + response["attempts"],
+        "tier": "creative"
     }
 
-def continue_gen_response(state: MainOverallState):
-    return [Send("call_gen_response_subgraph", {
-        "question": x["question"],
-        "topic": x["topic"],
-        "subtopic": x["subtopic"],
-        "subtopic_id": x["subtopic_id"]
-    }) for x in state["dataset"]]
+gen_response_cascade_builder = StateGraph(OverallState)
+gen_response_cascade_builder.add_node("draft_response", draft_response)
+gen_response_cascade_builder.add_node("grade_draft", grade_draft)
+gen_response_cascade_builder.add_node("escalate_response", escalate_response)
+
+if GROUNDED_ANSWERS:
+    gen_response_cascade_builder.add_node("retrieve_passages", retrieve_passages)
+    gen_response_cascade_builder.add_edge(START, "retrieve_passages")
+    gen_response_cascade_builder.add_edge("retrieve_passages", "draft_response")
+else:
+    gen_response_cascade_builder.add_edge(START, "draft_response")
+gen_response_cascade_builder.add_edge("draft_response", "grade_draft")
+gen_response_cascade_builder.add_conditional_edges("grade_draft", escalate_draft)
+gen_response_cascade_builder.add_edge("escalate_response", END)
 
-async def call_gen_answers_subgraph(state: OverallState):
-    response = await gen_response.ainvoke({
+gen_response_cascade = gen_response_cascade_builder.compile()
+
+# Subgraph that answers a single question in the answer generation modes.
+answer_graph = gen_response_cascade if ANSWER_CASCADE else gen_response
+# The answer queue invokes the subgraph many times from one node, which a
+# checkpointer cannot tell apart; the queue persists its progress through the
+# answer writer instead.
+queue_answer_graph = (gen_response_cascade_builder if ANSWER_CASCADE else gen_response_builder).compile(checkpointer=False)
+
+async def call_gen_response_subgraph(state: AnswerTaskState):
+    response = await answer_graph.ainvoke({
         "topic": state["topic"],
         "subtopic": state["subtopic"],
         "question": state["question"],
+        "num_candidates": state["num_candidates"],
     })
+    now = datetime.now()
+    created_at = f"{now.strftime('%m-%d-%Y')}_{now.strftime('%H:%M:%S')}"
+    # The row is committed with the writer's next batch; save_as_jsonl and
+    # close_db flush the writer and surface a failed insert.
+    writer = get_writer(state["filename_db"])
+    qa_id = await writer.reserve_answer_id()
+    writer.insert_answer(
+        qa_id, created_at, state["question"], response["best_response"], state["subtopic_id"], response["attempts"], response.get("tier", "creative")
+    )
     return {
-        "best_responses": [{
-            "qa_id": state["qa_id"],
-            "question": state["question"],
-            "response": response["best_response"],
-            "subtopic_id": state["subtopic_id"],
-        }]
+        "saved_qa_ids": [qa_id]
     }
 
-def continue_gen_answers(state: MainOverallState):
-    return [Send("call_gen_answers_subgraph", {
-        "qa_id": x["qa_id"],
+def continue_gen_response(state: MainOverallState):
+    if not state["dataset"]:
+        return "close_db"
+    return [Send("call_gen_response_subgraph", {
+        "filename_db": state["filename_db"],
         "question": x["question"],
         "topic": x["topic"],
         "subtopic": x["subtopic"],
-        "subtopic_id": x["subtopic_id"]
+        "subtopic_id": x["subtopic_id"],
+        "num_candidates": num_candidates(state["mode"]),
     }) for x in state["dataset"]]
 
-async def call_gen_questions_subgraph(state: MainOverallState):
-    current_index = state.get("current_subtopic_index", 0)
-    response = await gen_questions.ainvoke({
-        "topic": state["topic"],
-        "subtopic": state["subtopics"][current_index]["subtopic"],
-        "subtopic_id": state["subtopics"][current_index]["id"]
-    })
+async def run_answer_queue(state: MainOverallState):
+    # Rows answered before an interrupted run was resumed are not redone.
+    qa_ids = [row["qa_id"] for row in state["dataset"]]
+    unanswered = await get_db(state["filename_db"]).aread(lambda cursor: select_unanswered(cursor, qa_ids))
+    dataset = [row for row in state["dataset"] if row["qa_id"] in unanswered]
+    remaining = Counter(row["subtopic_id"] for row in dataset)
+    failed_subtopics: set[int] = set()
+    mode_candidates = num_candidates(state["mode"])
+
+    async def answer(row: dict) -> dict:
+        return await queue_answer_graph.ainvoke({
+            "topic": row["topic"],
+            "subtopic": row["subtopic"],
+            "question": row["question"],
+            "num_candidates": mode_candidates,
+        })
+
+    writer = get_writer(state["filename_db"])
+    progress = get_stream_writer()
+    finished = Counter()
+    updates: dict[int, list[asyncio.Future]] = {}
+    marking: list[asyncio.Task] = []
+
+    async def mark_answered(subtopic_id: int, futures: list[asyncio.Future]):
+        # A subtopic only counts as answered once all of its answers are committed.
+        try:
+            await asyncio.gather(*futures)
+        except Exception as error:
+            logger.warning("Not marking subtopic %s answered, saving an answer failed: %r", subtopic_id, error)
+            return
+        writer.mark_subtopic_answered(subtopic_id)
+
+    async def on_done(row: dict, response: dict | None, error: BaseException | None):
+        subtopic_id = row["subtopic_id"]
+        remaining[subtopic_id] -= 1
+        finished["failed" if error is not None else "answered"] += 1
+        event = {"answered": finished["answered"], "failed": finished["failed"], "total": len(dataset)}
+        if error is not None:
+            logger.warning("Answering question %s of subtopic %s failed: %r", row["qa_id"], subtopic_id, error)
+            failed_subtopics.add(subtopic_id)
+            progress(event | {"qa_id": row["qa_id"], "subtopic_id": subtopic_id, "error": repr(error)})
+            return
+        progress(event)
+        updates.setdefault(subtopic_id, []).append(
+            writer.update_answer(row["qa_id"], response["best_response"], response["attempts"], response.get("tier", "creative")) # type: ignore
+        )
+        if remaining[subtopic_id] == 0 and subtopic_id not in failed_subtopics:
+            marking.append(asyncio.create_task(mark_answered(subtopic_id, updates.pop(subtopic_id))))
+
+    try:
+        answered, failed = await run_sliding_window(dataset, answer, RESPONSE_GENERATION_WINDOW, on_done)
+    finally:
+        try:
+            await writer.flush()
+        finally:
+            await asyncio.gather(*marking)
+            await writer.flush()
+    return { "status": f"run_answer_queue success! {answered} answered, {failed} failed" }
+
+async def call_gen_questions_subgraph(state: QuestionTaskState):
+    async with concurrency_window("gen_questions", QUESTION_GENERATION_CONCURRENCY):
+        response = await gen_questions.ainvoke({
+            "topic": state["topic"],
+            "subtopic": state["subtopic"],
+            "subtopic_id": state["subtopic_id"],
+            "num_candidates": state["num_candidates"],
+        })
+    await save_questions_to_db(state["filename_db"], state["subtopic_id"], response["best_set"], response["attempts"])
     return {
-        "best_question_set": [(state["subtopics"][current_index]["id"], x) for x in response["best_set"]],
-        "current_subtopic_index": current_index + 1,
+        "questions_saved": [state["subtopic_id"]],
     }
 
-def continue_gen_questions(state: MainOverallState) -> Literal["call_gen_questions_subgraph", END]: # type: ignore
-    if state.get("current_subtopic_index", 0) < len(state["subtopics"]):
-        return "call_gen_questions_subgraph"
-    else:
-        return END
+def continue_gen_questions(state: MainOverallState):
+    if not state["subtopics"]:
+        return "close_db"
+    return [Send("call_gen_questions_subgraph", {
+        "filename_db": state["filename_db"],
+        "topic": state["topic"],
+        "subtopic": x["subtopic"],
+        "subtopic_id": x["id"],
+        "num_candidates": num_candidates(state["mode"]),
+    }) for x in state["subtopics"]]
 
 main_builder = StateGraph(MainOverallState, input=MainInputState, output=MainOverallState)
 main_builder.add_node("retrieve_base_dataset", retrieve_base_dataset)
 main_builder.add_node("call_gen_response_subgraph", call_gen_response_subgraph)
-main_builder.add_node("call_gen_answers_subgraph", call_gen_answers_subgraph)
 main_builder.add_node("call_gen_questions_subgraph", call_gen_questions_subgraph)
 main_builder.add_node("initialize_db", initialize_db)
 main_builder.add_node("save_subtopic_to_db", save_subtopic_to_db)
-main_builder.add_node("save_questions_to_db", save_questions_to_db)
-main_builder.add_node("save_response_to_db", save_response_to_db)
 main_builder.add_node("save_as_jsonl", save_as_jsonl)
 main_builder.add_node("output_to_jsonl", output_to_jsonl)
 main_builder.add_node("output_to_csv", output_to_csv)
+main_builder.add_node("output_to_columnar", output_to_columnar)
 main_builder.add_node("generate_subtopics", generate_subtopics)
 main_builder.add_node("rank_subtopics", score_subtopics)
 main_builder.add_node("retrieve_subtopics", retrieve_subtopics)
-main_builder.add_node("retrieve_next_subtopic", retrieve_next_subtopic)
-main_builder.add_node("retrieve_dataset", retrieve_dataset)
-main_builder.add_node("save_answers_to_db", save_answers_to_db)
+main_builder.add_node("retrieve_pending_answers", retrieve_pending_answers)
+main_builder.add_node("run_answer_queue", run_answer_queue)
+main_builder.add_node("run_response_batch", run_response_batch)
+main_builder.add_node("close_db", close_db)
 
 main_builder.add_edge(START, "initialize_db")
 main_builder.add_conditional_edges("initialize_db", route_input_mode)
-main_builder.add_conditional_edges("retrieve_base_dataset", continue_gen_response, ["call_gen_response_subgraph"]) # type: ignore
-main_builder.add_edge("call_gen_response_subgraph", "save_response_to_db")
-main_builder.add_edge("save_response_to_db", "save_as_jsonl")
-main_builder.add_edge("save_as_jsonl", END)
+main_builder.add_conditional_edges("retrieve_base_dataset", continue_gen_response, ["call_gen_response_subgraph", "close_db"]) # type: ignore
+main_builder.add_edge("call_gen_response_subgraph", "save_as_jsonl")
+main_builder.add_edge("save_as_jsonl", "close_db")
 main_builder.add_edge("generate_subtopics", "rank_subtopics")
 main_builder.add_conditional_edges("rank_subtopics", continue_subtopic_gen)
-main_builder.add_edge("save_subtopic_to_db", END)
-main_builder.add_edge("retrieve_subtopics", "call_gen_questions_subgraph")
-main_builder.add_edge("call_gen_questions_subgraph", "save_questions_to_db")
-main_builder.add_conditional_edges("save_questions_to_db", continue_gen_questions)
-main_builder.add_edge("retrieve_next_subtopic", "retrieve_dataset")
-main_builder.add_conditional_edges("retrieve_dataset", continue_gen_answers, ["call_gen_answers_subgraph"]) # type: ignore
-main_builder.add_edge("call_gen_answers_subgraph", "save_answers_to_db")
-main_builder.add_conditional_edges("save_answers_to_db", route_gen_answer)
-main_builder.add_edge("output_to_jsonl", END)
-main_builder.add_edge("output_to_csv", END)
+main_builder.add_edge("save_subtopic_to_db", "close_db")
+main_builder.add_conditional_edges("retrieve_subtopics", continue_gen_questions, ["call_gen_questions_subgraph", "close_db"]) # type: ignore
+main_builder.add_edge("call_gen_questions_subgraph", "close_db")
+main_builder.add_edge("retrieve_pending_answers", "run_answer_queue")
+main_builder.add_edge("run_answer_queue", "close_db")
+main_builder.add_edge("run_response_batch", "close_db")
+main_builder.add_edge("output_to_jsonl", "close_db")
+main_builder.add_edge("output_to_csv", "close_db")
+main_builder.add_edge("output_to_columnar", "close_db")
+main_builder.add_edge("close_db", END)
 
 graph = main_builder.compile()
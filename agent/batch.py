@@ -0,0 +1,194 @@
+"""Offline batch execution of answer generation requests.
+
+Requests are serialized into an OpenAI/Azure batch JSONL file, submitted
+through a pluggable `BatchClient`, polled until the batch finishes and parsed
+back into structured outputs. `AzureBatchClient` talks to the real batch
+endpoint, `LocalBatchClient` processes the same file in-process with any async
+handler (a chat model or a fake) so the flow can run without the provider.
+"""
+
+import asyncio
+import json
+import os
+from collections.abc import Awaitable, Callable
+from typing import Any, Protocol, TypeVar
+
+from langchain_core.messages import BaseMessage, convert_to_messages, convert_to_openai_messages
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from openai import AsyncAzureOpenAI
+from pydantic import BaseModel, ValidationError
+
+from agent.config import BATCH_ENDPOINT
+
+T = TypeVar("T", bound=BaseModel)
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchClient(Protocol):
+    async def submit(self, input_path: str) -> str:
+        """Upload the batch input file and create the batch, returning its id."""
+        ...
+
+    async def status(self, batch_id: str) -> str:
+        """Return the provider's batch status (`completed`, `in_progress`, ...)."""
+        ...
+
+    async def download(self, batch_id: str, output_path: str):
+        """Write the batch output JSONL file to `output_path`."""
+        ...
+
+
+class AzureBatchClient:
+    """Azure OpenAI Batch API client."""
+
+    def __init__(self, azure_endpoint: str, api_key: str, api_version: str):
+        self.client = AsyncAzureOpenAI(azure_endpoint=azure_endpoint, api_key=api_key, api_version=api_version)
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            batch_file = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_ENDPOINT,  # type: ignore
+            completion_window="24h",
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        batch = await self.client.batches.retrieve(batch_id)
+        return batch.status
+
+    async def download(self, batch_id: str, output_path: str):
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.output_file_id is None:
+            raise RuntimeError(f"Batch {batch_id} finished with status {batch.status!r} and no output file")
+        content = await self.client.files.content(batch.output_file_id)
+        with open(output_path, "wb") as f:
+            f.write(content.read())
+
+
+class LocalBatchClient:
+    """Processes batch input files in-process with `handler(body) -> response body`."""
+
+    def __init__(self, handler: Callable[[dict[str, Any]], Awaitable[dict[str, Any]]], concurrency: int = 8):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.outputs: dict[str, list[dict[str, Any]]] = {}
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(request: dict[str, Any]) -> dict[str, Any]:
+            async with semaphore:
+                try:
+                    body = await self.handler(request["body"])
+                except Exception as error:
+                    return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(error)}}
+            return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+
+        batch_id = f"local-{len(self.outputs) + 1}"
+        self.outputs[batch_id] = await asyncio.gather(*[process(request) for request in requests])
+        return batch_id
+
+    async def status(self, batch_id: str) -> str:
+        return "completed" if batch_id in self.outputs else "failed"
+
+    async def download(self, batch_id: str, output_path: str):
+        with open(output_path, "w", encoding="utf-8") as f:
+            for line in self.outputs[batch_id]:
+                f.write(json.dumps(line) + "\n")
+
+
+def chat_model_handler(llm: Any) -> Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]:
+    """Adapt a LangChain chat model into a `LocalBatchClient` handler."""
+    async def handler(body: dict[str, Any]) -> dict[str, Any]:
+        kwargs = {key: body[key] for key in ("tools", "tool_choice", "n") if key in body}
+        result = await llm.agenerate([convert_to_messages(body["messages"])], **kwargs)
+        choices = []
+        for i, generation in enumerate(result.generations[0]):
+            message = convert_to_openai_messages(generation.message)
+            choices.append({"index": i, "message": message, "finish_reason": "tool_calls"})
+        return {"object": "chat.completion", "model": body["model"], "choices": choices}
+    return handler
+
+
+def build_request(custom_id: str, deployment: str, query: list[BaseMessage], schema: type[BaseModel], n: int, temperature: float | None) -> dict[str, Any]:
+    tool = convert_to_openai_tool(schema)
+    body: dict[str, Any] = {
+        "model": deployment,
+        "messages": convert_to_openai_messages(query),
+        "tools": [tool],
+        "tool_choice": {"type": "function", "function": {"name": tool["function"]["name"]}},
+    }
+    if n > 1:
+        body["n"] = n
+    if temperature is not None:
+        body["temperature"] = temperature
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def write_batch_file(path: str, requests: list[dict[str, Any]]):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request) + "\n")
+
+
+def parse_choice(schema: type[T], choice: dict[str, Any]) -> T:
+    tool_calls = choice["message"].get("tool_calls") or []
+    if not tool_calls:
+        raise ValueError(f"Expected a {schema.__name__} tool call")
+    arguments = tool_calls[0]["function"]["arguments"]
+    return schema.model_validate(json.loads(arguments) if isinstance(arguments, str) else arguments)
+
+
+def read_batch_results(path: str, schema: type[T]) -> tuple[dict[str, list[T]], dict[str, str]]:
+    """Parse a batch output file into per-request candidates and per-request errors."""
+    results: dict[str, list[T]] = {}
+    errors: dict[str, str] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            custom_id = item["custom_id"]
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                errors[custom_id] = json.dumps(item.get("error") or response.get("body"))
+                continue
+            try:
+                results[custom_id] = [parse_choice(schema, choice) for choice in response["body"]["choices"]]
+            except (KeyError, ValueError, ValidationError) as error:
+                errors[custom_id] = str(error)
+    return results, errors
+
+
+async def wait_for_batch(client: BatchClient, batch_id: str, poll_interval: float) -> str:
+    while True:
+        status = await client.status(batch_id)
+        if status in TERMINAL_STATUSES:
+            return status
+        await asyncio.sleep(poll_interval)
+
+
+_batch_client: BatchClient | None = None
+
+
+def set_batch_client(client: BatchClient | None):
+    global _batch_client
+    _batch_client = client
+
+
+def get_batch_client() -> BatchClient:
+    global _batch_client
+    if _batch_client is None:
+        _batch_client = AzureBatchClient(
+            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT_GPT4O"],
+            api_key=os.environ["AZURE_OPENAI_GPT4O_API_KEY"],
+            api_version="2025-03-01-preview",
+        )
+    return _batch_client
@@ -0,0 +1,40 @@
+"""Okapi BM25 ranking over small in-memory document sets."""
+
+import math
+from collections import Counter
+
+from agent.similarity import tokenize
+
+K1 = 1.5
+B = 0.75
+
+
+def idf(document_count: int, document_frequency: int) -> float:
+    """BM25 idf with the +1 inside the log, which keeps it positive even for terms in every document."""
+    return math.log((document_count - document_frequency + 0.5) / (document_frequency + 0.5) + 1)
+
+
+def term_score(term_frequency: int, document_length: int, average_length: float, term_idf: float) -> float:
+    norm = K1 * (1 - B + B * document_length / average_length) if average_length else K1
+    return term_idf * term_frequency * (K1 + 1) / (term_frequency + norm)
+
+
+class BM25:
+    def __init__(self, documents: list[str]):
+        self.term_counts = [Counter(tokenize(document)) for document in documents]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        self.idf = {term: idf(len(documents), frequency) for term, frequency in document_frequency.items()}
+
+    def scores(self, query: str) -> list[float]:
+        terms = set(tokenize(query)) & self.idf.keys()
+        return [
+            sum(term_score(counts[term], length, self.average_length, self.idf[term]) for term in terms if term in counts)
+            for counts, length in zip(self.term_counts, self.lengths)
+        ]
+
+    def top(self, query: str, k: int) -> list[int]:
+        """Indexes of the `k` best matching documents, best first; ties keep document order."""
+        scores = self.scores(query)
+        return sorted(range(len(scores)), key=lambda i: -scores[i])[:k]
@@ -0,0 +1,165 @@
+"""Persistent cache for deterministic LLM calls.
+
+Judge calls made with `temperature=0` and a fixed seed return the same verdict
+for the same input, so their parsed output is stored in SQLite next to the
+dataset databases and replayed on later runs.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel
+
+from agent.config import LLM_CACHE_MAX_AGE_SECONDS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_PATH
+from agent.db import get_db_at
+
+SAMPLING_PARAMS = ("deployment_name", "model_name", "temperature", "seed", "max_tokens", "top_p", "n")
+EVICT_EVERY_N_WRITES = 500
+
+
+def sampling_params(llm: Any) -> dict[str, Any]:
+    return {name: getattr(llm, name, None) for name in SAMPLING_PARAMS}
+
+
+def is_deterministic(llm: Any) -> bool:
+    return getattr(llm, "temperature", None) == 0
+
+
+def make_key(llm: Any, schema: type[BaseModel], messages: list[BaseMessage], **extra: Any) -> str:
+    payload = {
+        "params": sampling_params(llm),
+        "schema": [schema.__name__, schema.model_json_schema()],
+        "messages": [[message.type, message.content] for message in messages],
+        "extra": extra,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed key/value store with size and age based eviction.
+
+    The file is opened through `agent.db`, in WAL mode: lookups run on a
+    reader thread and stores are queued for the file's writer thread, so the
+    event loop never waits on SQLite. A hit only records its access time in
+    memory; access times are written back by the eviction pass that uses them.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_age_seconds: int, table: str = "llm_cache"):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.db = get_db_at(path)
+        self._lock = threading.Lock()
+        self._touched: dict[str, float] = {}
+        self._ready = False
+
+    def _create(self, cursor: sqlite3.Cursor):
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{self.table}" (
+            "key"	TEXT NOT NULL PRIMARY KEY,
+            "value"	TEXT NOT NULL,
+            "created_at"	REAL NOT NULL,
+            "accessed_at"	REAL NOT NULL
+        );
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at);")
+
+    async def _ensure_table(self):
+        if self._ready:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        def setup(cursor: sqlite3.Cursor):
+            self._create(cursor)
+            self._evict(cursor)
+
+        await self.db.awrite(setup)
+        self._ready = True
+
+    async def aget(self, key: str) -> str | None:
+        await self._ensure_table()
+        row = await self.db.aread(
+            lambda cursor: cursor.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?;", (key,)).fetchone())
+        now = time.time()
+        with self._lock:
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = now
+        return row[0]
+
+    async def aset(self, key: str, value: str):
+        await self._ensure_table()
+        now = time.time()
+        with self._lock:
+            self.writes += 1
+            evict = self.writes % EVICT_EVERY_N_WRITES == 0
+
+        def store(cursor: sqlite3.Cursor):
+            cursor.execute(f"""INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at)
+            VALUES (?, ?, ?, ?);""", (key, value, now, now))
+            if evict:
+                self._evict(cursor)
+
+        await self.db.awrite(store)
+
+    def _write_access_times(self, cursor: sqlite3.Cursor):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        cursor.executemany(f"UPDATE {self.table} SET accessed_at = MAX(accessed_at, ?) WHERE key = ?;",
+                           [(accessed_at, key) for key, accessed_at in touched.items()])
+
+    def _evict(self, cursor: sqlite3.Cursor):
+        self._write_access_times(cursor)
+        cursor.execute(f"DELETE FROM {self.table} WHERE created_at < ?;", (time.time() - self.max_age_seconds,))
+        evicted = cursor.rowcount
+        count = cursor.execute(f"SELECT COUNT(*) FROM {self.table};").fetchone()[0]
+        if count > self.max_entries:
+            cursor.execute(f"""DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?
+            );""", (count - self.max_entries,))
+            evicted += cursor.rowcount
+        with self._lock:
+            self.evictions += evicted
+
+    def clear(self):
+        with self.db.write() as cursor:
+            self._create(cursor)
+            cursor.execute(f"DELETE FROM {self.table};")
+        with self._lock:
+            self._touched.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        """Write back pending access times and close the file's connections."""
+        if self._ready:
+            with self.db.write() as cursor:
+                self._write_access_times(cursor)
+        self.db.close()
+        self._ready = False
+
+
+llm_cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_SECONDS)
+atexit.register(llm_cache.close)
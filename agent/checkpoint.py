@@ -0,0 +1,101 @@
+"""Durable SQLite checkpoints so interrupted runs resume instead of recomputing.
+
+The main graph and the subgraphs invoked from its nodes share one checkpointer:
+every completed super-step, and every finished `Send` task within a step, is
+stored under the run's thread id. Running the same thread id again continues
+from the last completed step, so paid LLM work that already finished is not
+repeated. Graphs invoked from inside a subgraph (the cascade's escalation)
+are compiled without a checkpointer; their calling step reruns as a whole. The
+answer queue persists its progress through the answer writer instead and skips
+already answered rows when it resumes.
+
+`langgraph dev` provides its own persistence, so `agent.agent.graph` stays
+compiled without a checkpointer; use `run_checkpointed` for local runs.
+"""
+
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import StateGraph
+
+from agent.config import CHECKPOINT_PATH
+
+
+class TimedSqliteSaver(AsyncSqliteSaver):
+    """`AsyncSqliteSaver` that records how much time checkpoint writes take."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.write_stats = {"checkpoints": 0, "task_writes": 0, "seconds": 0.0, "max_seconds": 0.0}
+
+    def _record(self, kind: str, seconds: float):
+        self.write_stats[kind] += 1
+        self.write_stats["seconds"] += seconds
+        self.write_stats["max_seconds"] = max(self.write_stats["max_seconds"], seconds)
+
+    async def aput(self, *args: Any, **kwargs: Any):
+        start = time.perf_counter()
+        try:
+            return await super().aput(*args, **kwargs)
+        finally:
+            self._record("checkpoints", time.perf_counter() - start)
+
+    async def aput_writes(self, *args: Any, **kwargs: Any):
+        start = time.perf_counter()
+        try:
+            return await super().aput_writes(*args, **kwargs)
+        finally:
+            self._record("task_writes", time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def open_checkpointer(path: str = CHECKPOINT_PATH) -> AsyncIterator[TimedSqliteSaver]:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    async with TimedSqliteSaver.from_conn_string(path) as saver:
+        await saver.setup()
+        # WAL (set by `setup`) with NORMAL sync skips the fsync on every commit;
+        # a power loss can drop the last checkpoints but never corrupts the file.
+        await saver.conn.execute("PRAGMA synchronous=NORMAL;")
+        yield saver  # type: ignore
+
+
+async def thread_input(graph: Any, input: dict[str, Any], config: dict[str, Any]) -> tuple[str, dict[str, Any] | None]:
+    """Whether the thread in `config` is `new`, `interrupted` or `finished`, and the input to run it with.
+
+    `None` resumes an interrupted thread; a finished thread should not be run again.
+    """
+    snapshot = await graph.aget_state(config)
+    if snapshot.next:
+        return "interrupted", None
+    if snapshot.created_at is not None:
+        return "finished", None
+    return "new", input
+
+
+async def run_checkpointed(
+    builder: StateGraph,
+    input: dict[str, Any],
+    thread_id: str,
+    path: str = CHECKPOINT_PATH,
+    config: dict[str, Any] | None = None,
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Run `builder` under `thread_id`, resuming it if an earlier run did not finish.
+
+    A thread that already finished is not run again, its final state is
+    returned as is; use a new thread id for a new run. Returns the final state
+    and the checkpoint write stats of this run.
+    """
+    async with open_checkpointer(path) as saver:
+        graph = builder.compile(checkpointer=saver)
+        run_config = {**(config or {}), "configurable": {**(config or {}).get("configurable", {}), "thread_id": thread_id}}
+        status, run_input = await thread_input(graph, input, run_config)
+        if status == "finished":
+            snapshot = await graph.aget_state(run_config)  # type: ignore
+            return snapshot.values, dict(saver.write_stats)
+        result = await graph.ainvoke(run_input, run_config)  # type: ignore
+        return result, dict(saver.write_stats)
@@ -0,0 +1,281 @@
+"""Columnar export of the answered dataset for analysis notebooks.
+
+Unlike the CSV export, columns keep their types: ids and attempts are
+integers, `created_at` a timestamp, and `topic`, `subtopic` and `answer_tier`
+are dictionary-encoded. Rows are written one row group (`EXPORT_ROW_GROUP_SIZE`
+rows) at a time, as they are fetched from SQLite. `answer_length` is stored as
+its own column, so answer statistics never have to read the answers.
+
+With `pyarrow` installed (`pip install .[columnar]`) the output is Parquet.
+Without it, it is a stdlib-only `.qacol` file: zlib-compressed column chunks
+per row group, followed by a JSON footer with their offsets and the
+dictionaries. `read_columns` reads either, touching only the requested
+columns:
+
+    from agent.columnar import read_columns
+    columns = read_columns("output/04-01-2025/04-01-2025-10_00_00-train.parquet", ["subtopic_id", "answer_length"])
+
+From the command line:
+
+    python -m agent.columnar 04-01-2025-dataset.db
+    python -m agent.columnar --read output/.../...-train.qacol --columns subtopic_id answer_length
+"""
+
+import argparse
+import array
+import json
+import os
+import struct
+import sys
+import zlib
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any
+
+from agent.config import EXPORT_DIR, EXPORT_ROW_GROUP_SIZE
+from agent.db import get_db
+from agent.export import HashingFile, Shard, export_base_path, write_manifest
+from agent.queries import create_tables, iter_answered_rows
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+# (name, type) of the exported columns, in the order `iter_answered_rows` yields them.
+COLUMNS = [
+    ("id", "int64"),
+    ("topic", "dictionary"),
+    ("subtopic", "dictionary"),
+    ("subtopic_id", "int64"),
+    ("created_at", "timestamp"),
+    ("question", "string"),
+    ("answer", "string"),
+    ("answer_length", "int64"),
+    ("attempts", "int64"),
+    ("answer_tier", "dictionary"),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+CREATED_AT_FORMAT = "%m-%d-%Y_%H:%M:%S"
+QACOL_MAGIC = b"QACOL1"
+
+
+def parse_created_at(value: str | None) -> datetime | None:
+    try:
+        return datetime.strptime(value, CREATED_AT_FORMAT) if value else None
+    except ValueError:
+        return None
+
+
+def to_columns(rows: list[tuple]) -> dict[str, list]:
+    """Transpose `(id, topic, subtopic, subtopic_id, created_at, question, answer, attempts, answer_tier)` rows."""
+    (ids, topics, subtopics, subtopic_ids, created_at, questions, answers, attempts, tiers) = (list(column) for column in zip(*rows))
+    return {
+        "id": ids,
+        "topic": topics,
+        "subtopic": subtopics,
+        "subtopic_id": subtopic_ids,
+        "created_at": [parse_created_at(value) for value in created_at],
+        "question": questions,
+        "answer": answers,
+        "answer_length": [len(answer) for answer in answers],
+        "attempts": attempts,
+        "answer_tier": tiers,
+    }
+
+
+###### Parquet ######
+def parquet_schema() -> Any:
+    types = {
+        "int64": pa.int64(),
+        "dictionary": pa.dictionary(pa.int32(), pa.string()),
+        "timestamp": pa.timestamp("s"),
+        "string": pa.string(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+
+class ParquetColumnWriter:
+    extension = ".parquet"
+
+    def __init__(self, sink: HashingFile):
+        self.schema = parquet_schema()
+        self.writer = pq.ParquetWriter(sink, self.schema, compression="zstd",
+                                       use_dictionary=[name for name, kind in COLUMNS if kind == "dictionary"])
+
+    def write_row_group(self, columns: dict[str, list]):
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+###### Stdlib fallback ######
+class QacolColumnWriter:
+    """Row groups of zlib-compressed column chunks followed by a JSON footer.
+
+    Layout: `QACOL1`, the chunks, the footer, the footer's length as a
+    little-endian uint64, `QACOL1`. Dictionary columns store int32 indexes
+    (-1 for null) into dictionaries kept in the footer.
+    """
+
+    extension = ".qacol"
+
+    def __init__(self, sink: HashingFile):
+        self.sink = sink
+        self.sink.write(QACOL_MAGIC)
+        self.offset = len(QACOL_MAGIC)
+        self.rows = 0
+        self.row_groups: list[dict[str, Any]] = []
+        self.dictionaries: dict[str, dict[str, int]] = {name: {} for name, kind in COLUMNS if kind == "dictionary"}
+
+    def _encode(self, name: str, kind: str, values: list) -> bytes:
+        if kind == "dictionary":
+            codes = self.dictionaries[name]
+            return array.array("i", [-1 if value is None else codes.setdefault(value, len(codes)) for value in values]).tobytes()
+        if kind == "string":
+            encoded = [None if value is None else value.encode("utf-8") for value in values]
+            lengths = array.array("i", [-1 if value is None else len(value) for value in encoded])
+            return lengths.tobytes() + b"".join(value for value in encoded if value is not None)
+        if kind == "timestamp":
+            values = [None if value is None else int(value.timestamp()) for value in values]
+        mask = bytes(value is not None for value in values)
+        return mask + array.array("q", [value or 0 for value in values]).tobytes()
+
+    def write_row_group(self, columns: dict[str, list]):
+        rows = len(columns["id"])
+        chunks: dict[str, list[int]] = {}
+        for name, kind in COLUMNS:
+            chunk = zlib.compress(self._encode(name, kind, columns[name]), 6)
+            self.sink.write(chunk)
+            chunks[name] = [self.offset, len(chunk)]
+            self.offset += len(chunk)
+        self.row_groups.append({"rows": rows, "columns": chunks})
+        self.rows += rows
+
+    def close(self):
+        footer = json.dumps({
+            "version": 1,
+            "byteorder": sys.byteorder,
+            "rows": self.rows,
+            "schema": [{"name": name, "type": kind} for name, kind in COLUMNS],
+            "row_groups": self.row_groups,
+            "dictionaries": {name: list(codes) for name, codes in self.dictionaries.items()},
+        }).encode("utf-8")
+        self.sink.write(footer + struct.pack("<Q", len(footer)) + QACOL_MAGIC)
+
+
+def _decode(kind: str, data: bytes, rows: int, dictionary: list[str] | None, swap: bool) -> list:
+    def numbers(typecode: str, raw: bytes) -> array.array:
+        values = array.array(typecode, raw)
+        if swap:
+            values.byteswap()
+        return values
+
+    if kind == "dictionary":
+        return [None if code < 0 else dictionary[code] for code in numbers("i", data)]  # type: ignore
+    if kind == "string":
+        lengths = numbers("i", data[:rows * 4])
+        values, position = [], rows * 4
+        for length in lengths:
+            if length < 0:
+                values.append(None)
+                continue
+            values.append(data[position:position + length].decode("utf-8"))
+            position += length
+        return values
+    mask, values = data[:rows], numbers("q", data[rows:])
+    if kind == "timestamp":
+        return [datetime.fromtimestamp(value) if present else None for present, value in zip(mask, values)]
+    return [value if present else None for present, value in zip(mask, values)]
+
+
+def read_qacol(path: str, columns: list[str] | None = None) -> dict[str, list]:
+    with open(path, "rb") as f:
+        f.seek(-(8 + len(QACOL_MAGIC)), os.SEEK_END)
+        (footer_length,) = struct.unpack("<Q", f.read(8))
+        f.seek(-(8 + len(QACOL_MAGIC) + footer_length), os.SEEK_END)
+        footer = json.loads(f.read(footer_length))
+        kinds = {column["name"]: column["type"] for column in footer["schema"]}
+        swap = footer["byteorder"] != sys.byteorder
+        result: dict[str, list] = {}
+        for name in columns or list(kinds):
+            values: list = []
+            for row_group in footer["row_groups"]:
+                offset, length = row_group["columns"][name]
+                f.seek(offset)
+                values.extend(_decode(kinds[name], zlib.decompress(f.read(length)), row_group["rows"],
+                                      footer["dictionaries"].get(name), swap))
+            result[name] = values
+    return result
+
+
+###### Export and read ######
+def export_columnar(row_groups: Iterable[list[tuple]], base_path: str, use_parquet: bool | None = None) -> tuple[Shard, str]:
+    """Write `row_groups` to `<base_path>.parquet` (or `.qacol` without pyarrow) and its manifest.
+
+    Returns the written shard and the format used.
+    """
+    if use_parquet is None:
+        use_parquet = pq is not None
+    writer_class = ParquetColumnWriter if use_parquet else QacolColumnWriter
+    path = base_path + writer_class.extension
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rows = 0
+    with HashingFile(path) as sink:
+        writer = writer_class(sink)
+        for row_group in row_groups:
+            writer.write_row_group(to_columns(row_group))
+            rows += len(row_group)
+        writer.close()
+    shard: Shard = {"path": path, "rows": rows, "bytes": os.path.getsize(path), "sha256": sink.sha256.hexdigest()}
+    format = "parquet" if use_parquet else "qacol"
+    write_manifest(base_path, [shard], format=format, columns=dict(COLUMNS))
+    return shard, format
+
+
+def read_columns(path: str, columns: list[str] | None = None) -> dict[str, list]:
+    """Read only `columns` (default all) of a columnar export as Python lists."""
+    with open(path, "rb") as f:
+        is_parquet = f.read(4) == b"PAR1"
+    if is_parquet:
+        if pq is None:
+            raise ImportError("Reading Parquet exports requires pyarrow: pip install .[columnar]")
+        return pq.read_table(path, columns=columns).to_pydict()
+    return read_qacol(path, columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m agent.columnar", description="Columnar export of a dataset database, or column-pruned reads of one.")
+    parser.add_argument("filename_db", nargs="?", help="Database file name under ./db, e.g. 04-01-2025-dataset.db")
+    parser.add_argument("-o", "--output-dir", default=EXPORT_DIR)
+    parser.add_argument("--row-group-size", type=int, default=EXPORT_ROW_GROUP_SIZE)
+    parser.add_argument("--stdlib", action="store_true", help="Write the stdlib .qacol format even if pyarrow is installed.")
+    parser.add_argument("--read", metavar="PATH", help="Read an export instead and print a summary of the selected columns.")
+    parser.add_argument("--columns", nargs="+", choices=COLUMN_NAMES)
+    args = parser.parse_args()
+
+    if args.read:
+        for name, values in read_columns(args.read, args.columns).items():
+            present = [value for value in values if value is not None]
+            numeric = present and all(isinstance(value, int) for value in present)
+            stats = f", min {min(present)}, max {max(present)}, mean {sum(present) / len(present):.1f}" if numeric else ""
+            print(f"{name}: {len(values)} values, {len(values) - len(present)} null{stats}")
+        return
+    if not args.filename_db:
+        parser.error("filename_db is required unless --read is given")
+
+    db = get_db(args.filename_db)
+    with db.write() as cursor:
+        create_tables(cursor)
+    with db.read() as cursor:
+        shard, format = export_columnar(iter_answered_rows(cursor, args.row_group_size), export_base_path(args.output_dir),
+                                        use_parquet=False if args.stdlib else None)
+    print(f"Exported {shard['rows']} rows to {shard['path']} ({format}, {shard['bytes']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
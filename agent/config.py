@@ -0,0 +1,164 @@
+"""Runtime tunables for the agent.
+
+Every value can be overridden through the environment (or `.env`) so a run can
+be tuned without touching the code.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+###### LLM Response Cache ######
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./db/llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "200000"))
+LLM_CACHE_MAX_AGE_SECONDS = int(os.getenv("LLM_CACHE_MAX_AGE_SECONDS", str(30 * 24 * 60 * 60)))
+
+###### Web Search ######
+# `agent.tools.search`: results are cached in SQLite for SEARCH_CACHE_TTL_SECONDS.
+# SEARCH_BACKEND is "tavily" or "fake" (deterministic local results, no network).
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "tavily")
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "5"))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "4"))
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") == "1"
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "./db/search_cache.db")
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "50000"))
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+
+###### Rate Limits ######
+# Per-deployment budgets shared by every LLM call; keep these at (or just under)
+# the quota assigned to the Azure deployment.
+LLM_RATE_LIMITS = {
+    "gpt-4o": {
+        "rpm": int(os.getenv("GPT4O_RPM", "300")),
+        "tpm": int(os.getenv("GPT4O_TPM", "50000")),
+        "max_concurrency": int(os.getenv("GPT4O_MAX_CONCURRENCY", "16")),
+    },
+    "gpt-4o-mini": {
+        "rpm": int(os.getenv("GPT4O_MINI_RPM", "1000")),
+        "tpm": int(os.getenv("GPT4O_MINI_TPM", "200000")),
+        "max_concurrency": int(os.getenv("GPT4O_MINI_MAX_CONCURRENCY", "32")),
+    },
+    "default": {
+        "rpm": int(os.getenv("LLM_DEFAULT_RPM", "300")),
+        "tpm": int(os.getenv("LLM_DEFAULT_TPM", "50000")),
+        "max_concurrency": int(os.getenv("LLM_DEFAULT_MAX_CONCURRENCY", "16")),
+    },
+}
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "600"))
+
+###### Retries ######
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "120"))
+LLM_RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "6")))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "1"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "60"))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+LLM_BREAKER_MAX_WAIT_SECONDS = float(os.getenv("LLM_BREAKER_MAX_WAIT_SECONDS", "600"))
+
+###### Candidate Generation ######
+# Number of completions requested in a single call (OpenAI `n` sampling
+# parameter) for answers and question sets, keyed by `Mode` value.
+DEFAULT_NUM_CANDIDATES = int(os.getenv("NUM_CANDIDATES", "2"))
+CANDIDATES_PER_MODE = {
+    "prompt_testing_some": int(os.getenv("PROMPT_TESTING_SOME_CANDIDATES", str(DEFAULT_NUM_CANDIDATES))),
+    "prompt_testing_all": int(os.getenv("PROMPT_TESTING_ALL_CANDIDATES", str(DEFAULT_NUM_CANDIDATES))),
+    "question_generation": int(os.getenv("QUESTION_GENERATION_CANDIDATES", str(DEFAULT_NUM_CANDIDATES))),
+    "response_generation": int(os.getenv("RESPONSE_GENERATION_CANDIDATES", str(DEFAULT_NUM_CANDIDATES))),
+    "response_generation_some": int(os.getenv("RESPONSE_GENERATION_SOME_CANDIDATES", str(DEFAULT_NUM_CANDIDATES))),
+    # Batch answers skip the interactive judge unless more than one is requested.
+    "response_generation_batch": int(os.getenv("RESPONSE_GENERATION_BATCH_CANDIDATES", "1")),
+}
+
+###### Candidate Selection ######
+# How the judge picks among candidates: "index", "ranking" or "tournament".
+SELECTION_STRATEGY = os.getenv("SELECTION_STRATEGY", "index")
+# Candidates at least this similar (Jaccard over word shingles) are treated as
+# the same candidate; set above 1 to always call the judge.
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.9"))
+SHINGLE_SIZE = int(os.getenv("SHINGLE_SIZE", "3"))
+
+###### Few-shot Examples ######
+# Examples of GENERATE_QUESTION_REQUEST picked per subtopic by BM25; 0 sends all of them.
+FEW_SHOT_EXAMPLES = int(os.getenv("FEW_SHOT_EXAMPLES", "8"))
+
+###### Batch ResponseGeneration ######
+# Azure batch jobs need a deployment of type "Global-Batch"; defaults to creative_llm's.
+BATCH_DEPLOYMENT = os.getenv("BATCH_DEPLOYMENT", "")
+BATCH_ENDPOINT = os.getenv("BATCH_ENDPOINT", "/chat/completions")
+BATCH_POLL_INTERVAL_SECONDS = float(os.getenv("BATCH_POLL_INTERVAL_SECONDS", "60"))
+
+###### QuestionGeneration ######
+# How many subtopics generate their questions at the same time.
+QUESTION_GENERATION_CONCURRENCY = int(os.getenv("QUESTION_GENERATION_CONCURRENCY", "5"))
+
+###### ResponseGeneration ######
+# Questions answered at the same time across all subtopics of a topic; a new
+# one starts as soon as any answer lands.
+RESPONSE_GENERATION_WINDOW = int(os.getenv("RESPONSE_GENERATION_WINDOW", "16"))
+
+###### Answer Writer ######
+ANSWER_WRITER_FLUSH_SECONDS = float(os.getenv("ANSWER_WRITER_FLUSH_SECONDS", "0.5"))
+ANSWER_WRITER_MAX_BATCH = int(os.getenv("ANSWER_WRITER_MAX_BATCH", "64"))
+
+###### Regeneration ######
+# Generate -> judge -> relevance check rounds before the best candidate so far is kept anyway.
+MAX_ANSWER_ATTEMPTS = int(os.getenv("MAX_ANSWER_ATTEMPTS", "3"))
+MAX_QUESTION_ATTEMPTS = int(os.getenv("MAX_QUESTION_ATTEMPTS", "3"))
+
+###### Answer Cascade ######
+# Draft every answer with fast_llm first and only escalate to creative_llm
+# when the draft fails the relevance check or scores below the minimum.
+ANSWER_CASCADE = os.getenv("ANSWER_CASCADE", "0") == "1"
+CASCADE_MIN_SCORE = int(os.getenv("CASCADE_MIN_SCORE", "4"))
+
+###### Grounded Answers ######
+# Ground generated answers in the best matching passages of a local corpus
+# (`agent.corpus`), indexed into ./db/{CORPUS_DB}.
+GROUNDED_ANSWERS = os.getenv("GROUNDED_ANSWERS", "0") == "1"
+CORPUS_DIR = os.getenv("CORPUS_DIR", "./corpus")
+CORPUS_DB = os.getenv("CORPUS_DB", "corpus.db")
+CORPUS_CHUNK_WORDS = int(os.getenv("CORPUS_CHUNK_WORDS", "200"))
+CORPUS_CHUNK_OVERLAP = int(os.getenv("CORPUS_CHUNK_OVERLAP", "40"))
+# Query terms in more than this share of the chunks are only scored for chunks
+# a rarer query term matched; queries of such terms only read the first
+# CORPUS_MAX_POSTINGS postings of the rarest one.
+CORPUS_COMMON_TERM_RATIO = float(os.getenv("CORPUS_COMMON_TERM_RATIO", "0.1"))
+CORPUS_MAX_POSTINGS = int(os.getenv("CORPUS_MAX_POSTINGS", "1000"))
+GROUNDING_PASSAGES = int(os.getenv("GROUNDING_PASSAGES", "3"))
+
+###### Checkpoints ######
+# Durable graph checkpoints used by `agent.checkpoint`; a run resumes from its
+# last completed step when started again with the same thread id.
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./db/checkpoints.db")
+
+###### Database ######
+# Pragmas of the shared connections in `agent.db`.
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", "65536"))
+DB_CACHED_STATEMENTS = int(os.getenv("DB_CACHED_STATEMENTS", "256"))
+DB_BUSY_TIMEOUT_SECONDS = float(os.getenv("DB_BUSY_TIMEOUT_SECONDS", "30"))
+# Queued writes committed together by a database's writer thread.
+DB_MAX_WRITE_BATCH = int(os.getenv("DB_MAX_WRITE_BATCH", "256"))
+
+###### Duplicate Questions ######
+# Questions whose estimated Jaccard similarity (word shingles, MinHash) with an
+# earlier question reaches the threshold are flagged and not answered.
+DUPLICATE_DETECTION = os.getenv("DUPLICATE_DETECTION", "1") == "1"
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.8"))
+DUPLICATE_SHINGLE_SIZE = int(os.getenv("DUPLICATE_SHINGLE_SIZE", "2"))
+DUPLICATE_NUM_PERM = int(os.getenv("DUPLICATE_NUM_PERM", "128"))
+DUPLICATE_LSH_BANDS = int(os.getenv("DUPLICATE_LSH_BANDS", "16"))
+# Questions are only compared with questions of the same topic unless set.
+DUPLICATE_ACROSS_TOPICS = os.getenv("DUPLICATE_ACROSS_TOPICS", "0") == "1"
+
+###### Export ######
+# Streaming JSONL/CSV exports (`agent.export`); 0 disables a shard limit.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./output")
+EXPORT_GZIP = os.getenv("EXPORT_GZIP", "0") == "1"
+EXPORT_MAX_ROWS_PER_FILE = int(os.getenv("EXPORT_MAX_ROWS_PER_FILE", "0"))
+EXPORT_MAX_BYTES_PER_FILE = int(os.getenv("EXPORT_MAX_BYTES_PER_FILE", "0"))
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+# Rows per row group of columnar exports (`agent.columnar`).
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "10000"))
@@ -0,0 +1,302 @@
+"""Local document corpus with an on-disk BM25 index, for grounded answers.
+
+Text and Markdown files under `CORPUS_DIR` are split into chunks of about
+`CORPUS_CHUNK_WORDS` words and indexed into an inverted index in
+`./db/{CORPUS_DB}`: `postings` holds, for every term, the chunks containing
+it with the term frequency and chunk length, and `terms` its document
+frequency. Indexing is incremental: only new or modified files are
+(re)indexed and deleted files are dropped, so adding documents only costs
+their own chunks. A search drops stopwords from the query and reads the
+postings of its rare terms only. Common terms (in more than
+`CORPUS_COMMON_TERM_RATIO` of the chunks) are looked up for the chunks the
+rare terms matched, so their long postings lists are never scanned. Results
+are scored with BM25, which takes milliseconds. No network is involved.
+
+    python -m agent.corpus index
+    python -m agent.corpus search "How does chain-of-thought prompting work?"
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import weakref
+from collections import Counter
+from typing import TypedDict
+
+from agent.bm25 import idf, term_score
+from agent.config import CORPUS_CHUNK_OVERLAP, CORPUS_CHUNK_WORDS, CORPUS_COMMON_TERM_RATIO, CORPUS_DB, CORPUS_DIR, CORPUS_MAX_POSTINGS
+from agent.db import get_db
+from agent.similarity import tokenize
+
+EXTENSIONS = (".txt", ".md", ".markdown", ".rst")
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+# Dropped from queries only; the index keeps them so it does not depend on this list.
+STOPWORDS = frozenset("""
+a about an and are as at be but by can could do does for from has have how i if in into is it its
+of on or should so than that the their then there these they this to was were what when where which
+who why will with would you your
+""".split())
+# Chunk ids per `chunk_id IN (...)` lookup, well below SQLite's variable limit.
+LOOKUP_BATCH_SIZE = 500
+
+
+class Passage(TypedDict):
+    source: str
+    text: str
+    score: float
+
+
+def create_corpus_tables(cursor: sqlite3.Cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "documents" (
+        "id"	INTEGER NOT NULL,
+        "path"	TEXT NOT NULL UNIQUE,
+        "mtime"	REAL NOT NULL,
+        "size"	INTEGER NOT NULL,
+        "sha256"	TEXT NOT NULL,
+        PRIMARY KEY("id" AUTOINCREMENT)
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "chunks" (
+        "id"	INTEGER NOT NULL,
+        "document_id"	INTEGER NOT NULL,
+        "position"	INTEGER NOT NULL,
+        "text"	TEXT NOT NULL,
+        "length"	INTEGER NOT NULL,
+        PRIMARY KEY("id" AUTOINCREMENT),
+        FOREIGN KEY (document_id) REFERENCES "documents" (id)
+    );
+    """)
+    cursor.execute('CREATE INDEX IF NOT EXISTS "chunks_document" ON "chunks" ("document_id");')
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "postings" (
+        "term"	TEXT NOT NULL,
+        "chunk_id"	INTEGER NOT NULL,
+        "tf"	INTEGER NOT NULL,
+        "length"	INTEGER NOT NULL,
+        PRIMARY KEY("term", "chunk_id")
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute('CREATE INDEX IF NOT EXISTS "postings_chunk" ON "postings" ("chunk_id");')
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "terms" (
+        "term"	TEXT NOT NULL,
+        "df"	INTEGER NOT NULL,
+        PRIMARY KEY("term")
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "corpus_stats" (
+        "id"	INTEGER NOT NULL CHECK ("id" = 1),
+        "chunks"	INTEGER NOT NULL,
+        "total_length"	INTEGER NOT NULL,
+        PRIMARY KEY("id")
+    );
+    """)
+    cursor.execute("INSERT OR IGNORE INTO corpus_stats (id, chunks, total_length) VALUES (1, 0, 0);")
+
+
+def chunk_text(text: str, size: int = CORPUS_CHUNK_WORDS, overlap: int = CORPUS_CHUNK_OVERLAP) -> list[str]:
+    """Pack paragraphs into chunks of about `size` words; longer paragraphs are split with `overlap` words."""
+    chunks: list[str] = []
+    current: list[str] = []
+    current_words = 0
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and current_words + len(words) > size:
+            chunks.append("\n\n".join(current))
+            current, current_words = [], 0
+        if len(words) <= size:
+            current.append(" ".join(words))
+            current_words += len(words)
+            continue
+        step = max(size - overlap, 1)
+        for start in range(0, len(words), step):
+            chunks.append(" ".join(words[start:start + size]))
+            if start + size >= len(words):
+                break
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def remove_document(cursor: sqlite3.Cursor, document_id: int):
+    cursor.execute("""SELECT term, COUNT(*) FROM postings
+    WHERE chunk_id IN (SELECT id FROM chunks WHERE document_id = ?) GROUP BY term;""", (document_id,))
+    cursor.executemany("UPDATE terms SET df = df - ? WHERE term = ?;", [(count, term) for term, count in cursor.fetchall()])
+    cursor.execute("DELETE FROM terms WHERE df <= 0;")
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE document_id = ?;", (document_id,))
+    chunks, total_length = cursor.fetchone()
+    cursor.execute("UPDATE corpus_stats SET chunks = chunks - ?, total_length = total_length - ? WHERE id = 1;", (chunks, total_length))
+    cursor.execute("DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE document_id = ?);", (document_id,))
+    cursor.execute("DELETE FROM chunks WHERE document_id = ?;", (document_id,))
+    cursor.execute("DELETE FROM documents WHERE id = ?;", (document_id,))
+
+
+def add_document(cursor: sqlite3.Cursor, path: str, mtime: float, size: int, sha256: str, text: str) -> int:
+    """Index one document; returns its number of chunks."""
+    cursor.execute("INSERT INTO documents (path, mtime, size, sha256) VALUES (?, ?, ?, ?);", (path, mtime, size, sha256))
+    document_id = cursor.lastrowid
+    document_frequency: Counter[str] = Counter()
+    total_length = 0
+    chunks = chunk_text(text)
+    for position, chunk in enumerate(chunks):
+        term_counts = Counter(tokenize(chunk))
+        length = sum(term_counts.values())
+        cursor.execute("INSERT INTO chunks (document_id, position, text, length) VALUES (?, ?, ?, ?);",
+                       (document_id, position, chunk, length))
+        chunk_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO postings (term, chunk_id, tf, length) VALUES (?, ?, ?, ?);",
+                           [(term, chunk_id, count, length) for term, count in term_counts.items()])
+        document_frequency.update(term_counts.keys())
+        total_length += length
+    cursor.executemany("""INSERT INTO terms (term, df) VALUES (?, ?)
+    ON CONFLICT(term) DO UPDATE SET df = df + excluded.df;""", list(document_frequency.items()))
+    cursor.execute("UPDATE corpus_stats SET chunks = chunks + ?, total_length = total_length + ? WHERE id = 1;",
+                   (len(chunks), total_length))
+    return len(chunks)
+
+
+def corpus_files(directory: str) -> dict[str, os.stat_result]:
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith(EXTENSIONS):
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, directory)] = os.stat(path)
+    return files
+
+
+def index_corpus(cursor: sqlite3.Cursor, directory: str = CORPUS_DIR) -> dict[str, int]:
+    """Bring the index up to date with `directory`; returns how many documents changed and chunks were added."""
+    create_corpus_tables(cursor)
+    cursor.execute("SELECT id, path, mtime, size, sha256 FROM documents;")
+    indexed = {row[1]: row for row in cursor.fetchall()}
+    files = corpus_files(directory) if os.path.isdir(directory) else {}
+    counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "chunks": 0}
+
+    for path in indexed.keys() - files.keys():
+        remove_document(cursor, indexed[path][0])
+        counts["removed"] += 1
+    for path, stat in sorted(files.items()):
+        previous = indexed.get(path)
+        if previous is not None and previous[2] == stat.st_mtime and previous[3] == stat.st_size:
+            counts["unchanged"] += 1
+            continue
+        with open(os.path.join(directory, path), "rb") as f:
+            data = f.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+        if previous is not None and previous[4] == sha256:
+            cursor.execute("UPDATE documents SET mtime = ?, size = ? WHERE id = ?;", (stat.st_mtime, stat.st_size, previous[0]))
+            counts["unchanged"] += 1
+            continue
+        if previous is not None:
+            remove_document(cursor, previous[0])
+        counts["chunks"] += add_document(cursor, path, stat.st_mtime, stat.st_size, sha256, data.decode("utf-8", errors="replace"))
+        counts["updated" if previous is not None else "added"] += 1
+    return counts
+
+
+def search_corpus(cursor: sqlite3.Cursor, query: str, k: int) -> list[Passage]:
+    """The `k` chunks that best match `query` by BM25."""
+    cursor.execute("SELECT chunks, total_length FROM corpus_stats WHERE id = 1;")
+    row = cursor.fetchone()
+    if row is None or row[0] == 0:
+        return []
+    chunk_count, total_length = row
+    average_length = total_length / chunk_count
+
+    terms = sorted(set(tokenize(query)) - STOPWORDS)
+    if not terms:
+        return []
+    placeholders = ",".join("?" * len(terms))
+    cursor.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders});", terms)
+    dfs = dict(cursor.fetchall())
+    if not dfs:
+        return []
+    idfs = {term: idf(chunk_count, df) for term, df in dfs.items()}
+
+    rare = [term for term, df in dfs.items() if df <= CORPUS_COMMON_TERM_RATIO * chunk_count]
+    limit = -1
+    if not rare:
+        rare, limit = [min(dfs, key=lambda term: (dfs[term], term))], CORPUS_MAX_POSTINGS
+    scores: Counter[int] = Counter()
+    cursor.execute(f"SELECT term, chunk_id, tf, length FROM postings WHERE term IN ({','.join('?' * len(rare))}) LIMIT ?;", rare + [limit])
+    for term, chunk_id, tf, length in cursor.fetchall():
+        scores[chunk_id] += term_score(tf, length, average_length, idfs[term])
+    candidates = list(scores)
+    for term in [term for term in dfs if term not in rare]:
+        for start in range(0, len(candidates), LOOKUP_BATCH_SIZE):
+            batch = candidates[start:start + LOOKUP_BATCH_SIZE]
+            cursor.execute(f"SELECT chunk_id, tf, length FROM postings WHERE term = ? AND chunk_id IN ({','.join('?' * len(batch))});", [term] + batch)
+            for chunk_id, tf, length in cursor.fetchall():
+                scores[chunk_id] += term_score(tf, length, average_length, idfs[term])
+    best = scores.most_common(k)
+    if not best:
+        return []
+
+    cursor.execute(f"""SELECT c.id, d.path, c.text FROM chunks c JOIN documents d ON c.document_id = d.id
+    WHERE c.id IN ({",".join("?" * len(best))});""", [chunk_id for chunk_id, _ in best])
+    chunks = {chunk_id: (path, text) for chunk_id, path, text in cursor.fetchall()}
+    return [{"source": chunks[chunk_id][0], "text": chunks[chunk_id][1], "score": score} for chunk_id, score in best]
+
+
+_index_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+_indexed_loops: "weakref.WeakSet[asyncio.AbstractEventLoop]" = weakref.WeakSet()
+
+
+async def ensure_corpus_indexed():
+    """Index new and changed documents once per event loop, before the first search."""
+    loop = asyncio.get_running_loop()
+    if loop in _indexed_loops:
+        return
+    if loop not in _index_locks:
+        _index_locks[loop] = asyncio.Lock()
+    async with _index_locks[loop]:
+        if loop not in _indexed_loops:
+            await get_db(CORPUS_DB).awrite(index_corpus)
+            _indexed_loops.add(loop)
+
+
+async def retrieve(query: str, k: int) -> list[Passage]:
+    await ensure_corpus_indexed()
+    return await get_db(CORPUS_DB).aread(lambda cursor: search_corpus(cursor, query, k))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m agent.corpus", description="Index the local document corpus or search it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    index_parser = commands.add_parser("index", help="Index new and changed documents.")
+    index_parser.add_argument("directory", nargs="?", default=CORPUS_DIR)
+    search_parser = commands.add_parser("search", help="Print the best matching passages.")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    db = get_db(CORPUS_DB)
+    if args.command == "index":
+        start = time.perf_counter()
+        with db.write() as cursor:
+            counts = index_corpus(cursor, args.directory)
+        print(f"{counts} in {time.perf_counter() - start:.1f}s")
+        return
+    with db.write() as cursor:
+        create_corpus_tables(cursor)
+    start = time.perf_counter()
+    with db.read() as cursor:
+        passages = search_corpus(cursor, args.query, args.k)
+    elapsed = (time.perf_counter() - start) * 1000
+    for passage in passages:
+        print(f"[{passage['score']:.2f}] {passage['source']}\n{passage['text']}\n")
+    print(f"{len(passages)} passages in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Long-lived SQLite connections shared by every node, per database file.
+
+Each database under `./db` is opened once in WAL mode with `synchronous=NORMAL`,
+a larger page cache and a bigger prepared statement cache. Writes go through
+a single writer connection per file, serialized by a lock. Reads use one
+connection per thread, and in WAL mode these never block the writer (or each
+other) during a parallel fan-out.
+
+Async code never touches SQLite on the event loop: `aread` runs a query
+function in a worker thread, and `awrite` queues it for the database's writer
+thread. That thread commits everything queued so far in one transaction, with
+a savepoint per job so a failing job does not undo the others.
+
+`acquire_db` is called when a graph run starts using a file and `release_db`
+when it ends. The connections are closed once the last run using the file
+ends. Anything still open is closed at interpreter exit. `db_stats` reports
+the time spent in async reads and write batches per file.
+"""
+
+import asyncio
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from agent.config import DB_BUSY_TIMEOUT_SECONDS, DB_CACHE_SIZE_KIB, DB_CACHED_STATEMENTS, DB_MAX_WRITE_BATCH
+
+DB_DIR = "./db"
+
+T = TypeVar("T")
+
+# (query function, loop of the caller, future resolved with its result)
+WriteJob = tuple[Callable[[sqlite3.Cursor], Any], asyncio.AbstractEventLoop, asyncio.Future]
+
+
+class Database:
+    """Writer and per-thread reader connections of one SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.users = 0
+        self._write_lock = threading.Lock()
+        self._readers_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._writer: sqlite3.Connection | None = None
+        self._readers: dict[int, sqlite3.Connection] = {}
+        self._jobs: "queue.SimpleQueue[WriteJob | None]" = queue.SimpleQueue()
+        self._writer_thread: threading.Thread | None = None
+        self._stats_lock = threading.Lock()
+        self.reads = 0
+        self.read_seconds = 0.0
+        self.write_batches = 0
+        self.write_jobs = 0
+        self.write_seconds = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+            cached_statements=DB_CACHED_STATEMENTS,
+        )
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KIB};")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        return conn
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor on the writer connection, committed on success and rolled back on error."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            cursor = self._writer.cursor()
+            try:
+                yield cursor
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor on this thread's reader connection."""
+        thread_id = threading.get_ident()
+        with self._readers_lock:
+            conn = self._readers.get(thread_id)
+            if conn is None:
+                conn = self._readers[thread_id] = self._connect()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    async def aread(self, query: Callable[[sqlite3.Cursor], T]) -> T:
+        """Run `query(cursor)` on a reader connection in a worker thread."""
+        def run() -> T:
+            start = time.perf_counter()
+            try:
+                with self.read() as cursor:
+                    return query(cursor)
+            finally:
+                with self._stats_lock:
+                    self.reads += 1
+                    self.read_seconds += time.perf_counter() - start
+        return await asyncio.to_thread(run)
+
+    async def awrite(self, query: Callable[[sqlite3.Cursor], T]) -> T:
+        """Queue `query(cursor)` for the writer thread and wait until it is committed."""
+        future = asyncio.get_running_loop().create_future()
+        with self._thread_lock:
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._write_loop, name=f"db-writer-{os.path.basename(self.path)}", daemon=True)
+                self._writer_thread.start()
+            self._jobs.put((query, asyncio.get_running_loop(), future))
+        return await future
+
+    def _write_loop(self):
+        running = True
+        while running:
+            job = self._jobs.get()
+            if job is None:
+                return
+            jobs = [job]
+            while len(jobs) < DB_MAX_WRITE_BATCH:
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    running = False
+                    break
+                jobs.append(job)
+            self._write_batch(jobs)
+
+    def _write_batch(self, jobs: list[WriteJob]):
+        outcomes: list[tuple[Any, BaseException | None]] = []
+        start = time.perf_counter()
+        try:
+            with self.write() as cursor:
+                cursor.execute("BEGIN;")
+                for query, _, _ in jobs:
+                    cursor.execute("SAVEPOINT job;")
+                    try:
+                        outcomes.append((query(cursor), None))
+                    except Exception as error:
+                        cursor.execute("ROLLBACK TO job;")
+                        outcomes.append((None, error))
+                    cursor.execute("RELEASE job;")
+        except Exception as error:
+            outcomes = [(None, error)] * len(jobs)
+        self.write_batches += 1
+        self.write_jobs += len(jobs)
+        self.write_seconds += time.perf_counter() - start
+        for (_, loop, future), (result, error) in zip(jobs, outcomes):
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:
+                pass  # the caller's loop is already closed
+
+    def close(self):
+        with self._thread_lock:
+            writer_thread, self._writer_thread = self._writer_thread, None
+            if writer_thread is not None:
+                self._jobs.put(None)
+        if writer_thread is not None and writer_thread is not threading.current_thread():
+            writer_thread.join()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+
+
+def _resolve(future: asyncio.Future, result: Any, error: BaseException | None):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+_databases: dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_db(filename_db: str) -> Database:
+    with _databases_lock:
+        if filename_db not in _databases:
+            _databases[filename_db] = Database(os.path.join(DB_DIR, filename_db))
+        return _databases[filename_db]
+
+
+def get_db_at(path: str) -> Database:
+    """Shared connections of a database file outside `./db`, keyed by its path."""
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path)
+        return _databases[path]
+
+
+def acquire_db(filename_db: str) -> Database:
+    db = get_db(filename_db)
+    with _databases_lock:
+        db.users += 1
+    return db
+
+
+def release_db(filename_db: str):
+    """Close the file's connections once no graph run uses it anymore."""
+    db = get_db(filename_db)
+    with _databases_lock:
+        db.users = max(db.users - 1, 0)
+        if db.users:
+            return
+    db.close()
+
+
+def db_stats() -> dict[str, dict[str, float]]:
+    """Per file: async reads and queued write batches, with the time spent running them."""
+    with _databases_lock:
+        databases = dict(_databases)
+    return {
+        filename: {
+            "reads": db.reads,
+            "read_seconds": db.read_seconds,
+            "write_batches": db.write_batches,
+            "write_jobs": db.write_jobs,
+            "write_seconds": db.write_seconds,
+        }
+        for filename, db in databases.items()
+    }
+
+
+@atexit.register
+def close_all():
+    with _databases_lock:
+        databases = list(_databases.values())
+    for db in databases:
+        db.close()
@@ -0,0 +1,194 @@
+"""Near-duplicate question index (MinHash + LSH) stored in the dataset database.
+
+Every question that is not a duplicate gets a MinHash signature over its word
+shingles in `question_signatures`. Its LSH band buckets go in `question_lsh`,
+which is indexed on `(band, bucket)`. A new question is only compared with
+questions of the same topic sharing at least one bucket (of any topic with
+`DUPLICATE_ACROSS_TOPICS`). When its estimated Jaccard similarity with one of
+them reaches `DUPLICATE_THRESHOLD`, it gets `duplicate_of` set and is never
+answered.
+
+Questions are indexed as they are saved. Rows saved before the index existed
+are caught up before answering. Large databases can be rebuilt with several
+processes:
+
+    python -m agent.dedup 04-01-2025-dataset.db --processes 8
+"""
+
+import argparse
+import array
+import os
+import sqlite3
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from agent.config import DUPLICATE_ACROSS_TOPICS, DUPLICATE_LSH_BANDS, DUPLICATE_NUM_PERM, DUPLICATE_SHINGLE_SIZE, DUPLICATE_THRESHOLD
+from agent.db import DB_DIR, get_db
+from agent.similarity import MinHash, shingles, stable_hash
+
+ROWS_PER_BAND = DUPLICATE_NUM_PERM // DUPLICATE_LSH_BANDS
+BUCKET_MASK = (1 << 63) - 1
+REBUILD_CHUNK_SIZE = 2000
+
+minhash = MinHash(DUPLICATE_NUM_PERM)
+
+
+def question_signature(question: str) -> list[int]:
+    return minhash.signature(shingles(question, DUPLICATE_SHINGLE_SIZE))
+
+
+def band_buckets(signature: list[int]) -> list[tuple[int, int]]:
+    return [
+        (band, stable_hash(",".join(map(str, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))) & BUCKET_MASK)
+        for band in range(DUPLICATE_LSH_BANDS)
+    ]
+
+
+def pack(signature: list[int]) -> bytes:
+    return array.array("I", signature).tobytes()
+
+
+def unpack(blob: bytes) -> list[int]:
+    return array.array("I", blob).tolist()
+
+
+def dedup_scope(topic: str | None) -> str | None:
+    """Topic a question is deduplicated within; `None` compares it with every topic."""
+    return None if DUPLICATE_ACROSS_TOPICS else topic
+
+
+def find_duplicate(cursor: sqlite3.Cursor, signature: list[int], buckets: list[tuple[int, int]], topic: str | None = None) -> int | None:
+    """Id of the most similar indexed question at or above the threshold, if any.
+
+    With a `topic`, only questions of that topic's subtopics are considered.
+    """
+    # One indexed lookup per band; a row-value `IN (VALUES ...)` scans the whole table.
+    lookups = " UNION ".join(["SELECT qa_id FROM question_lsh WHERE band = ? AND bucket = ?"] * len(buckets))
+    params: list[int | str] = [value for bucket in buckets for value in bucket]
+    if topic is None:
+        cursor.execute(f"""SELECT s.qa_id, s.signature FROM question_signatures s
+        WHERE s.qa_id IN ({lookups});""", params)
+    else:
+        cursor.execute(f"""SELECT s.qa_id, s.signature FROM question_signatures s
+        JOIN questions_answers qa ON qa.id = s.qa_id
+        JOIN subtopics st ON st.id = qa.subtopic_id
+        WHERE s.qa_id IN ({lookups}) AND st.topic = ?;""", params + [topic])
+    best_id, best_similarity = None, DUPLICATE_THRESHOLD
+    for qa_id, blob in cursor.fetchall():
+        similarity = MinHash.estimate(signature, unpack(blob))
+        if similarity >= best_similarity:
+            best_id, best_similarity = qa_id, similarity
+    return best_id
+
+
+def index_question(cursor: sqlite3.Cursor, qa_id: int, signature: list[int], topic: str | None) -> int | None:
+    """Index a question unless it duplicates an indexed one; returns the original's id if it does."""
+    buckets = band_buckets(signature)
+    original = find_duplicate(cursor, signature, buckets, dedup_scope(topic))
+    if original is None:
+        cursor.execute("INSERT OR REPLACE INTO question_signatures (qa_id, signature) VALUES (?, ?);", (qa_id, pack(signature)))
+        cursor.executemany("INSERT INTO question_lsh (band, bucket, qa_id) VALUES (?, ?, ?);",
+                           [(band, bucket, qa_id) for band, bucket in buckets])
+    return original
+
+
+def index_questions(cursor: sqlite3.Cursor, questions: list[tuple[int, str, str | None]]) -> int:
+    """Index `(qa_id, question, topic)` rows in order, flagging duplicates; returns how many were flagged."""
+    flagged = 0
+    for qa_id, question, topic in questions:
+        original = index_question(cursor, qa_id, question_signature(question), topic)
+        if original is not None:
+            cursor.execute("UPDATE questions_answers SET duplicate_of = ? WHERE id = ?;", (original, qa_id))
+            flagged += 1
+    return flagged
+
+
+def index_unindexed(cursor: sqlite3.Cursor) -> int:
+    """Index questions saved before the index existed; returns how many were flagged."""
+    cursor.execute("""SELECT qa.id, qa.question, st.topic FROM questions_answers qa
+    LEFT JOIN subtopics st ON st.id = qa.subtopic_id
+    WHERE qa.duplicate_of IS NULL
+        AND NOT EXISTS (SELECT 1 FROM question_signatures s WHERE s.qa_id = qa.id)
+    ORDER BY qa.id;""")
+    return index_questions(cursor, cursor.fetchall())
+
+
+def signatures_of(questions: list[str]) -> list[list[int]]:
+    return [question_signature(question) for question in questions]
+
+
+def question_chunks(cursor: sqlite3.Cursor) -> Iterator[list[tuple[int, str, str | None]]]:
+    cursor.execute("""SELECT qa.id, qa.question, st.topic FROM questions_answers qa
+    LEFT JOIN subtopics st ON st.id = qa.subtopic_id
+    ORDER BY qa.id;""")
+    while rows := cursor.fetchmany(REBUILD_CHUNK_SIZE):
+        yield rows
+
+
+def rebuild_index(path: str, processes: int | None = None) -> tuple[int, int]:
+    """Recompute the whole index from scratch, hashing with `processes` worker processes.
+
+    Questions are streamed in chunks of `REBUILD_CHUNK_SIZE`, with a few chunks
+    being hashed ahead of the one being indexed. Each question is looked up in
+    the index tables written so far, like a newly saved one, so memory does
+    not grow with the database. The earliest question of every group of
+    near-duplicates is kept. Returns the number of indexed and flagged questions.
+    """
+    conn = sqlite3.connect(path)
+    reader, writer = conn.cursor(), conn.cursor()
+    counts = {"indexed": 0, "flagged": 0}
+
+    def index_chunk(rows: list[tuple[int, str, str | None]], signatures: list[list[int]]):
+        for (qa_id, _, topic), signature in zip(rows, signatures):
+            original = index_question(writer, qa_id, signature, topic)
+            if original is None:
+                counts["indexed"] += 1
+                continue
+            writer.execute("INSERT INTO rebuild_duplicates (qa_id, original) VALUES (?, ?);", (qa_id, original))
+            counts["flagged"] += 1
+
+    writer.execute("BEGIN;")
+    writer.execute("DELETE FROM question_lsh;")
+    writer.execute("DELETE FROM question_signatures;")
+    writer.execute("CREATE TEMP TABLE rebuild_duplicates (qa_id INTEGER PRIMARY KEY, original INTEGER NOT NULL);")
+    lookahead = 2 * (processes or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        hashing: deque[tuple[list[tuple[int, str, str | None]], Future]] = deque()
+        for rows in question_chunks(reader):
+            hashing.append((rows, executor.submit(signatures_of, [question for _, question, _ in rows])))
+            if len(hashing) >= lookahead:
+                rows, future = hashing.popleft()
+                index_chunk(rows, future.result())
+        while hashing:
+            rows, future = hashing.popleft()
+            index_chunk(rows, future.result())
+    # questions_answers is only updated once the streaming read of it is done.
+    writer.execute("UPDATE questions_answers SET duplicate_of = NULL WHERE duplicate_of IS NOT NULL;")
+    writer.execute("""UPDATE questions_answers SET duplicate_of = d.original
+    FROM rebuild_duplicates d WHERE d.qa_id = questions_answers.id;""")
+    writer.execute("DROP TABLE rebuild_duplicates;")
+    conn.commit()
+    reader.close()
+    writer.close()
+    conn.close()
+    return counts["indexed"], counts["flagged"]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m agent.dedup", description="Rebuild the near-duplicate question index of a dataset database.")
+    parser.add_argument("filename_db", help="Database file name under ./db, e.g. 04-01-2025-dataset.db")
+    parser.add_argument("-p", "--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    from agent.queries import create_tables
+    with get_db(args.filename_db).write() as cursor:
+        create_tables(cursor)
+    start = time.perf_counter()
+    indexed, flagged = rebuild_index(os.path.join(DB_DIR, args.filename_db), args.processes)
+    print(f"Indexed {indexed} questions, flagged {flagged} near-duplicates in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Streaming JSONL/CSV export of question/answer pairs.
+
+Rows are read with `fetchmany` and written as they arrive, so an export holds
+at most one fetch of rows in memory however large the database is. Output can
+be gzip-compressed and split into shards by row count and/or file size. Every
+export writes a `<name>.manifest.json` next to its files, with the row count,
+size and sha256 of each shard.
+
+An incremental export only writes the rows answered or re-answered since the
+last incremental export of the same target. It tracks a per-target watermark
+in the `export_watermarks` table. The first one is a full export:
+
+    python -m agent.export 04-01-2025-dataset.db --format jsonl --gzip --max-rows 100000
+    python -m agent.export 04-01-2025-dataset.db --incremental --target nightly
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any, BinaryIO, Literal, TypedDict
+
+from agent.config import EXPORT_DIR, EXPORT_FETCH_SIZE, EXPORT_GZIP, EXPORT_MAX_BYTES_PER_FILE, EXPORT_MAX_ROWS_PER_FILE
+from agent.db import get_db
+from agent.queries import Watermark, create_tables, iter_answered_pairs, iter_changed_pairs, select_export_bounds, select_watermark, update_watermark
+
+Format = Literal["jsonl", "csv"]
+
+CSV_HEADER = ["Question", "Answer"]
+
+
+class Shard(TypedDict):
+    path: str
+    rows: int
+    bytes: int
+    sha256: str
+
+
+class HashingFile(io.FileIO):
+    """Binary file that hashes everything written to it."""
+
+    def __init__(self, path: str):
+        super().__init__(path, "wb")
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: Any) -> int:  # type: ignore[override]
+        written = super().write(data)
+        self.sha256.update(memoryview(data)[:written])
+        return written  # type: ignore
+
+
+class ShardedWriter:
+    """Writes `(question, answer)` rows to `{base}.{format}[.gz]`, or to numbered shards.
+
+    A shard is closed and the next one started once it holds `max_rows` rows
+    or `max_bytes` bytes on disk (compressed size when gzipped); 0 means no limit.
+    """
+
+    def __init__(self, base_path: str, format: Format, compress: bool = EXPORT_GZIP,
+                 max_rows: int = EXPORT_MAX_ROWS_PER_FILE, max_bytes: int = EXPORT_MAX_BYTES_PER_FILE):
+        self.base_path = base_path
+        self.format = format
+        self.compress = compress
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.paths: list[str] = []
+        self.shards: list[Shard] = []
+        self.rows = 0
+        self._raw: HashingFile | None = None
+        self._buffer: io.BufferedWriter | None = None
+        self._gzip: gzip.GzipFile | None = None
+        self._text: io.TextIOWrapper | None = None
+        self._csv: Any = None
+        self._shard_rows = 0
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.max_rows or self.max_bytes)
+
+    def _path(self) -> str:
+        extension = f".{self.format}" + (".gz" if self.compress else "")
+        if not self.sharded:
+            return self.base_path + extension
+        return f"{self.base_path}-{len(self.paths):05d}{extension}"
+
+    def _open(self):
+        path = self._path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._raw = HashingFile(path)
+        self._buffer = io.BufferedWriter(self._raw)
+        stream: BinaryIO = self._buffer
+        if self.compress:
+            self._gzip = gzip.GzipFile(fileobj=self._buffer, mode="wb", compresslevel=6, mtime=0)
+            stream = self._gzip  # type: ignore
+        self._text = io.TextIOWrapper(stream, encoding="utf-8", newline="" if self.format == "csv" else None, write_through=False)  # type: ignore
+        if self.format == "csv":
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(CSV_HEADER)
+        self.paths.append(path)
+        self._shard_rows = 0
+
+    def _close_shard(self):
+        if self._text is not None:
+            self._text.close()  # closes the gzip stream, which does not close the buffer
+        if self._buffer is not None and not self._buffer.closed:
+            self._buffer.close()
+        if self._raw is not None:
+            self.shards.append({"path": self.paths[-1], "rows": self._shard_rows,
+                                "bytes": os.path.getsize(self.paths[-1]), "sha256": self._raw.sha256.hexdigest()})
+        self._raw = self._buffer = self._gzip = self._text = self._csv = None
+
+    def _shard_full(self) -> bool:
+        if self.max_rows and self._shard_rows >= self.max_rows:
+            return True
+        if self.max_bytes:
+            self._text.flush()  # type: ignore
+            return self._buffer.tell() >= self.max_bytes  # type: ignore
+        return False
+
+    def write(self, question: str, answer: str):
+        if self._text is None:
+            self._open()
+        elif self._shard_full():
+            self._close_shard()
+            self._open()
+        if self.format == "csv":
+            self._csv.writerow([question, answer])
+        else:
+            self._text.write(json.dumps({"instruction": question, "context": "", "response": answer}) + "\n")  # type: ignore
+        self._shard_rows += 1
+        self.rows += 1
+
+    def write_rows(self, rows: Iterable[tuple[str, str]]) -> "ShardedWriter":
+        for question, answer in rows:
+            self.write(question, answer)
+        return self
+
+    def close(self):
+        if self._text is None and not self.paths:
+            self._open()  # an empty export still produces a file
+        self._close_shard()
+
+    def __enter__(self) -> "ShardedWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.close()
+
+
+def export_base_path(output_dir: str = EXPORT_DIR, now: datetime | None = None, suffix: str = "") -> str:
+    """`./output/<date>/<date>-<time>-train[-suffix]`, the location outputs always used."""
+    now = now or datetime.now()
+    current_date_dash = now.strftime("%m-%d-%Y")
+    current_time = now.strftime("%H_%M_%S")
+    name = f"{current_date_dash}-{current_time}-train" + (f"-{suffix}" if suffix else "")
+    return os.path.join(output_dir, current_date_dash, name)
+
+
+def write_manifest(base_path: str, shards: list[Shard], **details: Any) -> str:
+    """Write `<base_path>.manifest.json` describing `shards`; shard paths are relative to it."""
+    path = f"{base_path}.manifest.json"
+    manifest = {
+        **details,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": sum(shard["rows"] for shard in shards),
+        "shards": [{**shard, "path": os.path.basename(shard["path"])} for shard in shards],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def export_rows(rows: Iterable[tuple[str, str]], base_path: str, format: Format, manifest: dict[str, Any] | None = None, **options: Any) -> tuple[list[str], int]:
+    """Write `rows` and their manifest; returns the files written and the number of rows."""
+    with ShardedWriter(base_path, format, **options) as writer:
+        writer.write_rows(rows)
+    write_manifest(base_path, writer.shards, format=format, compressed=writer.compress, **(manifest or {}))
+    return writer.paths, writer.rows
+
+
+def export_incremental(cursor: sqlite3.Cursor, target: str, base_path: str, format: Format,
+                       fetch_size: int = EXPORT_FETCH_SIZE, **options: Any) -> tuple[list[str], int, Watermark]:
+    """Export the pairs answered since the last export of `target`.
+
+    Returns the files, the row count and the watermark to store with
+    `update_watermark` once the files are safely in place.
+    """
+    since = select_watermark(cursor, target)
+    until = select_export_bounds(cursor)
+    paths, rows = export_rows(
+        iter_changed_pairs(cursor, since, until, fetch_size), base_path, format,
+        manifest={"target": target, "incremental": True, "since": since, "until": until},
+        **options,
+    )
+    return paths, rows, until
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m agent.export", description="Export the answered questions of a dataset database.")
+    parser.add_argument("filename_db", help="Database file name under ./db, e.g. 04-01-2025-dataset.db")
+    parser.add_argument("-f", "--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("-o", "--output-dir", default=EXPORT_DIR)
+    parser.add_argument("--gzip", action=argparse.BooleanOptionalAction, default=EXPORT_GZIP)
+    parser.add_argument("--max-rows", type=int, default=EXPORT_MAX_ROWS_PER_FILE, help="Rows per shard, 0 for no limit.")
+    parser.add_argument("--max-bytes", type=int, default=EXPORT_MAX_BYTES_PER_FILE, help="Bytes per shard on disk, 0 for no limit.")
+    parser.add_argument("--fetch-size", type=int, default=EXPORT_FETCH_SIZE)
+    parser.add_argument("--incremental", action="store_true", help="Only export rows answered since the target's last incremental export.")
+    parser.add_argument("--target", help="Watermark name of an incremental export. Defaults to the format.")
+    args = parser.parse_args()
+
+    db = get_db(args.filename_db)
+    with db.write() as cursor:
+        create_tables(cursor)
+    options = {"compress": args.gzip, "max_rows": args.max_rows, "max_bytes": args.max_bytes}
+    if args.incremental:
+        target = args.target or args.format
+        base_path = export_base_path(args.output_dir, suffix="incremental")
+        with db.read() as cursor:
+            paths, rows, watermark = export_incremental(cursor, target, base_path, args.format, args.fetch_size, **options)
+        with db.write() as cursor:
+            update_watermark(cursor, target, watermark, datetime.now().isoformat(timespec="seconds"))
+    else:
+        base_path = export_base_path(args.output_dir)
+        with db.read() as cursor:
+            paths, rows = export_rows(iter_answered_pairs(cursor, args.fetch_size), base_path, args.format, **options)
+    print(f"Exported {rows} rows to {len(paths)} file(s): {', '.join(paths)}; manifest {base_path}.manifest.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Few-shot example selection for question generation.
+
+The prompt used to embed every example of every topic. Now a BM25 index over
+the examples' topic, subtopic and question picks the `FEW_SHOT_EXAMPLES`
+examples closest to the subtopic being generated. They go in the user message
+(GENERATE_QUESTION_REQUEST) so the GENERATE_QUESTION_PROMPT system message
+stays static. Rendered requests are memoized per (topic, subtopic), so
+regenerations reuse them. `stats` tracks how many estimated prompt tokens
+this saves compared with the full example list.
+"""
+
+from functools import lru_cache
+
+from agent.bm25 import BM25
+from agent.config import FEW_SHOT_EXAMPLES
+from agent.prompts import GENERATE_QUESTION_PROMPT, GENERATE_QUESTION_REQUEST, QUESTION_EXAMPLE_FORMAT, QUESTION_EXAMPLES
+from agent.ratelimit import CHARS_PER_TOKEN
+
+stats = {
+    "renders": 0,
+    "calls": 0,
+    "full_tokens": 0,
+    "sent_tokens": 0,
+}
+
+index = BM25([f"{topic} {subtopic} {question}" for topic, subtopic, question in QUESTION_EXAMPLES])
+
+
+def format_examples(examples: list[tuple[str, str, str]]) -> str:
+    return "\n".join(QUESTION_EXAMPLE_FORMAT.format(topic=topic, subtopic=subtopic, question=question)
+                     for topic, subtopic, question in examples)
+
+
+def select_examples(topic: str, subtopic: str, k: int = FEW_SHOT_EXAMPLES) -> list[tuple[str, str, str]]:
+    """The `k` examples most relevant to the subtopic, in their original order; all of them when `k` is 0."""
+    if k <= 0 or k >= len(QUESTION_EXAMPLES):
+        return list(QUESTION_EXAMPLES)
+    # The subtopic is repeated so it weighs more than the topic shared by a whole block of examples.
+    return [QUESTION_EXAMPLES[i] for i in sorted(index.top(f"{topic} {subtopic} {subtopic}", k))]
+
+
+def estimate_prompt_tokens(prompt: str) -> int:
+    return len(prompt) // CHARS_PER_TOKEN + 1
+
+
+def format_request(examples: list[tuple[str, str, str]], topic: str, subtopic: str, num_questions: int) -> str:
+    return GENERATE_QUESTION_REQUEST.format(examples=format_examples(examples), num_questions=num_questions, topic=topic, subtopic=subtopic)
+
+
+@lru_cache(maxsize=1024)
+def full_prompt_tokens(topic: str, subtopic: str, num_questions: int) -> int:
+    return estimate_prompt_tokens(GENERATE_QUESTION_PROMPT + format_request(QUESTION_EXAMPLES, topic, subtopic, num_questions))
+
+
+@lru_cache(maxsize=1024)
+def render_question_request(topic: str, subtopic: str, num_questions: int) -> str:
+    stats["renders"] += 1
+    return format_request(select_examples(topic, subtopic), topic, subtopic, num_questions)
+
+
+def question_request(topic: str, subtopic: str, num_questions: int) -> str:
+    """User message asking for the subtopic's questions, recording the tokens it saves."""
+    request = render_question_request(topic, subtopic, num_questions)
+    stats["calls"] += 1
+    stats["full_tokens"] += full_prompt_tokens(topic, subtopic, num_questions)
+    stats["sent_tokens"] += estimate_prompt_tokens(GENERATE_QUESTION_PROMPT + request)
+    return request
+
+
+def few_shot_stats() -> dict[str, int | float]:
+    saved = stats["full_tokens"] - stats["sent_tokens"]
+    return {
+        **stats,
+        "saved_tokens": saved,
+        "saved_tokens_per_call": saved / stats["calls"] if stats["calls"] else 0.0,
+    }
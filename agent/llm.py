@@ -0,0 +1,140 @@
+"""Single entry point for every structured-output LLM call made by the nodes.
+
+Every call that reaches the provider records its token usage under the graph
+node that made it, including the prompt tokens the provider served from its
+prompt cache, see `usage_stats`.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, TypeVar
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.runnables.config import ensure_config
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+
+from agent.cache import is_deterministic, llm_cache, make_key
+from agent.config import LLM_CACHE_ENABLED, LLM_CALL_TIMEOUT_SECONDS
+from agent.ratelimit import deployment_of, limiter_for, request_budget
+from agent.retry import call_with_retry
+
+T = TypeVar("T", bound=BaseModel)
+
+# node -> calls, prompt/cached/completion tokens, and latency split by whether
+# part of the prompt was served from the provider's prompt cache.
+usage: dict[str, dict[str, float]] = {}
+
+
+def token_usage(result: LLMResult) -> tuple[int, int, int]:
+    """Prompt, cached prompt and completion tokens reported for one request."""
+    metadata = getattr(result.generations[0][0].message, "usage_metadata", None) if result.generations and result.generations[0] else None
+    if metadata:
+        cached = (metadata.get("input_token_details") or {}).get("cache_read") or 0
+        return metadata.get("input_tokens", 0), cached, metadata.get("output_tokens", 0)
+    token_usage = (result.llm_output or {}).get("token_usage") or {}
+    cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return token_usage.get("prompt_tokens", 0), cached, token_usage.get("completion_tokens", 0)
+
+
+def record_usage(node: str, result: LLMResult, seconds: float) -> tuple[int, int, int]:
+    """Add one request to the node's usage; returns its prompt, cached prompt and completion tokens."""
+    prompt_tokens, cached_tokens, completion_tokens = token_usage(result)
+    stats = usage.setdefault(node, {
+        "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+        "cache_hit_calls": 0, "cache_hit_seconds": 0.0, "cache_miss_seconds": 0.0,
+    })
+    stats["calls"] += 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["cached_tokens"] += cached_tokens
+    stats["completion_tokens"] += completion_tokens
+    if cached_tokens:
+        stats["cache_hit_calls"] += 1
+        stats["cache_hit_seconds"] += seconds
+    else:
+        stats["cache_miss_seconds"] += seconds
+    return prompt_tokens, cached_tokens, completion_tokens
+
+
+def usage_stats() -> dict[str, dict[str, float]]:
+    """Per-node usage with the cached share of prompt tokens and mean latency with and without cache hits."""
+    report = {}
+    for node, stats in usage.items():
+        misses = stats["calls"] - stats["cache_hit_calls"]
+        report[node] = {
+            **stats,
+            "cached_ratio": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0,
+            "mean_seconds_cache_hit": stats["cache_hit_seconds"] / stats["cache_hit_calls"] if stats["cache_hit_calls"] else 0.0,
+            "mean_seconds_cache_miss": stats["cache_miss_seconds"] / misses if misses else 0.0,
+        }
+    return report
+
+
+def parse_generation(schema: type[T], generation: ChatGeneration) -> T:
+    tool_calls = getattr(generation.message, "tool_calls", None)
+    if not tool_calls:
+        raise OutputParserException(f"Expected a {schema.__name__} tool call, got: {generation.message.content!r}")
+    return schema.model_validate(tool_calls[0]["args"])
+
+
+async def agenerate_structured(llm: Any, schema: type[T], query: list[BaseMessage], n: int = 1) -> list[T]:
+    """Ask `llm` for `n` completions of `query` in one request, each parsed into `schema`.
+
+    Deterministic calls (temperature 0) are served from the persistent cache
+    when the same deployment, schema, messages and sampling params were seen
+    before. Everything else waits for the deployment's shared concurrency,
+    requests-per-minute and tokens-per-minute budget before going out, and
+    transient failures are retried behind the deployment's circuit breaker.
+    Each attempt is capped at `LLM_CALL_TIMEOUT_SECONDS` once it leaves the
+    local queue.
+    """
+    deterministic = is_deterministic(llm)
+    use_cache = LLM_CACHE_ENABLED and deterministic
+    if use_cache:
+        key = make_key(llm, schema, query, n=n)
+        cached = await llm_cache.aget(key)
+        if cached is not None:
+            return [schema.model_validate(item) for item in json.loads(cached)]
+
+    tool = convert_to_openai_tool(schema)
+    tool_choice = {"type": "function", "function": {"name": tool["function"]["name"]}}
+    sampling = {"n": n} if n > 1 else {}
+    config = ensure_config()
+    node = (config.get("metadata") or {}).get("langgraph_node", "unknown")
+
+    async def call() -> list[T]:
+        limiter = limiter_for(llm)
+        budget = request_budget(query, n)
+        async with limiter.acquire(budget):
+            start = time.perf_counter()
+            result = await asyncio.wait_for(
+                llm.agenerate(
+                    [query],
+                    callbacks=config.get("callbacks"),
+                    tags=config.get("tags"),
+                    metadata=config.get("metadata"),
+                    tools=[tool],
+                    tool_choice=tool_choice,
+                    **sampling,
+                ),
+                timeout=LLM_CALL_TIMEOUT_SECONDS,
+            )
+        prompt_tokens, _, completion_tokens = record_usage(node, result, time.perf_counter() - start)
+        if prompt_tokens or completion_tokens:
+            limiter.reconcile(budget, prompt_tokens + completion_tokens)
+        return [parse_generation(schema, generation) for generation in result.generations[0]]
+
+    responses = await call_with_retry(deployment_of(llm), call, deterministic)
+
+    if use_cache:
+        await llm_cache.aset(key, json.dumps([response.model_dump() for response in responses]))
+    return responses
+
+
+async def ainvoke_structured(llm: Any, schema: type[T], query: list[BaseMessage]) -> T:
+    """Single-completion shorthand for `agenerate_structured`."""
+    responses = await agenerate_structured(llm, schema, query)
+    return responses[0]
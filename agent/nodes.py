@@ -1,20 +1,29 @@
 from enum import Enum
 from typing import Annotated, Any, Literal, Tuple, TypedDict
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.utils import convert_to_secret_str
 from langchain_openai import AzureChatOpenAI
 from datetime import datetime
+import asyncio
 import os
 import operator
-import json
-import csv
 
 from dotenv import load_dotenv
-from langgraph.graph import END
 from pydantic import BaseModel
 import sqlite3
 
-from agent.prompts import CHECK_QUESTIONS_RELEVANCE_PROMPT, CHECK_RESPONSE_RELEVANCE_PROMPT, CHOOSE_BEST_QUESTION, CHOOSE_BEST_RESPONSE_PROMPT, GENERATE_ANSWER_PROMPT, GENERATE_QUESTION_PROMPT, GENERATE_SUBTOPIC_NEW_PROMPT, GENERATE_SUBTOPIC_PROMPT, RANK_SUBTOPICS_PROMPT
+from agent.batch import build_request, get_batch_client, read_batch_results, wait_for_batch, write_batch_file
+from agent.columnar import export_columnar
+from agent.config import BATCH_DEPLOYMENT, BATCH_POLL_INTERVAL_SECONDS, CANDIDATES_PER_MODE, DEFAULT_NUM_CANDIDATES, EXPORT_FETCH_SIZE, EXPORT_ROW_GROUP_SIZE, GROUNDED_ANSWERS, GROUNDING_PASSAGES, LLM_CALL_TIMEOUT_SECONDS
+from agent.corpus import Passage, retrieve
+from agent.db import acquire_db, get_db, release_db
+from agent.export import Format, export_base_path, export_incremental, export_rows
+from agent.fewshot import question_request
+from agent.llm import agenerate_structured, ainvoke_structured
+from agent.queries import create_tables, find_open_batch, flag_duplicates, insert_questions, insert_subtopics, iter_answered_pairs, iter_answered_rows, mark_answered_subtopics, seed_subtopics, select_all_subtopics, select_base_dataset, select_pairs_by_id, select_pending_answers, select_subtopic_names, select_subtopics_without_questions, select_unanswered_questions, update_answers, update_watermark, upsert_batch
+from agent.prompts import CHECK_QUESTIONS_RELEVANCE_PROMPT, CHECK_RESPONSE_RELEVANCE_PROMPT, CHOOSE_BEST_QUESTION, CHOOSE_BEST_RESPONSE_PROMPT, GENERATE_ANSWER_PROMPT, GENERATE_QUESTION_PROMPT, GENERATE_SUBTOPIC_NEW_PROMPT, GROUNDED_ANSWER_INSTRUCTION, GENERATE_SUBTOPIC_PROMPT, RANK_SUBTOPICS_PROMPT, REGENERATE_ANSWER_PROMPT, REGENERATE_QUESTIONS_PROMPT, SCORE_RESPONSE_INSTRUCTION
+from agent.selection import select_best
+from agent.writer import get_writer
 
 
 load_dotenv()
@@ -23,7 +32,8 @@ fast_llm = AzureChatOpenAI(
     api_version="2025-03-01-preview",
     temperature=0,
     max_tokens=None,
-    timeout=None,
+    timeout=LLM_CALL_TIMEOUT_SECONDS,
+    max_retries=0,
     seed=69
 )
 
@@ -34,7 +44,8 @@ creative_llm = AzureChatOpenAI(
     api_key=convert_to_secret_str(os.environ["AZURE_OPENAI_GPT4O_API_KEY"]),
     temperature=0.6,
     max_tokens=None,
-    timeout=None,
+    timeout=LLM_CALL_TIMEOUT_SECONDS,
+    max_retries=0,
 )
 
 
@@ -48,8 +59,12 @@ class Mode(Enum):
     QUESTION_GENERATION = "question_generation"
     RESPONSE_GENERATION = "response_generation"
     RESPONSE_GENERATION_SOME = "response_generation_some"
+    RESPONSE_GENERATION_BATCH = "response_generation_batch"
     OUTPUT_JSONL = "output_jsonl"
     OUTPUT_CSV = "output_csv"
+    OUTPUT_JSONL_INCREMENTAL = "output_jsonl_incremental"
+    OUTPUT_CSV_INCREMENTAL = "output_csv_incremental"
+    OUTPUT_COLUMNAR = "output_columnar"
 
 class Topic(Enum):
     PROMPT_ENGINEERING = "Prompt Engineering"
@@ -65,35 +80,54 @@ class MainOverallState(TypedDict):
     mode: Mode
     topic: Topic
     subtopics: list[dict]
-    current_subtopic_id: int
-    current_subtopic_index: int
     subtopics_with_ranking: list[Tuple[str, int]]
     subtopic_generation: int
     filename_db: str
     dataset: list[dict]
-    best_responses: Annotated[list[dict], operator.add]
-    best_question_set: list[Tuple[int, str]]
+    saved_qa_ids: Annotated[list[int], operator.add]
+    questions_saved: Annotated[list[int], operator.add]
     status: str
 
 ###### GenResponse Graph ######
+class AnswerTaskState(TypedDict):
+    filename_db: str
+    question: str
+    topic: str
+    subtopic: str
+    subtopic_id: int
+    num_candidates: int
+
 class OverallState(TypedDict):
-    qa_id: int
     question: str
     topic: str
     subtopic: str
     subtopic_id: int
-    response1: str
-    response2: str
+    num_candidates: int
+    responses: list[str]
+    rejected_responses: list[str]
     best_response: str
     is_relevant_accurate: bool
+    attempts: int
+    draft_score: int
+    tier: str
+    passages: list[Passage]
 
 ###### GenQuestion Graph ######
+class QuestionTaskState(TypedDict):
+    filename_db: str
+    topic: str
+    subtopic: str
+    subtopic_id: int
+    num_candidates: int
+
 class QuestionOverallState(TypedDict):
-    questions1: list[str]
-    questions2: list[str]
+    num_candidates: int
+    question_sets: list[list[str]]
+    rejected_sets: list[list[str]]
     subtopic_id: int
     best_set: list[str]
     is_relevant: bool
+    attempts: int
     subtopic: str
     topic: str
 
@@ -103,14 +137,16 @@ class GenResponse(BaseModel):
     """Response/Answer based from the given question"""
     answer: str
 
-class BestResponse(BaseModel):
-    """Best Response/Answer based from the given question"""
-    best_response: str
-
 class IsRelevantAccurate(BaseModel):
     """Is the response relevant and accurate from the question?"""
     is_relevant_accurate: bool
 
+class DraftGrade(BaseModel):
+    """Is the response relevant and accurate from the question, and its quality
+    score from 1 (poor) to 5 (excellent)?"""
+    is_relevant_accurate: bool
+    score: int
+
 ###### GenSubtopics Graph ######
 class Subtopics(BaseModel):
     """Subtopics based from the given topic. The list should be maximum of 50
@@ -136,73 +172,101 @@ class QuestionsGenerated(BaseModel):
     The list should be maximum of 50 elements."""
     questions: list[str]
 
-class BestQuestionSet(BaseModel):
-    """Determines the best set of question.
-    Can either be 1 or 2 which represents which # of set they are."""
-    best_set: int
-
 class QuestionSetRelevance(BaseModel):
     """Determines if the set of questions is relevant to the topic and subtopic."""
     is_relevant: bool
 
 ### Nodes ###
+def num_candidates(mode: str) -> int:
+    return CANDIDATES_PER_MODE.get(mode, DEFAULT_NUM_CANDIDATES)
+
+def format_context(topic: str, subtopic: str, question: str | None = None) -> str:
+    """Per-call details, sent after the static system prompt so its prefix can be cached."""
+    context = f"Topic: {topic}\nSubtopic: {subtopic}"
+    return f"{context}\nQuestion: {question}" if question is not None else context
+
+def format_passages(passages: list[Passage]) -> str:
+    return "\n\n".join(f"[{i}] ({passage['source']})\n{passage['text']}" for i, passage in enumerate(passages, 1))
+
 ###### GenResponse Graph ######
-async def generate_response1(state: OverallState):
-    sys_msg = SystemMessage(
-        content=GENERATE_ANSWER_PROMPT.format(
-            topic=state["topic"],
-            subtopic=state["subtopic"],
-        )
-    )
-    human_msg = HumanMessage(content=state["question"])
-    query = [sys_msg] + [human_msg]
-    response: GenResponse | Any = await creative_llm.with_structured_output(GenResponse).ainvoke(query)
+def grounding_query(subtopic: str, question: str) -> str:
+    return f"{subtopic} {question}"
+
+async def retrieve_passages(state: OverallState):
+    # Escalations from the cascade already carry the draft's passages.
+    if "passages" in state:
+        return {}
     return {
-        "response1": response.answer
+        "passages": await retrieve(grounding_query(state["subtopic"], state["question"]), GROUNDING_PASSAGES)
     }
 
-async def generate_response2(state: OverallState):
-    sys_msg = SystemMessage(
-        content=GENERATE_ANSWER_PROMPT.format(
-            topic=state["topic"],
-            subtopic=state["subtopic"],
-        )
-    )
-    human_msg = HumanMessage(content=state["question"])
-    query = [sys_msg] + [human_msg]
-    response: GenResponse | Any = await creative_llm.with_structured_output(GenResponse).ainvoke(query)
+def build_answer_query(topic: str, subtopic: str, question: str, passages: list[Passage] | None = None) -> list[BaseMessage]:
+    if not passages:
+        sys_msg = SystemMessage(content=GENERATE_ANSWER_PROMPT)
+        human_msg = HumanMessage(content=format_context(topic, subtopic, question))
+        return [sys_msg] + [human_msg]
+    sys_msg = SystemMessage(content=GENERATE_ANSWER_PROMPT + GROUNDED_ANSWER_INSTRUCTION)
+    human_msg = HumanMessage(content=f"{format_context(topic, subtopic, question)}\n\nPassages:\n{format_passages(passages)}")
+    return [sys_msg] + [human_msg]
+
+async def generate_responses(state: OverallState):
+    kept = state.get("responses", [])
+    query = build_answer_query(state["topic"], state["subtopic"], state["question"], state.get("passages"))
+    if state.get("rejected_responses"):
+        rejected = "\n\n".join(state["rejected_responses"])
+        query.append(HumanMessage(content=REGENERATE_ANSWER_PROMPT.format(rejected=rejected)))
+    missing = max(state.get("num_candidates", 2) - len(kept), 1)
+    responses = await agenerate_structured(creative_llm, GenResponse, query, n=missing)
     return {
-        "response2": response.answer
+        "responses": kept + [response.answer for response in responses]
     }
 
 async def choose_best_response(state: OverallState):
-    sys_msg = SystemMessage(
-        content=CHOOSE_BEST_RESPONSE_PROMPT.format(
-            topic=state["topic"],
-            subtopic=state["subtopic"],
-            question=state["question"]
-        )
-    )
-    human_msg = HumanMessage(content=f"1. {state['response1']}\n\n2. {state['response2']}")
-    query = [sys_msg] + [human_msg]
-    response: BestResponse | Any = await fast_llm.with_structured_output(BestResponse).ainvoke(query)
+    context = format_context(state["topic"], state["subtopic"], state["question"])
+    best_index = await select_best(fast_llm, CHOOSE_BEST_RESPONSE_PROMPT, state["responses"], "Answer", context)
     return {
-        "best_response": response.best_response
+        "best_response": state["responses"][best_index]
     }
 
 async def check_relevance_accuracy(state: OverallState):
-    sys_msg = SystemMessage(
-        content=CHECK_RESPONSE_RELEVANCE_PROMPT.format(
-            topic=state["topic"],
-            subtopic=state["subtopic"],
-            question=state["question"]
-        )
-    )
-    human_msg = HumanMessage(content=f"Response: {state['best_response']}")
+    sys_msg = SystemMessage(content=CHECK_RESPONSE_RELEVANCE_PROMPT)
+    context = format_context(state["topic"], state["subtopic"], state["question"])
+    human_msg = HumanMessage(content=f"{context}\n\nResponse: {state['best_response']}")
     query = [sys_msg] + [human_msg]
-    response: IsRelevantAccurate | Any = await fast_llm.with_structured_output(IsRelevantAccurate).ainvoke(query)
+    response: IsRelevantAccurate | Any = await ainvoke_structured(fast_llm, IsRelevantAccurate, query)
+    attempts = state.get("attempts", 0) + 1
+    if response.is_relevant_accurate:
+        return {
+            "is_relevant_accurate": True,
+            "attempts": attempts
+        }
+    # Keep the candidates that were not rejected so only the missing one is regenerated.
+    return {
+        "is_relevant_accurate": False,
+        "attempts": attempts,
+        "responses": [x for x in state["responses"] if x != state["best_response"]],
+        "rejected_responses": state.get("rejected_responses", []) + [state["best_response"]]
+    }
+
+###### GenResponse Cascade Graph ######
+async def draft_response(state: OverallState):
+    query = build_answer_query(state["topic"], state["subtopic"], state["question"], state.get("passages"))
+    response: GenResponse | Any = await ainvoke_structured(fast_llm, GenResponse, query)
     return {
-        "is_relevant_accurate": response.is_relevant_accurate
+        "best_response": response.answer,
+        "attempts": 1,
+        "tier": "fast"
+    }
+
+async def grade_draft(state: OverallState):
+    sys_msg = SystemMessage(content=CHECK_RESPONSE_RELEVANCE_PROMPT + SCORE_RESPONSE_INSTRUCTION)
+    context = format_context(state["topic"], state["subtopic"], state["question"])
+    human_msg = HumanMessage(content=f"{context}\n\nResponse: {state['best_response']}")
+    query = [sys_msg] + [human_msg]
+    response: DraftGrade | Any = await ainvoke_structured(fast_llm, DraftGrade, query)
+    return {
+        "is_relevant_accurate": response.is_relevant_accurate,
+        "draft_score": response.score
     }
 
 ###### GenSubtopics Graph ######
@@ -213,39 +277,31 @@ async def generate_subtopics(state: MainOverallState):
                 num_subtopics=50
             )
         )
+        human_msg = HumanMessage(content=f"{state['topic']}")
     else:
-        conn = sqlite3.connect(f"./db/{state['filename_db']}")
-        cursor = conn.cursor()
-        cursor.execute("SELECT subtopic FROM subtopics WHERE topic = ?;", (state["topic"],))
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        subtopics = [row[0] for row in rows]
+        topic = state["topic"]
+        subtopics = await get_db(state["filename_db"]).aread(lambda cursor: select_subtopic_names(cursor, topic))
         subtopics_str = "\n".join([f"- {subtopic}" for subtopic in subtopics])
         sys_msg = SystemMessage(
             content=GENERATE_SUBTOPIC_NEW_PROMPT.format(
-                num_subtopics=50,
-                subtopics=subtopics_str
+                num_subtopics=50
             )
         )
+        human_msg = HumanMessage(content=f"{topic}\n\nSubtopics already in the list:\n{subtopics_str}")
 
-    human_msg = HumanMessage(content=f"{state['topic']}")
     query = [sys_msg] + [human_msg]
-    response: Subtopics | Any = await creative_llm.with_structured_output(Subtopics).ainvoke(query)
+    response: Subtopics | Any = await ainvoke_structured(creative_llm, Subtopics, query)
     return {
         "topic": state["topic"],
         "subtopics": response.subtopics
     }
 
 async def score_subtopics(state: MainOverallState):
-    sys_msg = SystemMessage(
-        content=RANK_SUBTOPICS_PROMPT.format(
-            topic=state["topic"]
-        )
-    )
-    human_msg = HumanMessage(content="\n".join([f"{i+1}. {subtopic}" for i, subtopic in enumerate(state["subtopics"])]))
+    sys_msg = SystemMessage(content=RANK_SUBTOPICS_PROMPT)
+    subtopics = "\n".join([f"{i+1}. {subtopic}" for i, subtopic in enumerate(state["subtopics"])])
+    human_msg = HumanMessage(content=f"Topic: {state['topic']}\nSubtopics:\n{subtopics}")
     query = [sys_msg] + [human_msg]
-    response: SubtopicsRanking | Any = await fast_llm.with_structured_output(SubtopicsRanking).ainvoke(query)
+    response: SubtopicsRanking | Any = await ainvoke_structured(fast_llm, SubtopicsRanking, query)
     subtopics_with_ranking = [(subtopic_ranking.subtopic, subtopic_ranking.score) for subtopic_ranking in response.subtopics]
     subtopics_filtered = subtopics_with_ranking[:25]
     if state.get("subtopic_generation", 0) > 0:
@@ -280,164 +336,99 @@ def continue_subtopic_gen(state: MainOverallState) -> Literal["generate_subtopic
     else:
         return "save_subtopic_to_db"
 
-def initialize_db(state: MainOverallState):
+async def initialize_db(state: MainOverallState):
     now = datetime.now()
     current_date_dash = now.strftime("%m-%d-%Y")
     if state["mode"] == Mode.PROMPT_TESTING_SOME.value or state["mode"] == Mode.PROMPT_TESTING_ALL.value:
         filename = f"{current_date_dash}-dataset-test.db"
     else:
         filename = f"{current_date_dash}-dataset.db"
-    conn = sqlite3.connect(f"./db/{filename}")
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS "subtopics" (
-        "id"	INTEGER NOT NULL UNIQUE,
-        "topic"	TEXT NOT NULL,
-        "subtopic"	TEXT NOT NULL,
-        "questions_generated" INTEGER NOT NULL DEFAULT 0,
-        "answers_generated" INTEGER NOT NULL DEFAULT 0,
-        PRIMARY KEY("id" AUTOINCREMENT)
-    );
-    """)
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS "questions_answers" (
-        "id"	INTEGER NOT NULL UNIQUE,
-        "created_at" TEXT NOT NULL,
-        "question"	TEXT NOT NULL,
-        "answer"	TEXT,
-        "subtopic_id"	INTEGER,
-        PRIMARY KEY("id" AUTOINCREMENT),
-        FOREIGN KEY (subtopic_id) REFERENCES "subtopics" (id)
-    );
-    """)
-
+    db = acquire_db(filename)
+    await db.awrite(create_tables)
     if state["mode"] == Mode.PROMPT_TESTING_SOME.value or state["mode"] == Mode.PROMPT_TESTING_ALL.value:
-        conn_base = sqlite3.connect("./db/base_dataset.db")
-        cursor_base = conn_base.cursor()
-        cursor.execute("SELECT COUNT(*) FROM subtopics;")
-        count = cursor.fetchone()[0]
-        if count == 0:
-            cursor_base.execute("SELECT topic, subtopic FROM subtopics;")
-            subtopic_rows = cursor_base.fetchall()
-            subtopics = [(row[0], row[1]) for row in subtopic_rows]
-            cursor.executemany("""INSERT INTO subtopics (topic, subtopic)
-            VALUES (?, ?);""", subtopics)
-            conn.commit()
-        cursor_base.close()
-        conn_base.close()
-
-    cursor.close()
-    conn.commit()
-    conn.close()
+        subtopics = await acquire_db("base_dataset.db").aread(select_all_subtopics)
+        await db.awrite(lambda cursor: seed_subtopics(cursor, subtopics))
     return { "filename_db": filename }
 
-def save_subtopic_to_db(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-    topic_subtopic_pairs = [(state['topic'], subtopic[0]) for subtopic in state['subtopics_with_ranking']]
-    cursor.executemany("INSERT INTO subtopics (topic, subtopic) VALUES (?, ?);", topic_subtopic_pairs)
-    cursor.close()
-    conn.commit()
-    conn.close()
+async def close_db(state: MainOverallState):
+    """Last node of every run: release the run's shared database connections."""
+    try:
+        # Surfaces write errors of answers that were queued but never awaited.
+        await get_writer(state["filename_db"]).flush()
+    finally:
+        await asyncio.to_thread(release_db, state["filename_db"])
+        if state["mode"] == Mode.PROMPT_TESTING_SOME.value or state["mode"] == Mode.PROMPT_TESTING_ALL.value:
+            await asyncio.to_thread(release_db, "base_dataset.db")
+
+async def save_subtopic_to_db(state: MainOverallState):
+    topic = state["topic"]
+    subtopics = [subtopic[0] for subtopic in state["subtopics_with_ranking"]]
+    await get_db(state["filename_db"]).awrite(lambda cursor: insert_subtopics(cursor, topic, subtopics))
 
 ###### GenQuestions Graph ######
-def retrieve_subtopics(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-    cursor.execute(f"""SELECT id, subtopic FROM subtopics
-    WHERE topic = '{state['topic']}' AND questions_generated = 0;""")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    subtopics = [{"id": row[0], "subtopic": row[1]} for row in rows]
-    return {
-        "subtopics": subtopics,
-        "current_subtopic_index": 0
-    }
-
-async def generate_questions_1(state: QuestionOverallState):
-    sys_msg = SystemMessage(
-        content=GENERATE_QUESTION_PROMPT.format(
-            num_questions=50
-        )
-    )
-    human_msg = HumanMessage(content=f"Topic: {state['topic']}, Subtopic: {state['subtopic']}")
-    query = [sys_msg] + [human_msg]
-    response: QuestionsGenerated | Any = await creative_llm.with_structured_output(QuestionsGenerated).ainvoke(query)
+async def retrieve_subtopics(state: MainOverallState):
+    topic = state["topic"]
+    subtopics = await get_db(state["filename_db"]).aread(lambda cursor: select_subtopics_without_questions(cursor, topic))
     return {
-        "questions1": response.questions
+        "subtopics": subtopics
     }
 
-async def generate_questions_2(state: QuestionOverallState):
-    sys_msg = SystemMessage(
-        content=GENERATE_QUESTION_PROMPT.format(
-            num_questions=50
-        )
-    )
-    human_msg = HumanMessage(content=f"Topic: {state['topic']}, Subtopic: {state['subtopic']}")
+async def generate_question_sets(state: QuestionOverallState):
+    kept = state.get("question_sets", [])
+    sys_msg = SystemMessage(content=GENERATE_QUESTION_PROMPT)
+    human_msg = HumanMessage(content=question_request(state["topic"], state["subtopic"], num_questions=50))
     query = [sys_msg] + [human_msg]
-    response: QuestionsGenerated | Any = await creative_llm.with_structured_output(QuestionsGenerated).ainvoke(query)
+    if state.get("rejected_sets"):
+        rejected = "\n\n".join([convert_list_to_str_formatted(questions) for questions in state["rejected_sets"]])
+        query.append(HumanMessage(content=REGENERATE_QUESTIONS_PROMPT.format(rejected=rejected)))
+    missing = max(state.get("num_candidates", 2) - len(kept), 1)
+    responses = await agenerate_structured(creative_llm, QuestionsGenerated, query, n=missing)
     return {
-        "questions2": response.questions
+        "question_sets": kept + [response.questions for response in responses]
     }
 
 def convert_list_to_str_formatted(questions: list[str]) -> str:
     return "\n".join([f"{i+1}. {question}" for i, question in enumerate(questions)])
 
 async def choose_best_questions(state: QuestionOverallState):
-    sys_msg = SystemMessage(
-        content=CHOOSE_BEST_QUESTION.format(
-            topic=state["topic"],
-            subtopic=state["subtopic"],
-        )
-    )
-    human_msg = HumanMessage(content=f"Set 1:\n{convert_list_to_str_formatted(state['questions1'])}\n\nSet 2: {convert_list_to_str_formatted(state['questions2'])}")
-    query = [sys_msg] + [human_msg]
-    response: BestQuestionSet | Any = await fast_llm.with_structured_output(BestQuestionSet).ainvoke(query)
-    best_set = state['questions1'] if response.best_set == 1 else state['questions2']
+    candidates = [convert_list_to_str_formatted(questions) for questions in state["question_sets"]]
+    best_index = await select_best(fast_llm, CHOOSE_BEST_QUESTION, candidates, "Set", format_context(state["topic"], state["subtopic"]))
     return {
-        "best_set": best_set
+        "best_set": state["question_sets"][best_index]
     }
 
 async def check_relevance_questions(state: QuestionOverallState):
-    sys_msg = SystemMessage(
-        content=CHECK_QUESTIONS_RELEVANCE_PROMPT.format(
-            topic=state["topic"],
-            subtopic=state["subtopic"],
-        )
-    )
-    human_msg = HumanMessage(content=f"{convert_list_to_str_formatted(state['best_set'])}")
+    sys_msg = SystemMessage(content=CHECK_QUESTIONS_RELEVANCE_PROMPT)
+    context = format_context(state["topic"], state["subtopic"])
+    human_msg = HumanMessage(content=f"{context}\n\n{convert_list_to_str_formatted(state['best_set'])}")
     query = [sys_msg] + [human_msg]
-    response: QuestionSetRelevance | Any = await fast_llm.with_structured_output(QuestionSetRelevance).ainvoke(query)
+    response: QuestionSetRelevance | Any = await ainvoke_structured(fast_llm, QuestionSetRelevance, query)
+    attempts = state.get("attempts", 0) + 1
+    if response.is_relevant:
+        return {
+            "is_relevant": True,
+            "attempts": attempts
+        }
     return {
-        "is_relevant": response.is_relevant
+        "is_relevant": False,
+        "attempts": attempts,
+        "question_sets": [x for x in state["question_sets"] if x != state["best_set"]],
+        "rejected_sets": state.get("rejected_sets", []) + [state["best_set"]]
     }
 
-def save_questions_to_db(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
+async def save_questions_to_db(filename_db: str, subtopic_id: int, questions: list[str], attempts: int):
     now = datetime.now()
     current_date_dash = now.strftime("%m-%d-%Y")
     current_time = now.strftime("%H:%M:%S")
-
-    data = [(f"{current_date_dash}_{current_time}", subtopic_id, question) for subtopic_id, question in state["best_question_set"]]
-    subtopic_id = data[0][1]
-    cursor.executemany("""INSERT INTO questions_answers (created_at, subtopic_id,
-                       question) VALUES (?, ?, ?);""", data)
-    cursor.execute(f"UPDATE subtopics SET questions_generated = 1 WHERE id = {subtopic_id};")
-    cursor.close()
-    conn.commit()
-    conn.close()
+    created_at = f"{current_date_dash}_{current_time}"
+    await get_db(filename_db).awrite(lambda cursor: insert_questions(cursor, created_at, subtopic_id, questions, attempts))
 
 ###### Main Graph ######
 def route_input_mode(
     state: MainInputState
 ) -> Literal["retrieve_base_dataset", "generate_subtopics",
-             "retrieve_subtopics", "retrieve_next_subtopic", "output_to_jsonl",
-             "output_to_csv", END]: # type: ignore
+             "retrieve_subtopics", "retrieve_pending_answers", "run_response_batch", "output_to_jsonl",
+             "output_to_csv", "output_to_columnar", "close_db"]: # type: ignore
     if state["mode"] == Mode.PROMPT_TESTING_SOME.value or state["mode"] == Mode.PROMPT_TESTING_ALL.value:
         return "retrieve_base_dataset"
     if state["mode"] == Mode.SUBTOPIC_GENERATION.value:
@@ -447,114 +438,60 @@ def route_input_mode(
     if state["mode"] == Mode.QUESTION_GENERATION.value:
         return "retrieve_subtopics"
     if state["mode"] == Mode.RESPONSE_GENERATION.value:
-        return "retrieve_next_subtopic"
+        return "retrieve_pending_answers"
     if state["mode"] == Mode.RESPONSE_GENERATION_SOME.value:
-        return "retrieve_next_subtopic"
-    if state["mode"] == Mode.OUTPUT_JSONL.value:
+        return "retrieve_pending_answers"
+    if state["mode"] == Mode.RESPONSE_GENERATION_BATCH.value:
+        return "run_response_batch"
+    if state["mode"] in (Mode.OUTPUT_JSONL.value, Mode.OUTPUT_JSONL_INCREMENTAL.value):
         return "output_to_jsonl"
-    if state["mode"] == Mode.OUTPUT_CSV.value:
+    if state["mode"] in (Mode.OUTPUT_CSV.value, Mode.OUTPUT_CSV_INCREMENTAL.value):
         return "output_to_csv"
+    if state["mode"] == Mode.OUTPUT_COLUMNAR.value:
+        return "output_to_columnar"
     else:
-        return END
-
-def route_gen_answer(state: MainOverallState) -> Literal[END, "retrieve_next_subtopic"]: # type: ignore
-    if state["current_subtopic_id"] == -1:
-        return END
-    else:
-        return "retrieve_next_subtopic"
-
-def output_to_jsonl(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-    cursor.execute("SELECT question, answer FROM questions_answers WHERE answer IS NOT NULL")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    now = datetime.now()
-    current_date_dash = now.strftime("%m-%d-%Y")
-    current_time = now.strftime("%H_%M_%S")
-
-    os.makedirs(os.path.dirname(f"./output/{current_date_dash}/"), exist_ok=True)
-    with open(f"./output/{current_date_dash}/{current_date_dash}-{current_time}-train.jsonl", "w") as f:
-        for question, answer in rows:
-            json_line = json.dumps({
-                "instruction": question,
-                "context": "",
-                "response": answer,
-            })
-            f.write(json_line + '\n')
-
-    return { "status": "output_to_jsonl success!" }
-
-def output_to_csv(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-    cursor.execute("SELECT question, answer FROM questions_answers WHERE answer IS NOT NULL")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    header = ["Question", "Answer"]
-    qa_pairs = [[row[0], row[1]] for row in rows]
-    qa_pairs.insert(0, header)
-
-    now = datetime.now()
-    current_date_dash = now.strftime("%m-%d-%Y")
-    current_time = now.strftime("%H_%M_%S")
-
-    filename = f"./output/{current_date_dash}/{current_date_dash}-{current_time}-train.csv"
-    os.makedirs(os.path.dirname(f"./output/{current_date_dash}/"), exist_ok=True)
-    with open(filename, "w", encoding="utf-8", newline="") as f:
-        csvwriter = csv.writer(f)
-        csvwriter.writerows(qa_pairs)
-
-    return { "status": "output_to_csv success!" }
-
-def retrieve_next_subtopic(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT id FROM subtopics WHERE topic = '{state['topic']}' AND answers_generated = 0;")
-    row = cursor.fetchone()
-    if row:
-        subtopic_id = row[0]
-    else:
-        subtopic_id = -1
-    return { "current_subtopic_id": subtopic_id }
-
-def retrieve_dataset(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-    if state["mode"] == Mode.RESPONSE_GENERATION_SOME.value:
-        cursor.execute("""SELECT qa.id, qa.question, s.subtopic, s.id
-            FROM questions_answers qa
-            JOIN subtopics s ON qa.subtopic_id = s.id
-            WHERE s.id = ? AND qa.answer IS NULL
-            LIMIT 5;
-            """, (state["current_subtopic_id"],))
-    else:
-        cursor.execute("""SELECT qa.id, qa.question, s.subtopic, s.id
-            FROM questions_answers qa
-            JOIN subtopics s ON qa.subtopic_id = s.id
-            WHERE s.id = ? AND qa.answer IS NULL;
-            """, (state["current_subtopic_id"],))
-    rows = cursor.fetchall()
-    dataset = [{"qa_id": row[0], "question": row[1], "topic": state["topic"],
-                "subtopic": row[2], "subtopic_id": row[3]} for row in rows]
+        return "close_db"
+
+async def export_answers(filename_db: str, format: Format, incremental: bool) -> str:
+    db = get_db(filename_db)
+    if not incremental:
+        base_path = export_base_path()
+        paths, rows = await db.aread(
+            lambda cursor: export_rows(iter_answered_pairs(cursor, EXPORT_FETCH_SIZE), base_path, format))
+        return f"{rows} rows in {len(paths)} file(s)"
+
+    base_path = export_base_path(suffix="incremental")
+    paths, rows, watermark = await db.aread(lambda cursor: export_incremental(cursor, format, base_path, format))
+    exported_at = datetime.now().isoformat(timespec="seconds")
+    await db.awrite(lambda cursor: update_watermark(cursor, format, watermark, exported_at))
+    return f"{rows} new or changed rows in {len(paths)} file(s)"
+
+async def output_to_jsonl(state: MainOverallState):
+    result = await export_answers(state["filename_db"], "jsonl", state["mode"] == Mode.OUTPUT_JSONL_INCREMENTAL.value)
+    return { "status": f"output_to_jsonl success! {result}" }
+
+async def output_to_csv(state: MainOverallState):
+    result = await export_answers(state["filename_db"], "csv", state["mode"] == Mode.OUTPUT_CSV_INCREMENTAL.value)
+    return { "status": f"output_to_csv success! {result}" }
+
+async def output_to_columnar(state: MainOverallState):
+    base_path = export_base_path()
+    shard, format = await get_db(state["filename_db"]).aread(
+        lambda cursor: export_columnar(iter_answered_rows(cursor, EXPORT_ROW_GROUP_SIZE), base_path))
+    return { "status": f"output_to_columnar success! {shard['rows']} rows in {format}" }
+
+async def retrieve_pending_answers(state: MainOverallState):
+    topic = state["topic"]
+    limit = 5 if state["mode"] == Mode.RESPONSE_GENERATION_SOME.value else None
+    db = get_db(state["filename_db"])
+    await db.awrite(flag_duplicates)
+    dataset = await db.aread(lambda cursor: select_pending_answers(cursor, topic, limit))
     return {
         "dataset": dataset
     }
 
-def retrieve_base_dataset(state: MainOverallState):
-    conn = sqlite3.connect("./db/base_dataset.db")
-    cursor = conn.cursor()
-    cursor.execute("""SELECT qa.question, qa.answer, s.topic, s.subtopic, s.id FROM questions_answers qa
-    JOIN subtopics s ON qa.subtopic_id = s.id;""")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    dataset = [{"question": row[0], "answer": row[1], "topic": row[2], "subtopic": row[3], "subtopic_id": row[4]} for row in rows]
+async def retrieve_base_dataset(state: MainOverallState):
+    dataset = await get_db("base_dataset.db").aread(select_base_dataset)
     if state["mode"] == Mode.PROMPT_TESTING_SOME.value:
         return {
             "mode": state["mode"],
@@ -566,54 +503,100 @@ def retrieve_base_dataset(state: MainOverallState):
             "dataset": dataset
         }
 
-def save_answers_to_db(state: MainOverallState):
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-
-    qa_responses = [(qa["response"], qa["qa_id"]) for qa in state["best_responses"]]
-    cursor.executemany("""UPDATE questions_answers SET answer = ?
-    WHERE id = ?;""", qa_responses)
-    cursor.execute(f"UPDATE subtopics SET answers_generated = 1 WHERE id = {state['current_subtopic_id']}")
+###### Batch ResponseGeneration ######
+async def prepare_response_batch(filename_db: str, topic: str, mode: str) -> Tuple[str | None, str] | None:
+    """Resume the topic's unfinished batch or serialize a new one.
 
-    cursor.close()
-    conn.commit()
-    conn.close()
-
-    return {
-        "best_responses": [],
-        "status": "save_answers_to_db success!"
-    }
-
-def save_response_to_db(state: MainOverallState):
-    now = datetime.now()
-    current_date_dash = now.strftime("%m-%d-%Y")
-    current_time = now.strftime("%H:%M:%S")
-
-    conn = sqlite3.connect(f"./db/{state['filename_db']}")
-    cursor = conn.cursor()
-
-    qa_responses = [(f"{current_date_dash}_{current_time}", qa["question"], qa["response"], qa["subtopic_id"]) for qa in state["best_responses"]]
-    cursor.executemany("""INSERT INTO questions_answers (created_at, question, answer, subtopic_id)
-    VALUES (?, ?, ?, ?);""", qa_responses)
-
-    cursor.close()
-    conn.commit()
-    conn.close()
-
-    return { "status": "save_response_to_db success!" }
+    Returns the batch id (None if not submitted yet) and its input file, or
+    None when there is nothing left to answer.
+    """
+    db = get_db(filename_db)
+    open_batch = await db.aread(lambda cursor: find_open_batch(cursor, topic))
+    if open_batch is not None:
+        return open_batch
+    await db.awrite(flag_duplicates)
+    dataset = await db.aread(lambda cursor: select_pending_answers(cursor, topic))
+    if not dataset:
+        return None
 
-def save_as_jsonl(state: MainOverallState):
     now = datetime.now()
     current_date_dash = now.strftime("%m-%d-%Y")
     current_time = now.strftime("%H_%M_%S")
-
-    os.makedirs(os.path.dirname(f"./output/{current_date_dash}/"), exist_ok=True)
-    with open(f"./output/{current_date_dash}/{current_date_dash}-{current_time}-train.jsonl", "w") as f:
-        for qa in state["best_responses"]:
-            json_line = json.dumps({
-                "instruction": qa["question"],
-                "context": "",
-                "response": qa["response"],
-            })
-            f.write(json_line + '\n')
+    input_path = f"./batch/{current_date_dash}/{current_date_dash}-{current_time}-{topic.replace(' ', '_')}-input.jsonl"
+    if GROUNDED_ANSWERS:
+        passages = await asyncio.gather(*[retrieve(grounding_query(row["subtopic"], row["question"]), GROUNDING_PASSAGES) for row in dataset])
+    else:
+        passages = [None] * len(dataset)
+    requests = [
+        build_request(
+            custom_id=f"qa-{row['qa_id']}",
+            deployment=BATCH_DEPLOYMENT or creative_llm.deployment_name,
+            query=build_answer_query(row["topic"], row["subtopic"], row["question"], row_passages),
+            schema=GenResponse,
+            n=num_candidates(mode),
+            temperature=creative_llm.temperature,
+        )
+        for row, row_passages in zip(dataset, passages)
+    ]
+    write_batch_file(input_path, requests)
+    return None, input_path
+
+async def record_batch(filename_db: str, batch_id: str, topic: str, status: str, input_path: str):
+    created_at = datetime.now().strftime("%m-%d-%Y_%H:%M:%S")
+    await get_db(filename_db).awrite(lambda cursor: upsert_batch(cursor, batch_id, created_at, topic, status, input_path))
+
+async def pick_batch_answers(questions: dict[int, dict], results: dict[str, list[GenResponse]]) -> list[Tuple[str, int, str, int]]:
+    async def pick(qa_id: int, candidates: list[GenResponse]) -> Tuple[str, int, str, int]:
+        row = questions[qa_id]
+        context = format_context(row["topic"], row["subtopic"], row["question"])
+        answers = [candidate.answer for candidate in candidates]
+        best_index = await select_best(fast_llm, CHOOSE_BEST_RESPONSE_PROMPT, answers, "Answer", context)
+        return answers[best_index], 1, "batch", qa_id
+
+    return await asyncio.gather(*[
+        pick(int(custom_id.removeprefix("qa-")), candidates)
+        for custom_id, candidates in results.items()
+        if candidates and int(custom_id.removeprefix("qa-")) in questions
+    ])
+
+async def run_response_batch(state: MainOverallState):
+    prepared = await prepare_response_batch(state["filename_db"], state["topic"], state["mode"])
+    if prepared is None:
+        return { "status": "run_response_batch: nothing to answer" }
+    batch_id, input_path = prepared
+
+    client = get_batch_client()
+    if batch_id is None:
+        batch_id = await client.submit(input_path)
+        await record_batch(state["filename_db"], batch_id, state["topic"], "submitted", input_path)
+
+    status = await wait_for_batch(client, batch_id, BATCH_POLL_INTERVAL_SECONDS)
+    if status != "completed":
+        await record_batch(state["filename_db"], batch_id, state["topic"], status, input_path)
+        return { "status": f"run_response_batch: batch {batch_id} {status}" }
+
+    output_path = input_path.replace("-input.jsonl", "-output.jsonl")
+    await client.download(batch_id, output_path)
+    results, errors = read_batch_results(output_path, GenResponse)
+
+    db = get_db(state["filename_db"])
+    topic = state["topic"]
+    qa_ids = [int(custom_id.removeprefix("qa-")) for custom_id in results]
+    questions = await db.aread(lambda cursor: select_unanswered_questions(cursor, qa_ids))
+
+    qa_responses = await pick_batch_answers(questions, results)
+
+    def apply_answers(cursor: sqlite3.Cursor):
+        update_answers(cursor, qa_responses)
+        mark_answered_subtopics(cursor, topic)
+    await db.awrite(apply_answers)
+    await record_batch(state["filename_db"], batch_id, state["topic"], "applied", input_path)
+
+    return { "status": f"run_response_batch success! {len(qa_responses)} answers applied, {len(errors)} failed" }
+
+async def save_as_jsonl(state: MainOverallState):
+    qa_ids = state.get("saved_qa_ids", [])
+    await get_writer(state["filename_db"]).flush()
+    rows = await get_db(state["filename_db"]).aread(lambda cursor: select_pairs_by_id(cursor, qa_ids))
+    await asyncio.to_thread(export_rows, rows, export_base_path(), "jsonl")
     return { "status": "save_as_jsonl success!" }
@@ -1,61 +1,71 @@
 GENERATE_QUESTION_PROMPT="""You are an expert at generating data for fine-tuning instruct models such as LLama 3.2 3B Instruct.
 Given the following topic and subtopic, generate questions from this subtopic.
 Remember, your question must be clear, concise, and relevant to the subtopic.
+"""
 
-Here are some examples to guide you through:
-    Topic: Responsible AI | Subtopic: Ethical Principles | Question: What are the key ethical principles that should guide the development of responsible AI systems?
-    Topic: Responsible AI | Subtopic: Identifying & Mitigating Bias | Question: How can bias be identified and mitigated in AI systems?
-    Topic: Responsible AI | Subtopic: Transparency Role | Question: What role does transparency play in responsible AI development?
-    Topic: Responsible AI | Subtopic: AI Accountability | Question: Explain the concept of AI accountability and why it's important.
-    Topic: Responsible AI | Subtopic: Privacy Protection | Question: How can organizations ensure privacy protection when developing AI systems?
-    Topic: Responsible AI | Subtopic: Human-Centered AI | Question: What are the key considerations for ensuring AI systems remain human-centered?
-    Topic: Responsible AI | Subtopic: AI Governance Frameworks | Question: How can organizations implement responsible AI governance frameworks?
-    Topic: Responsible AI | Subtopic: Inclusivity & Accessibility | Question: What measures can be taken to ensure AI systems are inclusive and accessible?
-    Topic: Responsible AI | Subtopic: Risk & Failure Management | Question: How should organizations handle AI-related risks and failures?
-    Topic: Responsible AI | Subtopic: Stakeholder Engagement | Question: What role does stakeholder engagement play in responsible AI development?
-    Topic: Agentic AI | Subtopic: Definition & Autonomy | Question: What is agentic AI and how does it differ from traditional AI systems?
-    Topic: Agentic AI | Subtopic: Reward Functions | Question: Explain the role of reward functions in training agentic AI systems.
-    Topic: Agentic AI | Subtopic: Goal-Directed Behavior | Question: How does goal-directed behavior manifest in agentic AI systems?
-    Topic: Agentic AI | Subtopic: Ethical Challenges | Question: What are the key challenges in ensuring ethical behavior in agentic AI?
-    Topic: Agentic AI | Subtopic: Emergent Behavior | Question: Describe the concept of emergent behavior in agentic AI systems.
-    Topic: Agentic AI | Subtopic: Multi-Agent Systems | Question: How does multi-agent AI interaction differ from single-agent systems?
-    Topic: Agentic AI | Subtopic: Uncertainty in Decisions | Question: What role does uncertainty play in agentic AI decision-making?
-    Topic: Agentic AI | Subtopic: Bounded Rationality | Question: Explain the importance of bounded rationality in agentic AI design.
-    Topic: Agentic AI | Subtopic: Environmental Learning | Question: How do agentic AI systems learn from their environment?
-    Topic: Agentic AI | Subtopic: Decision-Making Framework | Question: What are the key components of an agentic AI's decision-making framework?
-    Topic: Agentic AI | Subtopic: Social Awareness | Question: How does social awareness impact agentic AI behavior?
-    Topic: Agentic AI | Subtopic: Memory Role | Question: Describe the role of memory in agentic AI systems.
-    Topic: Agentic AI | Subtopic: Scalable Autonomy | Question: What are the implications of scalable autonomy in agentic AI?
-    Topic: Prompt Engineering | Subtopic: Definition & Importance | Question: What is prompt engineering and why is it important in AI interactions?
-    Topic: Prompt Engineering | Subtopic: Few-Shot Prompting | Question: Explain the concept of 'few-shot prompting' in prompt engineering.
-    Topic: Prompt Engineering | Subtopic: Temperature Setting | Question: What is the role of temperature setting in prompt engineering?
-    Topic: Prompt Engineering | Subtopic: Chain-of-Thought Prompting | Question: How does 'chain-of-thought' prompting work?
-    Topic: Prompt Engineering | Subtopic: Effective Prompt Elements | Question: What are the key elements of an effective prompt?
-    Topic: Prompt Engineering | Subtopic: Zero-Shot Prompting | Question: Explain the concept of 'zero-shot prompting'.
-    Topic: Prompt Engineering | Subtopic: Role Prompting | Question: What is role prompting and how is it used?
-    Topic: Prompt Engineering | Subtopic: Context Length | Question: How does context length affect prompt engineering?
-    Topic: Prompt Engineering | Subtopic: Prompt Templates | Question: What are prompt templates and why are they useful?
-    Topic: Prompt Engineering | Subtopic: Testing & Iteration | Question: Explain the importance of prompt testing and iteration.
-    Topic: Prompt Engineering | Subtopic: Explicit vs Implicit | Question: What is the difference between explicit and implicit prompting?
-    Topic: Prompt Engineering | Subtopic: Prompt Chaining | Question: How does prompt chaining work in complex tasks?
-    Topic: Prompt Engineering | Subtopic: Common Pitfalls | Question: What are common pitfalls in prompt engineering?
-    Topic: Foundational Models | Subtopic: Definition & Comparison | Question: What is a Foundational Model in AI, and how does it differ from traditional ML models?
-    Topic: Foundational Models | Subtopic: Transfer Learning | Question: Explain the concept of transfer learning in the context of Foundational Models.
-    Topic: Foundational Models | Subtopic: Self-Supervision | Question: What role does self-supervision play in training Foundational Models?
-    Topic: Foundational Models | Subtopic: Data Efficiency | Question: How do Foundational Models address the problem of data efficiency?
-    Topic: Foundational Models | Subtopic: Architecture Components | Question: What are the key architectural components of a typical Foundational Model?
-    Topic: Foundational Models | Subtopic: Emergent Abilities | Question: Explain the concept of emergent abilities in Foundational Models.
-    Topic: Foundational Models | Subtopic: Deployment Challenges | Question: What are the main challenges in deploying Foundational Models in production environments?
-    Topic: Foundational Models | Subtopic: Multi-modal Inputs | Question: How do Foundational Models handle multi-modal inputs?
-    Topic: Foundational Models | Subtopic: Ethical Considerations | Question: What are the ethical considerations in developing and deploying Foundational Models?
-    Topic: Foundational Models | Subtopic: Zero/Few-Shot Learning | Question: How do Foundational Models handle zero-shot and few-shot learning tasks?
-    Topic: Foundational Models | Subtopic: Scaling Impact | Question: What role does scaling play in Foundational Model performance?
-    Topic: Foundational Models | Subtopic: Contextual Understanding | Question: How do Foundational Models maintain contextual understanding across different domains?
-    Topic: Foundational Models | Subtopic: Open vs Closed Models | Question: What are the key differences between open and closed Foundational Models?
-    Topic: Foundational Models | Subtopic: Chain-of-Thought Reasoning | Question: Explain how DeepSeek's chain-of-thought reasoning differs from traditional language models and its advantages in problem-solving tasks.
+# User message sent after the static GENERATE_QUESTION_PROMPT.
+GENERATE_QUESTION_REQUEST="""Here are some examples to guide you through:
+{examples}
 
 Now, here is the topic and subtopic and I want you to generate {num_questions} questions:
-"""
+Topic: {topic}, Subtopic: {subtopic}"""
+
+# (topic, subtopic, question) few-shot examples of GENERATE_QUESTION_REQUEST;
+# `agent.fewshot` picks the most relevant ones for each subtopic.
+QUESTION_EXAMPLES = [
+    ("Responsible AI", "Ethical Principles", "What are the key ethical principles that should guide the development of responsible AI systems?"),
+    ("Responsible AI", "Identifying & Mitigating Bias", "How can bias be identified and mitigated in AI systems?"),
+    ("Responsible AI", "Transparency Role", "What role does transparency play in responsible AI development?"),
+    ("Responsible AI", "AI Accountability", "Explain the concept of AI accountability and why it's important."),
+    ("Responsible AI", "Privacy Protection", "How can organizations ensure privacy protection when developing AI systems?"),
+    ("Responsible AI", "Human-Centered AI", "What are the key considerations for ensuring AI systems remain human-centered?"),
+    ("Responsible AI", "AI Governance Frameworks", "How can organizations implement responsible AI governance frameworks?"),
+    ("Responsible AI", "Inclusivity & Accessibility", "What measures can be taken to ensure AI systems are inclusive and accessible?"),
+    ("Responsible AI", "Risk & Failure Management", "How should organizations handle AI-related risks and failures?"),
+    ("Responsible AI", "Stakeholder Engagement", "What role does stakeholder engagement play in responsible AI development?"),
+    ("Agentic AI", "Definition & Autonomy", "What is agentic AI and how does it differ from traditional AI systems?"),
+    ("Agentic AI", "Reward Functions", "Explain the role of reward functions in training agentic AI systems."),
+    ("Agentic AI", "Goal-Directed Behavior", "How does goal-directed behavior manifest in agentic AI systems?"),
+    ("Agentic AI", "Ethical Challenges", "What are the key challenges in ensuring ethical behavior in agentic AI?"),
+    ("Agentic AI", "Emergent Behavior", "Describe the concept of emergent behavior in agentic AI systems."),
+    ("Agentic AI", "Multi-Agent Systems", "How does multi-agent AI interaction differ from single-agent systems?"),
+    ("Agentic AI", "Uncertainty in Decisions", "What role does uncertainty play in agentic AI decision-making?"),
+    ("Agentic AI", "Bounded Rationality", "Explain the importance of bounded rationality in agentic AI design."),
+    ("Agentic AI", "Environmental Learning", "How do agentic AI systems learn from their environment?"),
+    ("Agentic AI", "Decision-Making Framework", "What are the key components of an agentic AI's decision-making framework?"),
+    ("Agentic AI", "Social Awareness", "How does social awareness impact agentic AI behavior?"),
+    ("Agentic AI", "Memory Role", "Describe the role of memory in agentic AI systems."),
+    ("Agentic AI", "Scalable Autonomy", "What are the implications of scalable autonomy in agentic AI?"),
+    ("Prompt Engineering", "Definition & Importance", "What is prompt engineering and why is it important in AI interactions?"),
+    ("Prompt Engineering", "Few-Shot Prompting", "Explain the concept of 'few-shot prompting' in prompt engineering."),
+    ("Prompt Engineering", "Temperature Setting", "What is the role of temperature setting in prompt engineering?"),
+    ("Prompt Engineering", "Chain-of-Thought Prompting", "How does 'chain-of-thought' prompting work?"),
+    ("Prompt Engineering", "Effective Prompt Elements", "What are the key elements of an effective prompt?"),
+    ("Prompt Engineering", "Zero-Shot Prompting", "Explain the concept of 'zero-shot prompting'."),
+    ("Prompt Engineering", "Role Prompting", "What is role prompting and how is it used?"),
+    ("Prompt Engineering", "Context Length", "How does context length affect prompt engineering?"),
+    ("Prompt Engineering", "Prompt Templates", "What are prompt templates and why are they useful?"),
+    ("Prompt Engineering", "Testing & Iteration", "Explain the importance of prompt testing and iteration."),
+    ("Prompt Engineering", "Explicit vs Implicit", "What is the difference between explicit and implicit prompting?"),
+    ("Prompt Engineering", "Prompt Chaining", "How does prompt chaining work in complex tasks?"),
+    ("Prompt Engineering", "Common Pitfalls", "What are common pitfalls in prompt engineering?"),
+    ("Foundational Models", "Definition & Comparison", "What is a Foundational Model in AI, and how does it differ from traditional ML models?"),
+    ("Foundational Models", "Transfer Learning", "Explain the concept of transfer learning in the context of Foundational Models."),
+    ("Foundational Models", "Self-Supervision", "What role does self-supervision play in training Foundational Models?"),
+    ("Foundational Models", "Data Efficiency", "How do Foundational Models address the problem of data efficiency?"),
+    ("Foundational Models", "Architecture Components", "What are the key architectural components of a typical Foundational Model?"),
+    ("Foundational Models", "Emergent Abilities", "Explain the concept of emergent abilities in Foundational Models."),
+    ("Foundational Models", "Deployment Challenges", "What are the main challenges in deploying Foundational Models in production environments?"),
+    ("Foundational Models", "Multi-modal Inputs", "How do Foundational Models handle multi-modal inputs?"),
+    ("Foundational Models", "Ethical Considerations", "What are the ethical considerations in developing and deploying Foundational Models?"),
+    ("Foundational Models", "Zero/Few-Shot Learning", "How do Foundational Models handle zero-shot and few-shot learning tasks?"),
+    ("Foundational Models", "Scaling Impact", "What role does scaling play in Foundational Model performance?"),
+    ("Foundational Models", "Contextual Understanding", "How do Foundational Models maintain contextual understanding across different domains?"),
+    ("Foundational Models", "Open vs Closed Models", "What are the key differences between open and closed Foundational Models?"),
+    ("Foundational Models", "Chain-of-Thought Reasoning", "Explain how DeepSeek's chain-of-thought reasoning differs from traditional language models and its advantages in problem-solving tasks."),
+]
+
+QUESTION_EXAMPLE_FORMAT = "    Topic: {topic} | Subtopic: {subtopic} | Question: {question}"
 
 GENERATE_SUBTOPIC_PROMPT="""You are an expert at generating subtopics of a given
 topic. These subtopics should be as simple as one to 5 words and they should all
@@ -172,8 +182,7 @@ Here are some examples to guide you through:
     Topic: Foundational Models | Subtopic: Open vs Closed Models
     Topic: Foundational Models | Subtopic: Chain-of-Thought Reasoning
 
-Do not include the subtopics that are already in the list:
-{subtopics}
+Do not include the subtopics that are already in the list given with the topic.
 
 These subtopics must be relevant to the main topic and should also be useful for
 fine-tuning LLama 3.2 3B Instruct model.
@@ -183,8 +192,7 @@ Generate {num_subtopics} subtopics for the following topic:
 GENERATE_ANSWER_PROMPT="""You are an expert at generating data for fine-tuning
 LLMs such as LLama 3.2 3B Instruct. Your goal is to fine-tune LLama 3.2 3B
 Instruct in AWS SageMaker Jumpstart (Instruction-tune enabled and chat dataset
-disabled). Given the following topic {topic} and subtopic {subtopic},
-answer the following question provided. When answering, ensure that the
+disabled). Given a topic and subtopic, answer the question provided with them. When answering, ensure that the
 answer is concise and accurate. Most importantly, make sure that the answers
 are formatted to what LLama 3.2 3B Instruct expects. Do not include emojis and
 non-ascii characters. Do not cite your sources.
@@ -216,13 +224,13 @@ Here are some examples of Q&A:
     complex tasks into manageable steps, improving accuracy and maintaining
     logical flow.
 
-Here is the question:
+The topic, subtopic and question follow.
 """
 
 RANK_SUBTOPICS_PROMPT="""You are an expert at scoring the subtopic from its topic.
 This is the scoring criteria for determining the best subtopics:
     * Relevance:
-    How closely related is the subtopic to the main topic ("{topic}")?
+    How closely related is the subtopic to the main topic?
     Score: 1 (low relevance) to 5 (high relevance).
 
     * Usefulness for Fine-Tuning:
@@ -243,14 +251,14 @@ This is the scoring criteria for determining the best subtopics:
 
 The subtopic's score must be at minimum 17, if its not, then you'll have to
 generate a new subtopic that has the minimum score of 17.
-Given the following topic **{topic}**, calculate the scores of each subtopic and rank them.
-Here are the subtopics:
+Calculate the scores of each subtopic of the topic given below and rank them.
+The topic and its subtopics follow.
 """
 
 CHOOSE_BEST_QUESTION="""You are an expert at determining the best set of questions for a dataset.
 These questions will be used to fine-tune LLama 3.2 3B Instruct (Instruct-tune instead of chat dataset).
-Only return 1 if the first set of questions is the best set of questions.
-Return 2 if the second set of questions is the best.
+Return the number of the best set of questions (1 if the first set is the
+best, 2 if the second set is the best, and so on).
 Here are some criteria to consider when choosing the best set of questions:
     1. Relevance:
     Topic Alignment: The question must directly relate to the overarching topic.
@@ -287,14 +295,14 @@ Here are some criteria to consider when choosing the best set of questions:
     Specific Criteria: Ensure there are clear criteria for judging the accuracy and quality of the model's responses.
     Avoid Open-Endedness: While some open-endedness can be useful, prioritize questions that allow for measurable evaluation.
 
-Given the following topic **{topic}** and **{subtopic}**, determine the best set of questions.
-Here are the set of questions:
+Given the topic and subtopic below, determine the best set of questions.
+The topic, subtopic and the sets of questions follow.
 """
 
 CHECK_QUESTIONS_RELEVANCE_PROMPT="""You are an expert at checking the relevance
 and accuracy of a set of questions from the topic and subtopic.
-Given the following topic **{topic}** and subtopic **{subtopic}**,
-check the relevance and accuracy of the set of questions.
+Given a topic and subtopic, check the relevance and accuracy of the set of
+questions.
 Here are some factors to consider:
     - Are the set of questions helpful in answering the subtopic?
     - Are the set of questions related to the main topic and its subtopic?
@@ -302,13 +310,13 @@ Here are some factors to consider:
 
 All factors must be true before you mark it as relevant. Otherwise, mark it as irrelevant.
 
-Now, evaluate the set of questions if its relevant and accurate:
+Now, evaluate the set of questions given below with its topic and subtopic if its relevant and accurate.
 """
 
 CHECK_RESPONSE_RELEVANCE_PROMPT="""You are an expert at checking the relevance
 and accuracy of an answer from the question and its topic.
-Given the following topic **{topic}** and subtopic **{subtopic}**,
-check the relevance and accuracy of the answer from the question: {question}.
+Given a topic, subtopic and question, check the relevance and accuracy of the
+answer to the question.
 Here are some factors to consider:
     - Is the answer helpful in answering the question?
     - Is the answer related to the main topic and its subtopic?
@@ -316,20 +324,43 @@ Here are some factors to consider:
 
 All factors must be true before you mark it as relevant. Otherwise, mark it as irrelevant.
 
-Now, evaluate this response if its relevant and accurate:
+Now, evaluate the response given below with its topic, subtopic and question if its relevant and accurate.
 """
 
 CHOOSE_BEST_RESPONSE_PROMPT="""You are an expert at choosing the best answer based on the question provided.
-Given the following topic **{topic}**, subtopic **{subtopic}**, and the
-question {question}, choose the best amongst the answers. Here are some factors to consider:
+Given a topic, subtopic and question, choose the best amongst the answers. Here are some factors to consider:
     Helpfulness: Overall helpfulness of the response to the prompt.
     Correctness: Inclusion of all pertinent facts without errors.
     Coherence: Consistency and clarity of expression.
     Complexity: Intellectual depth required to write response (i.e. whether the response can be written by anyone with basic language competency or requires deep domain expertise).
     Verbosity: Amount of detail included in the response, relative to what is asked for in the prompt.
 Choose the best answer that will benefit in instruct-tuning LLama 3.2 3B
-Instruct Model. Do NOT compare the answers. JUST OUTPUT THE BEST ANSWER AND COPY THE RESPONSE.
+Instruct Model. Do NOT compare the answers. JUST OUTPUT THE NUMBER OF THE BEST ANSWER.
 No need to reason out why you chose that answer.
 
-Here are the responses:
+The topic, subtopic, question and the answers follow.
+"""
+
+RANK_CANDIDATES_INSTRUCTION="""Instead of only the best one, rank every candidate from the best to the
+worst and return all of their numbers in that order."""
+
+REGENERATE_ANSWER_PROMPT="""This answer was already rejected because it was not relevant or accurate
+enough for the question. Write a better answer that fixes its problems:
+{rejected}
+"""
+
+REGENERATE_QUESTIONS_PROMPT="""This set of questions was already rejected because it was not relevant
+enough for the topic and subtopic. Generate a better set that fixes its problems:
+{rejected}
+"""
+
+SCORE_RESPONSE_INSTRUCTION="""
+Also score the overall quality of the response from 1 (poor) to 5 (excellent)
+as an answer in a fine-tuning dataset.
+"""
+
+GROUNDED_ANSWER_INSTRUCTION="""
+Reference passages from the knowledge base follow the question. Base the answer
+on them where they are relevant, without citing or mentioning them, and do not
+contradict them. Ignore passages that are unrelated to the question.
 """
@@ -0,0 +1,280 @@
+"""SQL of the dataset databases.
+
+Every function takes a cursor so it can run through `Database.aread` /
+`Database.awrite` (or the sync `read` / `write` context managers).
+"""
+
+import sqlite3
+from collections.abc import Iterator
+from typing import Tuple, TypedDict
+
+from agent.config import DUPLICATE_DETECTION
+from agent.dedup import index_questions, index_unindexed
+
+
+class Watermark(TypedDict):
+    """Last exported `questions_answers.id` and answer `revision` of an export target."""
+    id: int
+    revision: int
+
+
+def ensure_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str):
+    """Add `column` to databases created before it existed."""
+    cursor.execute(f'PRAGMA table_info("{table}");')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition};')
+
+def create_tables(cursor: sqlite3.Cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "subtopics" (
+        "id"	INTEGER NOT NULL UNIQUE,
+        "topic"	TEXT NOT NULL,
+        "subtopic"	TEXT NOT NULL,
+        "questions_generated" INTEGER NOT NULL DEFAULT 0,
+        "answers_generated" INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY("id" AUTOINCREMENT)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "questions_answers" (
+        "id"	INTEGER NOT NULL UNIQUE,
+        "created_at" TEXT NOT NULL,
+        "question"	TEXT NOT NULL,
+        "answer"	TEXT,
+        "subtopic_id"	INTEGER,
+        PRIMARY KEY("id" AUTOINCREMENT),
+        FOREIGN KEY (subtopic_id) REFERENCES "subtopics" (id)
+    );
+    """)
+
+    ensure_column(cursor, "subtopics", "question_attempts", "INTEGER")
+    ensure_column(cursor, "questions_answers", "attempts", "INTEGER")
+    ensure_column(cursor, "questions_answers", "answer_tier", "TEXT")
+    ensure_column(cursor, "questions_answers", "duplicate_of", "INTEGER")
+    ensure_column(cursor, "questions_answers", "revision", "INTEGER")
+
+    # Every stored answer gets the next revision, so incremental exports can
+    # find new and re-answered rows whichever code path wrote them.
+    cursor.execute('CREATE INDEX IF NOT EXISTS "questions_answers_revision" ON "questions_answers" ("revision");')
+    for event, condition in (("INSERT", "NEW.answer IS NOT NULL"), ("UPDATE OF answer", "NEW.answer IS NOT NULL AND NEW.answer IS NOT OLD.answer")):
+        name = "questions_answers_revision_" + event.split()[0].lower()
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "{name}" AFTER {event} ON questions_answers
+        WHEN {condition}
+        BEGIN
+            UPDATE questions_answers SET revision = (SELECT COALESCE(MAX(revision), 0) + 1 FROM questions_answers)
+            WHERE id = NEW.id;
+        END;
+        """)
+
+    cursor.execute("""
+    CREATE VIEW IF NOT EXISTS "answer_tiers" AS
+    SELECT answer_tier, COUNT(*) AS answers,
+        CAST(COUNT(*) AS REAL) / (SELECT COUNT(*) FROM questions_answers WHERE answer IS NOT NULL) AS fraction
+    FROM questions_answers
+    WHERE answer IS NOT NULL
+    GROUP BY answer_tier;
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "question_signatures" (
+        "qa_id"	INTEGER NOT NULL,
+        "signature"	BLOB NOT NULL,
+        PRIMARY KEY("qa_id")
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "question_lsh" (
+        "band"	INTEGER NOT NULL,
+        "bucket"	INTEGER NOT NULL,
+        "qa_id"	INTEGER NOT NULL
+    );
+    """)
+    cursor.execute('CREATE INDEX IF NOT EXISTS "question_lsh_bucket" ON "question_lsh" ("band", "bucket");')
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "export_watermarks" (
+        "target"	TEXT NOT NULL,
+        "last_id"	INTEGER NOT NULL,
+        "last_revision"	INTEGER NOT NULL,
+        "exported_at"	TEXT NOT NULL,
+        PRIMARY KEY("target")
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS "response_batches" (
+        "id"	TEXT NOT NULL UNIQUE,
+        "created_at" TEXT NOT NULL,
+        "topic"	TEXT NOT NULL,
+        "status"	TEXT NOT NULL,
+        "input_path"	TEXT NOT NULL,
+        PRIMARY KEY("id")
+    );
+    """)
+
+###### Subtopics ######
+def select_all_subtopics(cursor: sqlite3.Cursor) -> list[Tuple[str, str]]:
+    cursor.execute("SELECT topic, subtopic FROM subtopics;")
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+def seed_subtopics(cursor: sqlite3.Cursor, subtopics: list[Tuple[str, str]]):
+    """Copy `(topic, subtopic)` rows into a database that has no subtopics yet."""
+    cursor.execute("SELECT COUNT(*) FROM subtopics;")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany("""INSERT INTO subtopics (topic, subtopic)
+        VALUES (?, ?);""", subtopics)
+
+def select_subtopic_names(cursor: sqlite3.Cursor, topic: str) -> list[str]:
+    cursor.execute("SELECT subtopic FROM subtopics WHERE topic = ?;", (topic,))
+    return [row[0] for row in cursor.fetchall()]
+
+def insert_subtopics(cursor: sqlite3.Cursor, topic: str, subtopics: list[str]):
+    cursor.executemany("INSERT INTO subtopics (topic, subtopic) VALUES (?, ?);", [(topic, subtopic) for subtopic in subtopics])
+
+def select_subtopics_without_questions(cursor: sqlite3.Cursor, topic: str) -> list[dict]:
+    cursor.execute("""SELECT id, subtopic FROM subtopics
+    WHERE topic = ? AND questions_generated = 0;""", (topic,))
+    return [{"id": row[0], "subtopic": row[1]} for row in cursor.fetchall()]
+
+###### Questions ######
+def insert_questions(cursor: sqlite3.Cursor, created_at: str, subtopic_id: int, questions: list[str], attempts: int) -> int:
+    """Save a subtopic's questions; returns how many were flagged as near-duplicates."""
+    cursor.execute("SELECT topic FROM subtopics WHERE id = ?;", (subtopic_id,))
+    row = cursor.fetchone()
+    topic = row[0] if row else None
+    saved = []
+    for question in questions:
+        cursor.execute("""INSERT INTO questions_answers (created_at, subtopic_id,
+                       question) VALUES (?, ?, ?);""", (created_at, subtopic_id, question))
+        saved.append((cursor.lastrowid, question, topic))
+    flagged = index_questions(cursor, saved) if DUPLICATE_DETECTION else 0
+    cursor.execute("UPDATE subtopics SET questions_generated = 1, question_attempts = ? WHERE id = ?;", (attempts, subtopic_id))
+    return flagged
+
+def flag_duplicates(cursor: sqlite3.Cursor) -> int:
+    """Index questions that are not indexed yet, flagging near-duplicates."""
+    return index_unindexed(cursor) if DUPLICATE_DETECTION else 0
+
+###### Answers ######
+def select_pending_answers(cursor: sqlite3.Cursor, topic: str, limit_per_subtopic: int | None = None) -> list[dict]:
+    """Unanswered questions of every subtopic of `topic` that still needs answers."""
+    cursor.execute("""SELECT qa.id, qa.question, s.subtopic, s.id FROM (
+            SELECT id, question, subtopic_id,
+                ROW_NUMBER() OVER (PARTITION BY subtopic_id ORDER BY id) AS row_number
+            FROM questions_answers
+            WHERE answer IS NULL AND duplicate_of IS NULL
+        ) qa
+        JOIN subtopics s ON qa.subtopic_id = s.id
+        WHERE s.topic = ? AND s.answers_generated = 0
+            AND (? IS NULL OR qa.row_number <= ?)
+        ORDER BY s.id, qa.id;
+        """, (topic, limit_per_subtopic, limit_per_subtopic))
+    rows = cursor.fetchall()
+    return [{"qa_id": row[0], "question": row[1], "topic": topic,
+             "subtopic": row[2], "subtopic_id": row[3]} for row in rows]
+
+def select_unanswered(cursor: sqlite3.Cursor, qa_ids: list[int]) -> set[int]:
+    """Ids among `qa_ids` that still have no answer, e.g. when a run resumes."""
+    unanswered: set[int] = set()
+    for i in range(0, len(qa_ids), 500):
+        chunk = qa_ids[i:i+500]
+        cursor.execute(f"""SELECT id FROM questions_answers
+        WHERE answer IS NULL AND id IN ({",".join("?" * len(chunk))});""", chunk)
+        unanswered.update(row[0] for row in cursor.fetchall())
+    return unanswered
+
+def select_unanswered_questions(cursor: sqlite3.Cursor, qa_ids: list[int]) -> dict[int, dict]:
+    cursor.execute(f"""SELECT qa.id, qa.question, s.subtopic, s.topic FROM questions_answers qa
+    JOIN subtopics s ON qa.subtopic_id = s.id
+    WHERE qa.answer IS NULL AND qa.id IN ({",".join("?" * len(qa_ids))});""", qa_ids)
+    return {row[0]: {"question": row[1], "subtopic": row[2], "topic": row[3]} for row in cursor.fetchall()}
+
+def update_answers(cursor: sqlite3.Cursor, qa_responses: list[Tuple[str, int, str, int]]):
+    """Write `(answer, attempts, answer_tier, qa_id)` rows."""
+    cursor.executemany("""UPDATE questions_answers SET answer = ?, attempts = ?, answer_tier = ?
+    WHERE id = ?;""", qa_responses)
+
+def mark_answered_subtopics(cursor: sqlite3.Cursor, topic: str):
+    cursor.execute("""UPDATE subtopics SET answers_generated = 1
+    WHERE topic = ? AND answers_generated = 0 AND NOT EXISTS (
+        SELECT 1 FROM questions_answers qa
+        WHERE qa.subtopic_id = subtopics.id AND qa.answer IS NULL AND qa.duplicate_of IS NULL
+    );""", (topic,))
+
+def iter_answered_pairs(cursor: sqlite3.Cursor, fetch_size: int = 1000) -> Iterator[Tuple[str, str]]:
+    """Stream every answered `(question, answer)` pair, `fetch_size` rows at a time."""
+    cursor.execute("SELECT question, answer FROM questions_answers WHERE answer IS NOT NULL ORDER BY id;")
+    while rows := cursor.fetchmany(fetch_size):
+        yield from rows
+
+def iter_answered_rows(cursor: sqlite3.Cursor, batch_size: int = 10000) -> Iterator[list[tuple]]:
+    """Stream answered rows with their subtopic, in lists of up to `batch_size` rows.
+
+    Rows are `(id, topic, subtopic, subtopic_id, created_at, question, answer, attempts, answer_tier)`.
+    """
+    cursor.execute("""SELECT qa.id, s.topic, s.subtopic, qa.subtopic_id, qa.created_at, qa.question, qa.answer,
+        qa.attempts, qa.answer_tier
+    FROM questions_answers qa
+    LEFT JOIN subtopics s ON qa.subtopic_id = s.id
+    WHERE qa.answer IS NOT NULL
+    ORDER BY qa.id;""")
+    while rows := cursor.fetchmany(batch_size):
+        yield rows
+
+def select_export_bounds(cursor: sqlite3.Cursor) -> Watermark:
+    cursor.execute("SELECT COALESCE(MAX(id), 0), COALESCE(MAX(revision), 0) FROM questions_answers;")
+    row = cursor.fetchone()
+    return {"id": row[0], "revision": row[1]}
+
+def iter_changed_pairs(cursor: sqlite3.Cursor, since: Watermark, until: Watermark, fetch_size: int = 1000) -> Iterator[Tuple[str, str]]:
+    """Stream pairs answered after `since` and up to `until`.
+
+    Rows answered before revisions existed have none and are picked by id.
+    """
+    cursor.execute("""SELECT question, answer FROM questions_answers
+    WHERE answer IS NOT NULL AND (
+        (revision > ? AND revision <= ?)
+        OR (revision IS NULL AND id > ? AND id <= ?)
+    )
+    ORDER BY id;""", (since["revision"], until["revision"], since["id"], until["id"]))
+    while rows := cursor.fetchmany(fetch_size):
+        yield from rows
+
+def select_pairs_by_id(cursor: sqlite3.Cursor, qa_ids: list[int]) -> list[Tuple[str, str]]:
+    cursor.execute(f"""SELECT question, answer FROM questions_answers
+    WHERE id IN ({",".join("?" * len(qa_ids))}) ORDER BY id;""", qa_ids)
+    return cursor.fetchall()
+
+def select_base_dataset(cursor: sqlite3.Cursor) -> list[dict]:
+    cursor.execute("""SELECT qa.question, qa.answer, s.topic, s.subtopic, s.id FROM questions_answers qa
+    JOIN subtopics s ON qa.subtopic_id = s.id;""")
+    return [{"question": row[0], "answer": row[1], "topic": row[2], "subtopic": row[3], "subtopic_id": row[4]} for row in cursor.fetchall()]
+
+###### Export Watermarks ######
+def select_watermark(cursor: sqlite3.Cursor, target: str) -> Watermark:
+    cursor.execute("SELECT last_id, last_revision FROM export_watermarks WHERE target = ?;", (target,))
+    row = cursor.fetchone()
+    return {"id": row[0], "revision": row[1]} if row else {"id": 0, "revision": 0}
+
+def update_watermark(cursor: sqlite3.Cursor, target: str, watermark: Watermark, exported_at: str):
+    cursor.execute("""INSERT INTO export_watermarks (target, last_id, last_revision, exported_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(target) DO UPDATE SET last_id = excluded.last_id, last_revision = excluded.last_revision,
+        exported_at = excluded.exported_at;""",
+    (target, watermark["id"], watermark["revision"], exported_at))
+
+###### Batch ResponseGeneration ######
+def find_open_batch(cursor: sqlite3.Cursor, topic: str) -> Tuple[str | None, str] | None:
+    cursor.execute("""SELECT id, input_path FROM response_batches
+    WHERE topic = ? AND status NOT IN ('applied', 'failed', 'expired', 'cancelled')
+    ORDER BY created_at DESC LIMIT 1;""", (topic,))
+    return cursor.fetchone()
+
+def upsert_batch(cursor: sqlite3.Cursor, batch_id: str, created_at: str, topic: str, status: str, input_path: str):
+    cursor.execute("""INSERT INTO response_batches (id, created_at, topic, status, input_path)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET status = excluded.status;""",
+    (batch_id, created_at, topic, status, input_path))
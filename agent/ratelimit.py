@@ -0,0 +1,178 @@
+"""Shared async rate limiting for LLM deployments.
+
+Each deployment gets a concurrency cap plus requests-per-minute and
+tokens-per-minute token buckets, so a large `Send` fan-out queues locally at the
+quota ceiling instead of turning into a storm of 429s.
+"""
+
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+
+from agent.config import LLM_EXPECTED_OUTPUT_TOKENS, LLM_RATE_LIMITS
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    chars = sum(len(str(message.content)) for message in messages)
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def deployment_of(llm: Any) -> str:
+    return getattr(llm, "deployment_name", None) or getattr(llm, "model_name", None) or type(llm).__name__
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most `per_minute` units.
+
+    `take` reserves its amount right away, letting the balance go negative,
+    and then sleeps until the refill has paid the debt off. Reserving involves
+    no await, so it is atomic on the event loop, and waiters sleep
+    concurrently, each for its own place in the queue.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` units and return how many seconds to wait before using them."""
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def credit(self, amount: float):
+        """Give back (or, when negative, take) `amount` units."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    async def take(self, amount: float):
+        wait = self.reserve(amount)
+        if not wait:
+            return
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.credit(min(amount, self.capacity))
+            raise
+
+
+class DeploymentLimiter:
+    """Concurrency, RPM and TPM budget for a single deployment."""
+
+    def __init__(self, deployment: str, rpm: int, tpm: int, max_concurrency: int):
+        self.deployment = deployment
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.estimated_tokens = 0
+        self.actual_tokens = 0
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int):
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        start = time.monotonic()
+        try:
+            await self.slots.acquire()
+            took_request = False
+            try:
+                await self.requests.take(1)
+                took_request = True
+                await self.tokens.take(estimated_tokens)
+            except BaseException:
+                if took_request:
+                    self.requests.credit(1)
+                self.slots.release()
+                raise
+        finally:
+            self.queued -= 1
+        waited = time.monotonic() - start
+        self.calls += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the TPM budget once a response reports the tokens it really used."""
+        self.estimated_tokens += estimated_tokens
+        self.actual_tokens += actual_tokens
+        self.tokens.credit(estimated_tokens - actual_tokens)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "max_queue_depth": self.max_queue_depth,
+            "calls": self.calls,
+            "avg_wait": self.total_wait / self.calls if self.calls else 0.0,
+            "max_wait": self.max_wait,
+            "estimated_tokens": self.estimated_tokens,
+            "actual_tokens": self.actual_tokens,
+        }
+
+
+# asyncio primitives belong to one event loop, so limiters are kept per loop.
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, DeploymentLimiter]]" = weakref.WeakKeyDictionary()
+_quota_share = 1.0
+
+
+def set_quota_share(share: float):
+    """Use only `share` of every deployment budget, e.g. `1 / n` in each of `n` worker processes."""
+    global _quota_share
+    _quota_share = share
+
+
+def limiter_for(llm: Any) -> DeploymentLimiter:
+    deployment = deployment_of(llm)
+    limiters = _limiters.setdefault(asyncio.get_running_loop(), {})
+    if deployment not in limiters:
+        limits = LLM_RATE_LIMITS.get(deployment, LLM_RATE_LIMITS["default"])
+        limiters[deployment] = DeploymentLimiter(deployment, **{key: max(1, int(value * _quota_share)) for key, value in limits.items()})
+    return limiters[deployment]
+
+
+_windows: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def concurrency_window(name: str, size: int) -> asyncio.Semaphore:
+    """Named semaphore bounding how many units of work of one kind run at once."""
+    windows = _windows.setdefault(asyncio.get_running_loop(), {})
+    if name not in windows:
+        windows[name] = asyncio.Semaphore(max(1, size))
+    return windows[name]
+
+
+def rate_limit_stats() -> dict[str, dict[str, Any]]:
+    stats = {}
+    for limiters in _limiters.values():
+        for deployment, limiter in limiters.items():
+            stats[deployment] = limiter.stats()
+    return stats
+
+
+def request_budget(query: list[BaseMessage], n: int = 1) -> int:
+    return estimate_tokens(query) + LLM_EXPECTED_OUTPUT_TOKENS * n
@@ -0,0 +1,185 @@
+"""Retries and circuit breaking for LLM calls.
+
+Throttled, timed out and transient server errors are retried with exponential
+backoff and full jitter, honoring the `Retry-After` hint Azure sends with 429s.
+Malformed structured output is only retried for sampled calls: a deterministic
+call would most likely return the same output again.
+A per-deployment circuit breaker stops sending requests to a deployment that
+keeps failing and lets a single probe through once it has cooled down.
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+import openai
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+from agent.config import (
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_MAX_WAIT_SECONDS,
+    LLM_RETRY_BASE_DELAY_SECONDS,
+    LLM_RETRY_MAX_ATTEMPTS,
+    LLM_RETRY_MAX_DELAY_SECONDS,
+)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a deployment's circuit breaker is shedding load."""
+
+    def __init__(self, deployment: str, retry_after: float):
+        super().__init__(f"circuit open for deployment {deployment!r}, retry in {retry_after:.1f}s")
+        self.deployment = deployment
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open single probe."""
+
+    def __init__(self, deployment: str, failure_threshold: int, cooldown_seconds: float):
+        self.deployment = deployment
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.shed_calls = 0
+
+    def before_call(self):
+        if self.state == "closed":
+            return
+        remaining = self.opened_at + self.cooldown_seconds - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return
+        self.shed_calls += 1
+        # While a probe is in flight nobody knows when it will finish, so
+        # waiters come back after a fraction of the cooldown.
+        raise CircuitOpenError(self.deployment, max(remaining, self.cooldown_seconds / 4))
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "shed_calls": self.shed_calls,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(deployment: str) -> CircuitBreaker:
+    if deployment not in _breakers:
+        _breakers[deployment] = CircuitBreaker(deployment, LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_COOLDOWN_SECONDS)
+    return _breakers[deployment]
+
+
+def breaker_stats() -> dict[str, dict[str, Any]]:
+    return {deployment: breaker.stats() for deployment, breaker in _breakers.items()}
+
+
+def is_retryable(error: BaseException, deterministic: bool = False) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return not deterministic and isinstance(error, (OutputParserException, ValidationError))
+
+
+def is_deployment_failure(error: BaseException) -> bool:
+    """Whether the error says something about the deployment's health."""
+    return is_retryable(error) and not isinstance(error, (OutputParserException, ValidationError))
+
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    if isinstance(error, CircuitOpenError):
+        return error.retry_after
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            pass
+    return None
+
+
+def backoff_delay(attempt: int, error: BaseException) -> float:
+    hinted = retry_after_seconds(error)
+    ceiling = min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+    jittered = random.uniform(0, ceiling)
+    if hinted is not None:
+        return min(LLM_RETRY_MAX_DELAY_SECONDS, hinted) + jittered * 0.1
+    return jittered
+
+
+async def call_with_retry(deployment: str, call: Callable[[], Awaitable[T]], deterministic: bool = False) -> T:
+    """Await a fresh `call()` until it succeeds or the retry budget runs out.
+
+    Pass `deterministic=True` for temperature 0 calls so that output that
+    fails to parse is raised straight away instead of being asked for again.
+    """
+    breaker = breaker_for(deployment)
+    attempt = 0
+    shed_wait = 0.0
+    while True:
+        try:
+            breaker.before_call()
+            result = await call()
+        except CircuitOpenError as error:
+            # Shed calls never reached the deployment, so they spend the wait
+            # budget instead of the attempt budget.
+            delay = backoff_delay(attempt, error)
+            shed_wait += delay
+            if shed_wait > LLM_BREAKER_MAX_WAIT_SECONDS:
+                raise
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            breaker.probe_in_flight = False
+            raise
+        except Exception as error:
+            if is_deployment_failure(error):
+                breaker.record_failure()
+            else:
+                breaker.probe_in_flight = False
+            attempt += 1
+            if not is_retryable(error, deterministic) or attempt >= LLM_RETRY_MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, error))
+        else:
+            breaker.record_success()
+            return result
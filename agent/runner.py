@@ -0,0 +1,250 @@
+"""Headless runner for the dataset graph, for scripts and cron.
+
+    python -m agent.runner --mode subtopic_generation --mode question_generation \\
+        --mode response_generation --topic "Agentic AI" --topic "Responsible AI"
+
+Each topic runs its modes in the given order in its own worker process (at
+most `--processes` at a time, every process with an equal share of the
+deployment rate limits); once a mode fails the remaining modes of that topic
+are skipped. Topic-independent modes (`prompt_testing_*`, `output_*`) run once
+after all topics, under the topic label `*`. Progress goes to stderr line by line, the summary to stdout.
+
+Exit codes: 0 everything succeeded, 1 a run failed, 2 invalid arguments,
+3 every run finished but some questions could not be answered, 130 interrupted.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, TypedDict
+
+from agent.agent import graph, main_builder
+from agent.checkpoint import open_checkpointer, thread_input
+from agent.config import CHECKPOINT_PATH
+from agent.nodes import Mode, Topic
+from agent.ratelimit import set_quota_share
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_PARTIAL = 3
+EXIT_INTERRUPTED = 130
+
+GLOBAL_MODES = (
+    Mode.PROMPT_TESTING_SOME.value,
+    Mode.PROMPT_TESTING_ALL.value,
+    Mode.OUTPUT_JSONL.value,
+    Mode.OUTPUT_CSV.value,
+    Mode.OUTPUT_JSONL_INCREMENTAL.value,
+    Mode.OUTPUT_CSV_INCREMENTAL.value,
+    Mode.OUTPUT_COLUMNAR.value,
+)
+# Topic label of the global modes in events, results and checkpoint threads.
+GLOBAL_TOPIC = "*"
+
+
+class ModeResult(TypedDict):
+    topic: str
+    mode: str
+    outcome: str  # succeeded | failed | skipped
+    status: str
+    failed_items: int
+    seconds: float
+
+
+class RunOptions(TypedDict):
+    resume: bool
+    checkpoint_path: str
+    recursion_limit: int
+
+
+# (topic, mode, kind, payload) with kind one of start, node, progress, done, error.
+Event = tuple[str, str, str, Any]
+
+
+def thread_id_for(topic: str, mode: str) -> str:
+    """Checkpoint thread of a run; a run started again on the same day resumes it."""
+    return f"{datetime.now().strftime('%m-%d-%Y')}:{topic}:{mode}"
+
+
+async def run_mode(compiled: Any, topic: str, mode: str, options: RunOptions, events: Any) -> ModeResult:
+    start = time.perf_counter()
+    config: dict[str, Any] = {"recursion_limit": options["recursion_limit"]}
+    run_input: dict[str, Any] | None = {"mode": mode, "topic": topic}
+    if options["resume"]:
+        config["configurable"] = {"thread_id": thread_id_for(topic, mode)}
+        thread_status, run_input = await thread_input(compiled, run_input, config)  # type: ignore
+        if thread_status == "finished":
+            events.put((topic, mode, "done", "already finished today"))
+            return {"topic": topic, "mode": mode, "outcome": "skipped", "status": "already finished today", "failed_items": 0, "seconds": 0.0}
+        events.put((topic, mode, "start", "resuming" if thread_status == "interrupted" else "starting"))
+    else:
+        events.put((topic, mode, "start", "starting"))
+
+    status = ""
+    failed_items = 0
+    try:
+        async for stream_mode, chunk in compiled.astream(run_input, config, stream_mode=["updates", "custom"]):
+            if stream_mode == "custom":
+                failed_items = chunk.get("failed", failed_items)
+                events.put((topic, mode, "progress", chunk))
+                continue
+            for node, update in chunk.items():
+                if isinstance(update, dict) and update.get("status"):
+                    status = update["status"]
+                events.put((topic, mode, "node", node))
+    except Exception as error:
+        message = f"{type(error).__name__}: {error}"
+        events.put((topic, mode, "error", message))
+        return {"topic": topic, "mode": mode, "outcome": "failed", "status": message, "failed_items": failed_items, "seconds": time.perf_counter() - start}
+
+    events.put((topic, mode, "done", status or "finished"))
+    return {"topic": topic, "mode": mode, "outcome": "succeeded", "status": status, "failed_items": failed_items, "seconds": time.perf_counter() - start}
+
+
+async def run_modes(topic: str, modes: list[str], options: RunOptions, events: Any) -> list[ModeResult]:
+    async def run_all(compiled: Any) -> list[ModeResult]:
+        results: list[ModeResult] = []
+        for mode in modes:
+            if any(result["outcome"] == "failed" for result in results):
+                results.append({"topic": topic, "mode": mode, "outcome": "skipped", "status": "an earlier mode failed", "failed_items": 0, "seconds": 0.0})
+                continue
+            results.append(await run_mode(compiled, topic, mode, options, events))
+        return results
+
+    if options["resume"]:
+        async with open_checkpointer(options["checkpoint_path"]) as saver:
+            return await run_all(main_builder.compile(checkpointer=saver))
+    return await run_all(graph)
+
+
+def run_topic(topic: str, modes: list[str], options: RunOptions, events: Any, quota_share: float) -> list[ModeResult]:
+    """Worker process entry point."""
+    set_quota_share(quota_share)
+    return asyncio.run(run_modes(topic, modes, options, events))
+
+
+def print_events(events: Any, started: float, interval: float, stream: Any = sys.stderr):
+    """Print events until `None` arrives; node and progress lines are throttled per run."""
+    last_printed: dict[tuple[str, str], float] = {}
+    last_node: dict[tuple[str, str], str] = {}
+    node_counts: dict[tuple[str, str, str], int] = {}
+    while (event := events.get()) is not None:
+        topic, mode, kind, payload = event
+        key = (topic, mode)
+        now = time.monotonic()
+        if kind == "node":
+            node_counts[(topic, mode, payload)] = node_counts.get((topic, mode, payload), 0) + 1
+            count = node_counts[(topic, mode, payload)]
+            message = payload if count == 1 else f"{payload} ({count})"
+            if last_node.get(key) == payload and now - last_printed.get(key, 0) < interval:
+                continue
+            last_node[key] = payload
+        elif kind == "progress":
+            done = payload["answered"] + payload["failed"] == payload["total"]
+            if now - last_printed.get(key, 0) < interval and not done and "error" not in payload:
+                continue
+            message = f"answered {payload['answered']}/{payload['total']}, {payload['failed']} failed"
+            if "error" in payload:
+                message += f" (question {payload['qa_id']} of subtopic {payload['subtopic_id']}: {payload['error']})"
+        elif kind == "error":
+            message = f"FAILED {payload}"
+        else:
+            message = payload
+        last_printed[key] = now
+        print(f"[{now - started:8.1f}s] {topic} | {mode} | {message}", file=stream, flush=True)
+
+
+def print_summary(results: list[ModeResult], stream: Any = sys.stdout):
+    for result in results:
+        failed_items = f", {result['failed_items']} items failed" if result["failed_items"] else ""
+        print(f"{result['outcome']:>9}  {result['seconds']:8.1f}s  {result['topic']} | {result['mode']}  {result['status']}{failed_items}", file=stream)
+
+
+def exit_code(results: list[ModeResult]) -> int:
+    if any(result["outcome"] == "failed" for result in results):
+        return EXIT_FAILED
+    if any(result["failed_items"] for result in results):
+        return EXIT_PARTIAL
+    return EXIT_OK
+
+
+def run_topics(topics: list[str], modes: list[str], options: RunOptions, processes: int, events: Any) -> list[ModeResult]:
+    if processes == 1:
+        return [result for topic in topics for result in run_topic(topic, modes, options, events, 1.0)]
+    results: list[ModeResult] = []
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(run_topic, topic, modes, options, events, 1 / processes): topic for topic in topics}
+        try:
+            for future in as_completed(futures):
+                topic = futures[future]
+                try:
+                    results.extend(future.result())
+                except Exception as error:
+                    events.put((topic, "-", "error", f"worker crashed: {type(error).__name__}: {error}"))
+                    results.append({"topic": topic, "mode": "-", "outcome": "failed", "status": f"worker crashed: {error}", "failed_items": 0, "seconds": 0.0})
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    order = {topic: i for i, topic in enumerate(topics)}
+    return sorted(results, key=lambda result: order[result["topic"]])
+
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m agent.runner", description="Run dataset generation modes for one or more topics without the LangGraph UI.")
+    parser.add_argument("-m", "--mode", action="append", required=True, choices=[mode.value for mode in Mode],
+                        help="Mode to run; repeat to run several modes in order.")
+    parser.add_argument("-t", "--topic", action="append", choices=[topic.value for topic in Topic],
+                        help="Topic to run; repeat for several topics. Defaults to every topic.")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="Topics run in parallel, each in its own process. Defaults to the number of CPUs.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Checkpoint every run and resume today's unfinished runs instead of starting over.")
+    parser.add_argument("--checkpoint-path", default=CHECKPOINT_PATH)
+    parser.add_argument("--recursion-limit", type=int, default=100)
+    parser.add_argument("--progress-interval", type=float, default=1.0,
+                        help="Minimum seconds between repeated progress lines of one run.")
+    args = parser.parse_args(argv)
+    if args.processes is not None and args.processes < 1:
+        parser.error("--processes must be at least 1")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    topics = list(dict.fromkeys(args.topic or [topic.value for topic in Topic]))
+    topic_modes = [mode for mode in args.mode if mode not in GLOBAL_MODES]
+    global_modes = [mode for mode in args.mode if mode in GLOBAL_MODES]
+    processes = min(args.processes or os.cpu_count() or 1, len(topics)) if topic_modes else 1
+    options: RunOptions = {"resume": args.resume, "checkpoint_path": args.checkpoint_path, "recursion_limit": args.recursion_limit}
+
+    manager = multiprocessing.Manager() if processes > 1 else None
+    events = manager.Queue() if manager is not None else queue.Queue()
+    printer = threading.Thread(target=print_events, args=(events, time.monotonic(), args.progress_interval), daemon=True)
+    printer.start()
+    results: list[ModeResult] = []
+    try:
+        if topic_modes:
+            results.extend(run_topics(topics, topic_modes, options, processes, events))
+        if global_modes and exit_code(results) != EXIT_FAILED:
+            results.extend(asyncio.run(run_modes(GLOBAL_TOPIC, global_modes, options, events)))
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    finally:
+        events.put(None)
+        printer.join(timeout=5)
+        if manager is not None:
+            manager.shutdown()
+    print_summary(results)
+    return exit_code(results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Bounded sliding-window execution of independent work items."""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def run_sliding_window(
+    items: Iterable[T],
+    worker: Callable[[T], Awaitable[R]],
+    window: int,
+    on_done: Callable[[T, R | None, BaseException | None], Awaitable[None]],
+) -> tuple[int, int]:
+    """Keep up to `window` workers in flight, starting a new one as each finishes.
+
+    Unlike a `Send` fan-out there is no barrier: the slowest item only holds
+    its own slot. `on_done` receives every item with either its result or the
+    exception it raised, so one failure does not stop the rest. Returns the
+    number of succeeded and failed items.
+    """
+    iterator = iter(items)
+    in_flight: dict[asyncio.Task, T] = {}
+    succeeded = failed = 0
+
+    def refill():
+        while len(in_flight) < max(1, window):
+            item = next(iterator, None)
+            if item is None:
+                return
+            in_flight[asyncio.ensure_future(worker(item))] = item
+
+    refill()
+    try:
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item = in_flight.pop(task)
+                # exception() raises for a cancelled worker instead of returning it.
+                error = asyncio.CancelledError() if task.cancelled() else task.exception()
+                if error is None:
+                    succeeded += 1
+                    await on_done(item, task.result(), None)
+                else:
+                    failed += 1
+                    await on_done(item, None, error)
+            refill()
+    finally:
+        for task in in_flight:
+            task.cancel()
+    return succeeded, failed
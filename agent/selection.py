@@ -0,0 +1,115 @@
+"""Judge-based selection among N generated candidates.
+
+The judge only ever outputs candidate numbers, never candidate text, so its
+latency does not grow with the length of the candidates and the winner is
+returned verbatim.
+
+Strategies:
+    index: one call, the judge returns the number of the best candidate.
+    ranking: one call, the judge returns every candidate number ordered from best to worst.
+    tournament: pairwise matches, all matches of a round run concurrently.
+
+Before any judge call, candidates that are near-identical (shingled Jaccard
+similarity above `SIMILARITY_THRESHOLD`) are collapsed into one; when a single
+candidate is left the judge is skipped entirely.
+"""
+
+import asyncio
+from typing import Any
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel
+
+from agent.config import SELECTION_STRATEGY, SIMILARITY_THRESHOLD
+from agent.llm import ainvoke_structured
+from agent.prompts import RANK_CANDIDATES_INSTRUCTION
+from agent.similarity import near_duplicate_groups
+
+STRATEGIES = ("index", "ranking", "tournament")
+
+stats = {
+    "selections": 0,
+    "judge_calls_avoided": 0,
+    "candidates_collapsed": 0,
+}
+
+
+class BestCandidate(BaseModel):
+    """The number (starting from 1) of the best candidate."""
+    best_index: int
+
+
+class CandidateRanking(BaseModel):
+    """Every candidate number (starting from 1), ordered from the best to the worst candidate."""
+    ranking: list[int]
+
+
+def render_candidates(candidates: list[str], label: str, context: str = "") -> str:
+    rendered = "\n\n".join([f"{label} {i+1}:\n{candidate}" for i, candidate in enumerate(candidates)])
+    return f"{context}\n\n{rendered}" if context else rendered
+
+
+def clamp_index(number: int, count: int) -> int:
+    """Convert the judge's 1-based number to a valid 0-based index."""
+    return min(max(number, 1), count) - 1
+
+
+async def pick_index(llm: Any, instructions: str, candidates: list[str], label: str, context: str = "") -> int:
+    query = [SystemMessage(content=instructions), HumanMessage(content=render_candidates(candidates, label, context))]
+    response = await ainvoke_structured(llm, BestCandidate, query)
+    return clamp_index(response.best_index, len(candidates))
+
+
+async def pick_ranking(llm: Any, instructions: str, candidates: list[str], label: str, context: str = "") -> int:
+    query = [
+        SystemMessage(content=f"{instructions}\n{RANK_CANDIDATES_INSTRUCTION}"),
+        HumanMessage(content=render_candidates(candidates, label, context)),
+    ]
+    response = await ainvoke_structured(llm, CandidateRanking, query)
+    for number in response.ranking:
+        if 1 <= number <= len(candidates):
+            return number - 1
+    return 0
+
+
+async def pick_tournament(llm: Any, instructions: str, candidates: list[str], label: str, context: str = "") -> int:
+    contenders = list(range(len(candidates)))
+    while len(contenders) > 1:
+        pairs = [contenders[i:i+2] for i in range(0, len(contenders) - 1, 2)]
+        bye = [contenders[-1]] if len(contenders) % 2 else []
+        winners = await asyncio.gather(*[
+            pick_index(llm, instructions, [candidates[a], candidates[b]], label, context) for a, b in pairs
+        ])
+        contenders = [pair[winner] for pair, winner in zip(pairs, winners)] + bye
+    return contenders[0]
+
+
+async def select_best(llm: Any, instructions: str, candidates: list[str], label: str, context: str = "", strategy: str = SELECTION_STRATEGY) -> int:
+    """Return the index of the best candidate according to the judge `llm`.
+
+    `instructions` should be static so every judge call shares one cacheable
+    system prompt; per-call details such as the topic go in `context`, which
+    precedes the candidates in the user message.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown selection strategy {strategy!r}, expected one of {STRATEGIES}")
+    stats["selections"] += 1
+    if len(candidates) == 1:
+        return 0
+    representatives = near_duplicate_groups(candidates, SIMILARITY_THRESHOLD)
+    stats["candidates_collapsed"] += len(candidates) - len(representatives)
+    if len(representatives) == 1:
+        stats["judge_calls_avoided"] += 1
+        return representatives[0]
+    distinct = [candidates[i] for i in representatives]
+    if strategy == "ranking":
+        best = await pick_ranking(llm, instructions, distinct, label, context)
+    elif strategy == "tournament":
+        best = await pick_tournament(llm, instructions, distinct, label, context)
+    else:
+        best = await pick_index(llm, instructions, distinct, label, context)
+    return representatives[best]
+
+
+def selection_stats() -> dict[str, int]:
+    return dict(stats)
@@ -0,0 +1,76 @@
+"""Cheap local text similarity: word shingles, Jaccard and MinHash.
+
+Shingles are hashed with a BLAKE2 digest instead of `hash()` so
+signatures are stable across processes and can be persisted.
+"""
+
+import hashlib
+import random
+import re
+
+from agent.config import SHINGLE_SIZE
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[int]:
+    """Hashed word `size`-grams of `text` (the whole text when it is shorter)."""
+    tokens = tokenize(text)
+    if len(tokens) <= size:
+        return {stable_hash(" ".join(tokens))} if tokens else set()
+    return {stable_hash(" ".join(tokens[i:i+size])) for i in range(len(tokens) - size + 1)}
+
+
+def jaccard(a: set[int], b: set[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def text_similarity(a: str, b: str) -> float:
+    return jaccard(shingles(a), shingles(b))
+
+
+def near_duplicate_groups(texts: list[str], threshold: float) -> list[int]:
+    """Index of the first member of every group of near-identical texts."""
+    shingle_sets = [shingles(text) for text in texts]
+    representatives: list[int] = []
+    for i, current in enumerate(shingle_sets):
+        if all(jaccard(current, shingle_sets[j]) < threshold for j in representatives):
+            representatives.append(i)
+    return representatives
+
+
+class MinHash:
+    """MinHash signatures approximating Jaccard similarity of shingle sets."""
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        generator = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (generator.randint(1, MERSENNE_PRIME - 1), generator.randint(0, MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingle_set: set[int]) -> list[int]:
+        if not shingle_set:
+            return [MAX_HASH] * self.num_perm
+        values = list(shingle_set)
+        return [
+            min([(a * value + b) % MERSENNE_PRIME for value in values]) & MAX_HASH
+            for a, b in self.permutations
+        ]
+
+    @staticmethod
+    def estimate(a: list[int], b: list[int]) -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
@@ -4,23 +4,168 @@ It includes a basic Tavily search function (as an example)
 
 These tools are intended as free examples to get started. For production use,
 consider implementing more robust and specialized tools tailored to your needs.
+
+Results are cached in SQLite for `SEARCH_CACHE_TTL_SECONDS`. Identical
+queries issued while one is in flight share its request, and `search_many`
+runs a list of queries with at most `SEARCH_CONCURRENCY` in flight. The
+backend is pluggable: `set_search_backend(FakeSearchBackend())` (or
+`SEARCH_BACKEND=fake`) answers locally, for tests and benchmarks.
 """
 
+import asyncio
+import atexit
+import hashlib
+import json
+import weakref
 from collections.abc import Callable
-from typing import Any, cast
+from typing import Any, Protocol, cast
+
+from agent.cache import LLMCache
+from agent.config import SEARCH_BACKEND, SEARCH_CACHE_ENABLED, SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_SECONDS, SEARCH_CONCURRENCY, SEARCH_MAX_RESULTS
+
+SearchResults = list[dict[str, Any]]
+
+
+class SearchBackend(Protocol):
+    name: str
+
+    async def search(self, query: str, topic: str, max_results: int) -> SearchResults:
+        ...
+
+
+class TavilySearchBackend:
+    """Tavily search, reusing one client per topic and result count."""
+
+    name = "tavily"
+
+    def __init__(self, search_depth: str = "advanced"):
+        self.search_depth = search_depth
+        self._clients: dict[tuple[str, int], Any] = {}
+
+    def client(self, topic: str, max_results: int) -> Any:
+        # Imported here so the fake backend works without the Tavily integration.
+        from langchain_community.tools import TavilySearchResults
+
+        key = (topic, max_results)
+        if key not in self._clients:
+            self._clients[key] = TavilySearchResults(max_results=max_results, search_depth=self.search_depth, topic=topic)  # type: ignore
+        return self._clients[key]
+
+    async def search(self, query: str, topic: str, max_results: int) -> SearchResults:
+        result = await self.client(topic, max_results).ainvoke({"query": query})
+        return cast(SearchResults, result)
+
+
+class FakeSearchBackend:
+    """Deterministic local results after `latency` seconds; counts the queries it receives."""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def search(self, query: str, topic: str, max_results: int) -> SearchResults:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        digest = hashlib.sha256(f"{topic}\n{query}".encode("utf-8")).hexdigest()
+        return [
+            {
+                "url": f"https://example.com/{topic}/{digest[:12]}/{i}",
+                "content": f"Result {i + 1} for {query!r} ({topic}).",
+                "score": round(1 - i / (max_results + 1), 3),
+            }
+            for i in range(max_results)
+        ]
+
 
-from langchain_community.tools import TavilySearchResults
+search_cache = LLMCache(SEARCH_CACHE_PATH, SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS, table="search_cache")
+atexit.register(search_cache.close)
 
-async def search(query: str, topic: str) -> list[dict[str, Any]] | None:
+stats = {
+    "requests": 0,
+    "cache_hits": 0,
+    "collapsed": 0,
+    "backend_calls": 0,
+    "errors": 0,
+}
+
+_backend: SearchBackend | None = None
+# In-flight requests by cache key, per event loop.
+_inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Task]]" = weakref.WeakKeyDictionary()
+
+
+def set_search_backend(backend: SearchBackend | None):
+    global _backend
+    _backend = backend
+
+
+def get_search_backend() -> SearchBackend:
+    global _backend
+    if _backend is None:
+        _backend = FakeSearchBackend() if SEARCH_BACKEND == "fake" else TavilySearchBackend()
+    return _backend
+
+
+def make_search_key(backend: SearchBackend, query: str, topic: str, max_results: int) -> str:
+    payload = {"backend": backend.name, "query": " ".join(query.split()), "topic": topic, "max_results": max_results}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def _fetch(backend: SearchBackend, key: str, query: str, topic: str, max_results: int) -> SearchResults:
+    stats["backend_calls"] += 1
+    try:
+        result = await backend.search(query, topic, max_results)
+    except Exception:
+        stats["errors"] += 1
+        raise
+    if SEARCH_CACHE_ENABLED:
+        await search_cache.aset(key, json.dumps(result))
+    return result
+
+
+async def search(query: str, topic: str, max_results: int = SEARCH_MAX_RESULTS) -> SearchResults | None:
     """Search for general web results.
 
     This function performs a search using the Tavily search engine, which is designed
     to provide comprehensive, accurate, and trusted results. It's particularly useful
     for answering questions about current events.
     """
-    wrapped = TavilySearchResults(max_results=5, search_depth="advanced", topic=topic)
-    result = await wrapped.ainvoke({"query": query})
-    return cast(list[dict[str, Any]], result)
+    stats["requests"] += 1
+    backend = get_search_backend()
+    key = make_search_key(backend, query, topic, max_results)
+    if SEARCH_CACHE_ENABLED:
+        cached = await search_cache.aget(key)
+        if cached is not None:
+            stats["cache_hits"] += 1
+            return json.loads(cached)
+
+    inflight = _inflight.setdefault(asyncio.get_running_loop(), {})
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = asyncio.ensure_future(_fetch(backend, key, query, topic, max_results))
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    else:
+        stats["collapsed"] += 1
+    # Shielded so a cancelled caller does not cancel the request the others wait on.
+    return await asyncio.shield(task)
+
+
+async def search_many(queries: list[str], topic: str, max_results: int = SEARCH_MAX_RESULTS,
+                      concurrency: int = SEARCH_CONCURRENCY) -> list[SearchResults | None]:
+    """`search` every query, at most `concurrency` at a time; results are in query order."""
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(query: str) -> SearchResults | None:
+        async with slots:
+            return await search(query, topic, max_results)
+
+    return await asyncio.gather(*[run(query) for query in queries])
+
+
+def search_stats() -> dict[str, Any]:
+    return {**stats, "cache": search_cache.stats()}
 
 
 TOOLS: list[Callable[..., Any]] = [search]
@@ -0,0 +1,128 @@
+"""Batched, streaming writes of generated answers to SQLite.
+
+Answers are queued as soon as their subgraph returns and committed together
+every `ANSWER_WRITER_FLUSH_SECONDS` (or once `ANSWER_WRITER_MAX_BATCH`
+statements are waiting), so a crash only loses the last flush interval and
+results never pile up in graph state.
+"""
+
+import asyncio
+import sqlite3
+import weakref
+from typing import Any
+
+from agent.config import ANSWER_WRITER_FLUSH_SECONDS, ANSWER_WRITER_MAX_BATCH
+from agent.db import get_db
+
+
+class AnswerWriter:
+    """Queues statements for one database and commits them in batches, in order."""
+
+    def __init__(self, filename_db: str, flush_interval: float, max_batch: int):
+        self.filename_db = filename_db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending: list[tuple[str, tuple[Any, ...], asyncio.Future]] = []
+        # Every future handed out since the last flush, including those of a
+        # batch that is being written right now.
+        self.issued: list[asyncio.Future] = []
+        self.flushes = 0
+        self.statements = 0
+        self._last_answer_id: int | None = None
+        self._wakeup = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+
+    def enqueue(self, sql: str, params: tuple[Any, ...]) -> asyncio.Future:
+        """Queue a statement; the future resolves to its `lastrowid` once committed."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((sql, params, future))
+        self.issued.append(future)
+        if len(self.pending) >= self.max_batch:
+            self._wakeup.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+        return future
+
+    async def execute(self, sql: str, params: tuple[Any, ...]) -> int:
+        return await self.enqueue(sql, params)
+
+    async def reserve_answer_id(self) -> int:
+        """Allocate the id of a new `questions_answers` row without waiting for a flush.
+
+        Only the first call reads the database, so reservations assume this
+        writer is the only one inserting answers into it while the run lasts.
+        """
+        if self._last_answer_id is None:
+            last_id = await get_db(self.filename_db).aread(
+                lambda cursor: cursor.execute("SELECT COALESCE(MAX(id), 0) FROM questions_answers;").fetchone()[0])
+            if self._last_answer_id is None:
+                self._last_answer_id = last_id
+        self._last_answer_id += 1
+        return self._last_answer_id
+
+    def insert_answer(self, qa_id: int, created_at: str, question: str, answer: str, subtopic_id: int, attempts: int, tier: str) -> asyncio.Future:
+        return self.enqueue("""INSERT INTO questions_answers (id, created_at, question, answer, subtopic_id, attempts, answer_tier)
+        VALUES (?, ?, ?, ?, ?, ?, ?);""", (qa_id, created_at, question, answer, subtopic_id, attempts, tier))
+
+    def update_answer(self, qa_id: int, answer: str, attempts: int, tier: str) -> asyncio.Future:
+        return self.enqueue("""UPDATE questions_answers SET answer = ?, attempts = ?, answer_tier = ?
+        WHERE id = ?;""", (answer, attempts, tier, qa_id))
+
+    def mark_subtopic_answered(self, subtopic_id: int) -> asyncio.Future:
+        return self.enqueue("UPDATE subtopics SET answers_generated = 1 WHERE id = ?;", (subtopic_id,))
+
+    async def flush(self):
+        """Commit everything queued so far and re-raise the first write error.
+
+        Errors of statements whose futures were never awaited surface here,
+        whether their batch was still queued or already being written.
+        """
+        self._wakeup.set()
+        if self._flusher is not None:
+            await asyncio.shield(self._flusher)
+        # Statements queued while this flush waited stay tracked for the next one.
+        done = [future for future in self.issued if future.done()]
+        self.issued = [future for future in self.issued if not future.done()]
+        errors = [future.exception() for future in done if not future.cancelled()]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    async def _run(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            batch, self.pending = self.pending, []
+            try:
+                statements = [(sql, params) for sql, params, _ in batch]
+                row_ids = await get_db(self.filename_db).awrite(lambda cursor: self._write(cursor, statements))
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, _, future), row_id in zip(batch, row_ids):
+                if not future.done():
+                    future.set_result(row_id)
+
+    def _write(self, cursor: sqlite3.Cursor, statements: list[tuple[str, tuple[Any, ...]]]) -> list[int]:
+        row_ids = []
+        for sql, params in statements:
+            cursor.execute(sql, params)
+            row_ids.append(cursor.lastrowid)
+        self.flushes += 1
+        self.statements += len(statements)
+        return row_ids
+
+
+_writers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, AnswerWriter]]" = weakref.WeakKeyDictionary()
+
+
+def get_writer(filename_db: str) -> AnswerWriter:
+    writers = _writers.setdefault(asyncio.get_running_loop(), {})
+    if filename_db not in writers:
+        writers[filename_db] = AnswerWriter(filename_db, ANSWER_WRITER_FLUSH_SECONDS, ANSWER_WRITER_MAX_BATCH)
+    return writers[filename_db]
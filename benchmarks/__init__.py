@@ -0,0 +1 @@
+"""End-to-end benchmarks of the dataset graph against a fake LLM backend."""
@@ -0,0 +1,124 @@
+"""Fake chat model that answers structured calls without network access.
+
+It stands in for `fast_llm` and `creative_llm`: every call sleeps for a
+latency drawn from a configurable distribution, fails with a retryable server
+error at `error_rate`, and otherwise returns a tool call whose arguments fill
+the requested schema. Strings get `output_words` words, lists `list_items`
+items, booleans are False at `reject_rate` and integers are drawn from 1..5.
+Usage metadata is estimated at four characters per token. Sync calls run the
+async path in a fresh event loop.
+
+Latency specs:
+    const:0.2             always 0.2s
+    uniform:0.1,0.5       uniform between 0.1s and 0.5s
+    lognormal:0.3,0.5     median 0.3s, sigma 0.5
+    exp:0.3               exponential with mean 0.3s
+"""
+
+import asyncio
+import itertools
+import math
+import random
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import openai
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+Latency = Callable[[random.Random], float]
+
+VOCABULARY_SIZE = 5000
+
+
+def parse_latency(spec: str) -> Latency:
+    kind, _, arguments = spec.partition(":")
+    values = [float(value) for value in arguments.split(",") if value]
+    if kind == "const" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+    raise ValueError(f"Invalid latency spec {spec!r}, expected const:S, uniform:A,B, lognormal:MEDIAN,SIGMA or exp:MEAN")
+
+
+def server_error() -> openai.InternalServerError:
+    request = httpx.Request("POST", "https://fake-llm.invalid/chat/completions")
+    return openai.InternalServerError("fake server error", response=httpx.Response(500, request=request), body=None)
+
+
+class FakeChatModel(BaseChatModel):
+    deployment_name: str = "fake"
+    temperature: float = 0.6
+    latency: str = "const:0"
+    error_rate: float = 0.0
+    reject_rate: float = 0.0
+    output_words: int = 60
+    list_items: int = 10
+    seed: int = 0
+    calls: int = 0
+    errors: int = 0
+    _rng: random.Random = PrivateAttr()
+    _latency: Latency = PrivateAttr()
+    _counter: Any = PrivateAttr()
+
+    def model_post_init(self, context: Any):
+        self._rng = random.Random(f"{self.seed}-{self.deployment_name}")
+        self._latency = parse_latency(self.latency)
+        self._counter = itertools.count()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._agenerate(messages, stop=stop, **kwargs))
+        raise RuntimeError("FakeChatModel cannot block inside a running event loop; use ainvoke")
+
+    def _text(self) -> str:
+        # A unique prefix and random words keep generated questions from being flagged as near-duplicates.
+        words = [f"w{self._rng.randrange(VOCABULARY_SIZE)}" for _ in range(max(self.output_words - 1, 0))]
+        return " ".join([f"item{next(self._counter)}"] + words)
+
+    def _fill(self, schema: dict[str, Any], definitions: dict[str, Any]) -> Any:
+        if "$ref" in schema:
+            return self._fill(definitions[schema["$ref"].split("/")[-1]], definitions)
+        kind = schema.get("type")
+        if kind == "string":
+            return self._text()
+        if kind == "integer":
+            return self._rng.randint(1, 5)
+        if kind == "boolean":
+            return self._rng.random() >= self.reject_rate
+        if kind == "array":
+            return [self._fill(schema["items"], definitions) for _ in range(self.list_items)]
+        if kind == "object":
+            return {name: self._fill(value, definitions) for name, value in schema.get("properties", {}).items()}
+        return None
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        await asyncio.sleep(max(self._latency(self._rng), 0.0))
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise server_error()
+        tool = kwargs["tools"][0]["function"]
+        parameters = tool["parameters"]
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        generations = []
+        for i in range(kwargs.get("n", 1)):
+            args = self._fill(parameters, parameters.get("$defs", {}))
+            output_tokens = len(str(args)) // 4
+            usage = {"input_tokens": prompt_tokens, "output_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens}
+            message = AIMessage(content="", usage_metadata=usage, tool_calls=[{"name": tool["name"], "args": args, "id": f"call_{i}"}])  # type: ignore
+            generations.append(ChatGeneration(message=message))
+        return ChatResult(generations=generations)
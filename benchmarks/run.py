@@ -0,0 +1,292 @@
+"""Throughput benchmarks of the dataset graph with a fake LLM backend.
+
+    python -m benchmarks.run --sizes 10 100 1000
+    python -m benchmarks.run --mode response_generation --sizes 1000 \\
+        --creative-latency lognormal:1.5,0.4 --error-rate 0.02 --json bench.json
+    python -m benchmarks.run --baseline bench.json
+
+Every (mode, size) scenario runs `agent.agent.graph` in its own process and
+working directory, against a synthetic database of `size` questions, with
+`fast_llm` and `creative_llm` replaced by `FakeChatModel`s. Nothing goes over
+the network. The deployment rate limits are lifted unless `--rate-limits` is
+given, so the numbers measure the graph rather than the quota.
+
+Per scenario it reports questions per second (questions generated, answered or
+exported), p50/p99 latency of every graph node, peak RSS, and the time spent
+in database reads and write batches. With `--baseline` it exits with 1 when a
+scenario's questions per second dropped by more than `--max-regression`
+compared with an earlier `--json` report.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, TypedDict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_PREFIX = "BENCHMARK_RESULT "
+TOPIC = "Agentic AI"
+MODES = ("question_generation", "response_generation", "prompt_testing_all", "output_jsonl")
+
+# Placeholders for the Azure clients built at import; the fake models replace them.
+FAKE_ENVIRONMENT = {
+    "AZURE_OPENAI_ENDPOINT": "https://fake-llm.invalid",
+    "AZURE_OPENAI_API_KEY": "fake",
+    "AZURE_OPENAI_ENDPOINT_GPT4O": "https://fake-llm.invalid",
+    "AZURE_OPENAI_GPT4O_API_KEY": "fake",
+    "OPENAI_API_VERSION": "2025-03-01-preview",
+}
+UNLIMITED_RATES = {
+    name: "1000000000"
+    for prefix in ("GPT4O", "GPT4O_MINI", "LLM_DEFAULT")
+    for name in (f"{prefix}_RPM", f"{prefix}_TPM")
+}
+
+
+class Scenario(TypedDict):
+    mode: str
+    size: int
+    fast_latency: str
+    creative_latency: str
+    error_rate: float
+    reject_rate: float
+    output_words: int
+    list_items: int
+    seed: int
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Wall time of every graph node run, including the nodes of subgraphs."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.started: dict[UUID, tuple[str, float]] = {}
+        self.seconds: dict[str, list[float]] = defaultdict(list)
+
+    def on_chain_start(self, serialized: dict[str, Any] | None, inputs: Any, *, run_id: UUID,
+                       metadata: dict[str, Any] | None = None, **kwargs: Any):
+        node = (metadata or {}).get("langgraph_node")
+        # Runnables inside a node share its metadata; only the node's own run carries its name.
+        if node is not None and kwargs.get("name") == node:
+            self.started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id: UUID):
+        started = self.started.pop(run_id, None)
+        if started is not None:
+            node, start = started
+            self.seconds[node].append(time.perf_counter() - start)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(max(round(fraction * len(ordered) + 0.5) - 1, 0), len(ordered) - 1)]
+
+
+###### Scenario process ######
+def dataset_filename(mode: str) -> str:
+    date = datetime.now().strftime("%m-%d-%Y")
+    return f"{date}-dataset-test.db" if mode.startswith("prompt_testing") else f"{date}-dataset.db"
+
+
+def seed_scenario(scenario: Scenario):
+    from benchmarks.synthetic import QUESTIONS_PER_SUBTOPIC, seed_database, subtopics_for
+
+    mode, size = scenario["mode"], scenario["size"]
+    path = os.path.join("db", dataset_filename(mode))
+    if mode == "question_generation":
+        seed_database(path, TOPIC, max(-(-size // scenario["list_items"]), 1), seed=scenario["seed"])
+    elif mode == "response_generation":
+        seed_database(path, TOPIC, subtopics_for(size), size, seed=scenario["seed"])
+    elif mode == "prompt_testing_all":
+        seed_database(os.path.join("db", "base_dataset.db"), TOPIC, subtopics_for(size), size, answered=True, seed=scenario["seed"])
+    elif mode == "output_jsonl":
+        seed_database(path, TOPIC, max(size // QUESTIONS_PER_SUBTOPIC, 1), size, answered=True,
+                      answer_words=scenario["output_words"], seed=scenario["seed"])
+    else:
+        raise ValueError(f"Unsupported benchmark mode {mode!r}")
+
+
+def count_rows(filename: str, condition: str) -> int:
+    import sqlite3
+
+    conn = sqlite3.connect(os.path.join("db", filename))
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM questions_answers WHERE {condition};").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def count_questions(mode: str) -> int:
+    """Questions in the mode's database: all of them for question generation, the answered ones otherwise."""
+    filename = dataset_filename(mode)
+    if not os.path.exists(os.path.join("db", filename)):
+        return 0
+    return count_rows(filename, "1 = 1" if mode == "question_generation" else "answer IS NOT NULL")
+
+
+async def run_graph(scenario: Scenario, timer: NodeTimer) -> dict[str, Any]:
+    import agent.nodes as nodes
+    from agent.agent import graph
+    from benchmarks.fake_llm import FakeChatModel
+
+    options = {key: scenario[key] for key in ("error_rate", "reject_rate", "output_words", "list_items", "seed")}
+    nodes.fast_llm = FakeChatModel(deployment_name="gpt-4o-mini", temperature=0, latency=scenario["fast_latency"], **options)  # type: ignore
+    nodes.creative_llm = FakeChatModel(deployment_name="gpt-4o", temperature=0.6, latency=scenario["creative_latency"], **options)  # type: ignore
+    start = time.perf_counter()
+    result = await graph.ainvoke({"mode": scenario["mode"], "topic": TOPIC},  # type: ignore
+                                 {"recursion_limit": 10_000, "callbacks": [timer]})
+    return {
+        "seconds": time.perf_counter() - start,
+        "status": result.get("status", ""),
+        "llm_calls": nodes.fast_llm.calls + nodes.creative_llm.calls,  # type: ignore
+        "llm_errors": nodes.fast_llm.errors + nodes.creative_llm.errors,  # type: ignore
+    }
+
+
+def run_scenario(scenario: Scenario) -> dict[str, Any]:
+    from agent.db import db_stats
+
+    seed_scenario(scenario)
+    # Exports count every answered row; the other modes only the rows they add.
+    before = 0 if scenario["mode"] == "output_jsonl" else count_questions(scenario["mode"])
+    timer = NodeTimer()
+    run = asyncio.run(run_graph(scenario, timer))
+    questions = count_questions(scenario["mode"]) - before
+    databases = db_stats().values()
+    return {
+        **scenario,
+        **run,
+        "questions": questions,
+        "questions_per_second": questions / run["seconds"] if run["seconds"] else 0.0,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "db_read_seconds": sum(stats["read_seconds"] for stats in databases),
+        "db_write_seconds": sum(stats["write_seconds"] for stats in databases),
+        "nodes": {
+            node: {"calls": len(seconds), "p50_ms": percentile(seconds, 0.5) * 1000, "p99_ms": percentile(seconds, 0.99) * 1000}
+            for node, seconds in sorted(timer.seconds.items())
+        },
+    }
+
+
+###### Driver ######
+def launch(scenario: Scenario, work_dir: str, rate_limits: bool) -> dict[str, Any]:
+    """Run one scenario in a fresh process and working directory."""
+    directory = tempfile.mkdtemp(prefix=f"{scenario['mode']}-{scenario['size']}-", dir=work_dir)
+    env = {
+        **os.environ,
+        **FAKE_ENVIRONMENT,
+        **({} if rate_limits else UNLIMITED_RATES),
+        "LLM_CACHE_ENABLED": "0",
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+    }
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.run", "--scenario", json.dumps(scenario)],
+                               cwd=directory, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return {**json.loads(line.removeprefix(RESULT_PREFIX)), "directory": directory}
+    raise RuntimeError(f"Scenario {scenario['mode']}/{scenario['size']} failed (exit {completed.returncode}):\n{completed.stderr[-4000:]}")
+
+
+def print_report(results: list[dict[str, Any]]):
+    print(f"{'mode':<22}{'size':>7}{'questions':>11}{'seconds':>10}{'q/s':>10}{'llm calls':>11}{'errors':>8}"
+          f"{'rss MiB':>9}{'db read s':>11}{'db write s':>12}")
+    for result in results:
+        print(f"{result['mode']:<22}{result['size']:>7}{result['questions']:>11}{result['seconds']:>10.2f}"
+              f"{result['questions_per_second']:>10.1f}{result['llm_calls']:>11}{result['llm_errors']:>8}"
+              f"{result['peak_rss_mib']:>9.0f}{result['db_read_seconds']:>11.3f}{result['db_write_seconds']:>12.3f}")
+    for result in results:
+        print(f"\n{result['mode']} / {result['size']}: {result['status']}")
+        print(f"  {'node':<32}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        for node, stats in result["nodes"].items():
+            print(f"  {node:<32}{stats['calls']:>8}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def regressions(results: list[dict[str, Any]], baseline: list[dict[str, Any]], max_regression: float) -> list[str]:
+    previous = {(result["mode"], result["size"]): result for result in baseline}
+    found = []
+    for result in results:
+        old = previous.get((result["mode"], result["size"]))
+        if old is None or not old["questions_per_second"]:
+            continue
+        change = result["questions_per_second"] / old["questions_per_second"] - 1
+        if change < -max_regression:
+            found.append(f"{result['mode']}/{result['size']}: {old['questions_per_second']:.1f} -> "
+                         f"{result['questions_per_second']:.1f} questions/s ({change:+.0%})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Benchmark the dataset graph with a fake LLM backend.")
+    parser.add_argument("--mode", action="append", choices=MODES, help="Mode to run (repeatable). Defaults to all of them.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Questions in the synthetic databases.")
+    parser.add_argument("--fast-latency", default="lognormal:0.3,0.4", help="Latency of fast_llm calls, e.g. const:0.2 or uniform:0.1,0.5.")
+    parser.add_argument("--creative-latency", default="lognormal:1.0,0.4", help="Latency of creative_llm calls.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of LLM calls failing with a retryable 500.")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of relevance checks that reject.")
+    parser.add_argument("--output-words", type=int, default=60, help="Words of every generated string.")
+    parser.add_argument("--list-items", type=int, default=10, help="Items of every generated list, e.g. questions per set.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the configured deployment rate limits.")
+    parser.add_argument("--work-dir", help="Where scenario directories are created. Defaults to a temporary directory.")
+    parser.add_argument("--json", metavar="PATH", help="Write the results to PATH.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare with the results of an earlier --json run.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Tolerated drop in questions/s against the baseline.")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(RESULT_PREFIX + json.dumps(run_scenario(json.loads(args.scenario))), flush=True)
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="benchmarks-")
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    for mode in args.mode or MODES:
+        for size in args.sizes:
+            scenario: Scenario = {
+                "mode": mode,
+                "size": size,
+                "fast_latency": args.fast_latency,
+                "creative_latency": args.creative_latency,
+                "error_rate": args.error_rate,
+                "reject_rate": args.reject_rate,
+                "output_words": args.output_words,
+                "list_items": args.list_items,
+                "seed": args.seed,
+            }
+            print(f"Running {mode} with {size} questions...", file=sys.stderr, flush=True)
+            results.append(launch(scenario, work_dir, args.rate_limits))
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.max_regression)
+        if found:
+            print("\nRegressions:\n  " + "\n  ".join(found))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Synthetic dataset databases for the benchmarks.
+
+Rows are written with the same query functions the graph uses, so the
+databases have the graph's schema, indexes and duplicate-detection signatures.
+"""
+
+import math
+import os
+import random
+import sqlite3
+from datetime import datetime
+
+from agent.queries import create_tables, insert_questions, insert_subtopics, update_answers
+
+QUESTIONS_PER_SUBTOPIC = 10
+VOCABULARY_SIZE = 5000
+
+
+def synthetic_text(rng: random.Random, prefix: str, words: int) -> str:
+    return " ".join([prefix] + [f"w{rng.randrange(VOCABULARY_SIZE)}" for _ in range(words)])
+
+
+def seed_database(path: str, topic: str, subtopics: int, questions: int = 0, answered: bool = False,
+                  answer_words: int = 60, seed: int = 0) -> int:
+    """Create `path` with `subtopics` subtopics of `topic` and `questions` questions spread over them.
+
+    Returns the number of questions written.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    created_at = datetime.now().strftime("%m-%d-%Y_%H:%M:%S")
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.cursor()
+        create_tables(cursor)
+        insert_subtopics(cursor, topic, [f"Subtopic {i} {synthetic_text(rng, '', 3).strip()}" for i in range(subtopics)])
+        conn.commit()
+        if not questions:
+            return 0
+        cursor.execute("SELECT id FROM subtopics WHERE topic = ? ORDER BY id;", (topic,))
+        subtopic_ids = [row[0] for row in cursor.fetchall()]
+        per_subtopic = math.ceil(questions / len(subtopic_ids))
+        written = 0
+        for subtopic_id in subtopic_ids:
+            count = min(per_subtopic, questions - written)
+            if count <= 0:
+                break
+            texts = [synthetic_text(rng, f"Question {written + i}?", 12) for i in range(count)]
+            insert_questions(cursor, created_at, subtopic_id, texts, 1)
+            written += count
+        if answered:
+            cursor.execute("SELECT id FROM questions_answers ORDER BY id;")
+            update_answers(cursor, [(synthetic_text(rng, "Answer.", answer_words), 1, "creative", row[0]) for row in cursor.fetchall()])
+        conn.commit()
+        return written
+    finally:
+        conn.close()
+
+
+def subtopics_for(questions: int) -> int:
+    return max(math.ceil(questions / QUESTIONS_PER_SUBTOPIC), 1)
@@ -0,0 +1,13 @@
+import os
+
+# agent.nodes builds the Azure clients at import time; the tests swap them for
+# fake models and never reach Azure.
+for name, value in {
+    "AZURE_OPENAI_ENDPOINT": "https://fast.openai.invalid",
+    "AZURE_OPENAI_API_KEY": "test",
+    "AZURE_OPENAI_ENDPOINT_GPT4O": "https://creative.openai.invalid",
+    "AZURE_OPENAI_GPT4O_API_KEY": "test",
+    "OPENAI_API_VERSION": "2025-03-01-preview",
+    "LLM_CACHE_ENABLED": "0",
+}.items():
+    os.environ.setdefault(name, value)
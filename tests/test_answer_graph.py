@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from agent import nodes
+from agent.agent import gen_response, gen_response_cascade
+from agent.config import CASCADE_MIN_SCORE, MAX_ANSWER_ATTEMPTS
+from benchmarks.fake_llm import FakeChatModel
+
+QUESTION = {"topic": "Agentic AI", "subtopic": "Tool use", "question": "Why call tools?", "num_candidates": 2}
+
+
+class Scripted(FakeChatModel):
+    """Fake model that records each call's schema and `n`, and overrides fields of scripted schemas."""
+    calls_made: list[tuple[str, int]] = []
+    script: dict[str, dict[str, Any]] = {}
+
+    async def _agenerate(self, *args: Any, **kwargs: Any):
+        name = kwargs["tools"][0]["function"]["name"]
+        self.calls_made.append((name, kwargs.get("n", 1)))
+        result = await super()._agenerate(*args, **kwargs)
+        for generation in result.generations:
+            generation.message.tool_calls[0]["args"].update(self.script.get(name, {}))  # type: ignore
+        return result
+
+    def count(self, name: str) -> int:
+        return sum(1 for called, _ in self.calls_made if called == name)
+
+
+@pytest.fixture
+def models(monkeypatch):
+    fast = Scripted(deployment_name="gpt-4o-mini", temperature=0, output_words=6)
+    creative = Scripted(deployment_name="gpt-4o", output_words=6)
+    monkeypatch.setattr(nodes, "fast_llm", fast)
+    monkeypatch.setattr(nodes, "creative_llm", creative)
+    return fast, creative
+
+
+def test_accepted_answer_takes_one_attempt(models):
+    fast, creative = models
+    fast.script["IsRelevantAccurate"] = {"is_relevant_accurate": True}
+    state = asyncio.run(gen_response.ainvoke(QUESTION))
+    assert state["attempts"] == 1
+    assert state["best_response"] in state["responses"]
+    assert creative.calls_made == [("GenResponse", 2)]
+    assert fast.count("IsRelevantAccurate") == 1
+
+
+def test_rejections_stop_at_the_attempt_limit_and_keep_the_other_candidate(models):
+    fast, creative = models
+    fast.script["IsRelevantAccurate"] = {"is_relevant_accurate": False}
+    state = asyncio.run(gen_response.ainvoke(QUESTION))
+    assert state["attempts"] == MAX_ANSWER_ATTEMPTS
+    assert fast.count("IsRelevantAccurate") == MAX_ANSWER_ATTEMPTS
+    # Only the rejected candidate is regenerated, the other one is reused.
+    assert creative.calls_made == [("GenResponse", 2)] + [("GenResponse", 1)] * (MAX_ANSWER_ATTEMPTS - 1)
+    assert len(set(state["rejected_responses"])) == MAX_ANSWER_ATTEMPTS
+    assert not set(state["responses"]) & set(state["rejected_responses"])
+
+
+def test_good_draft_is_accepted_without_the_creative_model(models):
+    fast, creative = models
+    fast.script["DraftGrade"] = {"is_relevant_accurate": True, "score": CASCADE_MIN_SCORE}
+    state = asyncio.run(gen_response_cascade.ainvoke(QUESTION))
+    assert (state["tier"], state["attempts"]) == ("fast", 1)
+    assert creative.calls_made == []
+    assert [name for name, _ in fast.calls_made] == ["GenResponse", "DraftGrade"]
+
+
+def test_relevant_low_scoring_draft_competes_with_one_new_candidate(models):
+    fast, creative = models
+    fast.script["DraftGrade"] = {"is_relevant_accurate": True, "score": 1}
+    fast.script["IsRelevantAccurate"] = {"is_relevant_accurate": True}
+    state = asyncio.run(gen_response_cascade.ainvoke(QUESTION))
+    assert (state["tier"], state["attempts"]) == ("creative", 2)
+    assert creative.calls_made == [("GenResponse", 1)]
+
+
+def test_irrelevant_draft_escalates_with_full_candidates_up_to_the_attempt_limit(models):
+    fast, creative = models
+    fast.script["DraftGrade"] = {"is_relevant_accurate": False, "score": 5}
+    fast.script["IsRelevantAccurate"] = {"is_relevant_accurate": False}
+    state = asyncio.run(gen_response_cascade.ainvoke(QUESTION))
+    assert (state["tier"], state["attempts"]) == ("creative", 1 + MAX_ANSWER_ATTEMPTS)
+    assert creative.calls_made == [("GenResponse", 2)] + [("GenResponse", 1)] * (MAX_ANSWER_ATTEMPTS - 1)
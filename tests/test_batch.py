@@ -0,0 +1,136 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agent import db as db_module
+from agent import nodes
+from agent.batch import LocalBatchClient, build_request, chat_model_handler, read_batch_results, set_batch_client, write_batch_file
+from agent.nodes import GenResponse, pick_batch_answers, prepare_response_batch, record_batch, run_response_batch
+from agent.queries import create_tables, find_open_batch, insert_questions, insert_subtopics
+from benchmarks.fake_llm import FakeChatModel
+
+TOPIC = "Agentic AI"
+QUESTIONS = {
+    1: ["Which tools should an agent call first?", "How are tool errors reported back?"],
+    2: ["How does an agent split a goal into steps?"],
+}
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_module, "_databases", {})
+    monkeypatch.setattr(nodes, "fast_llm", FakeChatModel(deployment_name="gpt-4o-mini", temperature=0, output_words=5))
+    monkeypatch.setattr(nodes, "creative_llm", FakeChatModel(deployment_name="gpt-4o", output_words=5))
+    (tmp_path / "db").mkdir()
+    conn = sqlite3.connect(tmp_path / "db" / "batch.db")
+    create_tables(conn.cursor())
+    insert_subtopics(conn.cursor(), TOPIC, ["Tool use", "Planning"])
+    for subtopic_id, questions in QUESTIONS.items():
+        insert_questions(conn.cursor(), "", subtopic_id, questions, 1)
+    conn.commit()
+    conn.close()
+    yield "batch.db"
+    set_batch_client(None)
+    db_module.close_all()
+
+
+def failing_handler(llm, failing_questions: set[str]):
+    """Chat model handler that fails the requests whose user message mentions one of `failing_questions`."""
+    handler = chat_model_handler(llm)
+
+    async def handle(body):
+        if any(question in body["messages"][-1]["content"] for question in failing_questions):
+            raise RuntimeError("rate limited")
+        return await handler(body)
+    return handle
+
+
+def test_requests_round_trip_through_a_batch_file(tmp_path):
+    query = [SystemMessage(content="Answer."), HumanMessage(content="Why?")]
+    single = build_request("qa-1", "gpt-4o", query, GenResponse, n=1, temperature=None)
+    assert single["url"] == "/chat/completions"
+    assert single["body"]["tool_choice"]["function"]["name"] == "GenResponse"
+    assert "n" not in single["body"] and "temperature" not in single["body"]
+    multiple = build_request("qa-2", "gpt-4o", query, GenResponse, n=3, temperature=0.7)
+    assert multiple["body"]["n"] == 3 and multiple["body"]["temperature"] == 0.7
+
+    input_path = str(tmp_path / "batch" / "input.jsonl")
+    write_batch_file(input_path, [single, multiple])
+    with open(input_path, encoding="utf-8") as f:
+        assert [json.loads(line)["custom_id"] for line in f] == ["qa-1", "qa-2"]
+
+    async def run():
+        client = LocalBatchClient(chat_model_handler(FakeChatModel(output_words=3)))
+        batch_id = await client.submit(input_path)
+        assert await client.status(batch_id) == "completed"
+        await client.download(batch_id, str(tmp_path / "output.jsonl"))
+
+    asyncio.run(run())
+    results, errors = read_batch_results(str(tmp_path / "output.jsonl"), GenResponse)
+    assert errors == {}
+    assert [len(results["qa-1"]), len(results["qa-2"])] == [1, 3]
+    assert all(len(candidate.answer.split()) == 3 for candidate in results["qa-2"])
+
+
+def test_failed_and_malformed_result_lines_are_reported_as_errors(tmp_path):
+    good = {"choices": [{"message": {"tool_calls": [{"function": {"arguments": json.dumps({"answer": "Yes."})}}]}}]}
+    lines = [
+        {"custom_id": "qa-1", "response": {"status_code": 200, "body": good}, "error": None},
+        {"custom_id": "qa-2", "response": None, "error": {"message": "rate limited"}},
+        {"custom_id": "qa-3", "response": {"status_code": 500, "body": {"error": "server"}}, "error": None},
+        {"custom_id": "qa-4", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "Yes."}}]}}, "error": None},
+        {"custom_id": "qa-5", "response": {"status_code": 200, "body": {}}, "error": None},
+    ]
+    path = tmp_path / "output.jsonl"
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines) + "\n")
+
+    results, errors = read_batch_results(str(path), GenResponse)
+    assert {custom_id: [candidate.answer for candidate in candidates] for custom_id, candidates in results.items()} == {"qa-1": ["Yes."]}
+    assert sorted(errors) == ["qa-2", "qa-3", "qa-4", "qa-5"]
+    assert "rate limited" in errors["qa-2"]
+
+
+def test_open_batch_is_resumed_instead_of_resubmitted(dataset):
+    client = LocalBatchClient(failing_handler(FakeChatModel(output_words=4), {"How are tool errors reported back?"}))
+    set_batch_client(client)
+    state = {"filename_db": dataset, "topic": TOPIC, "mode": "response_generation_batch"}
+
+    async def run():
+        batch_id, input_path = await prepare_response_batch(dataset, TOPIC, state["mode"])  # type: ignore
+        assert batch_id is None
+        with open(input_path, encoding="utf-8") as f:
+            assert [json.loads(line)["custom_id"] for line in f] == ["qa-1", "qa-2", "qa-3"]
+        # The process stops right after submitting; the next run finds the batch again.
+        batch_id = await client.submit(input_path)
+        await record_batch(dataset, batch_id, TOPIC, "submitted", input_path)
+        assert await prepare_response_batch(dataset, TOPIC, state["mode"]) == (batch_id, input_path)
+
+        result = await run_response_batch(state)  # type: ignore
+        assert result["status"] == "run_response_batch success! 2 answers applied, 1 failed"
+        return batch_id
+
+    batch_id = asyncio.run(run())
+    assert list(client.outputs) == [batch_id]
+    conn = sqlite3.connect("db/batch.db")
+    assert find_open_batch(conn.cursor(), TOPIC) is None
+    rows = conn.execute("SELECT id, answer IS NOT NULL, attempts, answer_tier FROM questions_answers ORDER BY id;").fetchall()
+    assert rows == [(1, 1, 1, "batch"), (2, 0, None, None), (3, 1, 1, "batch")]
+    conn.close()
+
+
+def test_batch_answers_skip_missing_questions_and_empty_results(dataset):
+    questions = {
+        1: {"question": "Why?", "subtopic": "Tool use", "topic": TOPIC},
+        2: {"question": "How?", "subtopic": "Tool use", "topic": TOPIC},
+    }
+    results = {
+        "qa-1": [GenResponse(answer="Call the search tool first."), GenResponse(answer="Call the search tool first. ")],
+        "qa-2": [],
+        "qa-9": [GenResponse(answer="Already answered elsewhere.")],
+    }
+    answers = asyncio.run(pick_batch_answers(questions, results))  # type: ignore
+    assert answers == [("Call the search tool first.", 1, "batch", 1)]
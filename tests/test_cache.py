@@ -0,0 +1,74 @@
+import asyncio
+import sqlite3
+
+from agent import cache as cache_module
+from agent.cache import LLMCache
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_entries=100, max_age_seconds=60)
+
+    async def run():
+        assert await cache.aget("missing") is None
+        await cache.aset("key", "value")
+        assert await cache.aget("key") == "value"
+
+    try:
+        asyncio.run(run())
+        assert cache.stats() == {"hits": 1, "misses": 1, "writes": 1, "evictions": 0}
+    finally:
+        cache.close()
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_entries=100, max_age_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+
+    async def run():
+        await cache.aset("key", "value")
+        now[0] += 59
+        assert await cache.aget("key") == "value"
+        now[0] += 2
+        assert await cache.aget("key") is None
+
+    try:
+        asyncio.run(run())
+    finally:
+        cache.close()
+
+
+def test_file_is_in_wal_mode(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = LLMCache(str(path), max_entries=100, max_age_seconds=60)
+    try:
+        asyncio.run(cache.aset("key", "value"))
+    finally:
+        cache.close()
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+
+
+def test_hits_are_written_back_before_least_recently_used_eviction(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_entries=2, max_age_seconds=3600)
+    monkeypatch.setattr(cache_module, "EVICT_EVERY_N_WRITES", 3)
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+
+    async def run():
+        await cache.aset("old", "1")
+        now[0] += 1
+        await cache.aset("newer", "2")
+        now[0] += 1
+        # Only recorded in memory; the eviction below must still see it.
+        assert await cache.aget("old") == "1"
+        now[0] += 1
+        await cache.aset("newest", "3")
+        assert await cache.aget("newer") is None
+        assert await cache.aget("old") == "1"
+        assert await cache.aget("newest") == "3"
+
+    try:
+        asyncio.run(run())
+        assert cache.evictions == 1
+    finally:
+        cache.close()
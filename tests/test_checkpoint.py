@@ -0,0 +1,50 @@
+import asyncio
+import sqlite3
+from typing import Any
+
+import pytest
+
+from agent import nodes
+from agent.agent import gen_response_cascade_builder
+from agent.checkpoint import run_checkpointed
+from benchmarks.fake_llm import FakeChatModel
+
+
+class Recording(FakeChatModel):
+    schemas: list[str] = []
+
+    async def _agenerate(self, *args: Any, **kwargs: Any):
+        self.schemas.append(kwargs["tools"][0]["function"]["name"])
+        return await super()._agenerate(*args, **kwargs)
+
+
+class FailsOnce(FakeChatModel):
+    failed: bool = False
+
+    async def _agenerate(self, *args: Any, **kwargs: Any):
+        if not self.failed:
+            self.failed = True
+            raise ValueError("interrupted")
+        return await super()._agenerate(*args, **kwargs)
+
+
+def test_interrupted_escalation_resumes_without_redrafting(tmp_path, monkeypatch):
+    # Every relevance check fails, so each draft escalates to the creative model.
+    fast = Recording(deployment_name="gpt-4o-mini", temperature=0, reject_rate=1.0, output_words=5)
+    creative = FailsOnce(deployment_name="gpt-4o", output_words=5)
+    monkeypatch.setattr(nodes, "fast_llm", fast)
+    monkeypatch.setattr(nodes, "creative_llm", creative)
+    path = str(tmp_path / "checkpoints.db")
+    question = {"topic": "Agentic AI", "subtopic": "Tool use", "question": "Why?", "num_candidates": 2}
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_checkpointed(gen_response_cascade_builder, question, "cascade", path=path))
+    assert fast.schemas == ["GenResponse", "DraftGrade"]
+
+    state, _ = asyncio.run(run_checkpointed(gen_response_cascade_builder, question, "cascade", path=path))
+    assert state["tier"] == "creative"
+    # The draft and its grade came from the checkpoint; only the escalation reran.
+    assert fast.schemas.count("GenResponse") == 1
+    assert fast.schemas.count("DraftGrade") == 1
+    namespaces = {row[0] for row in sqlite3.connect(path).execute("SELECT DISTINCT checkpoint_ns FROM checkpoints;")}
+    assert namespaces == {""}
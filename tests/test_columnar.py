@@ -0,0 +1,66 @@
+import hashlib
+import json
+from datetime import datetime
+
+import pytest
+
+from agent.columnar import COLUMN_NAMES, export_columnar, read_columns
+
+# (id, topic, subtopic, subtopic_id, created_at, question, answer, attempts, answer_tier)
+ROW_GROUPS = [
+    [
+        (1, "Agentic AI", "Tool use", 1, "04-01-2025_10:00:00", "Why use tools?", "Because ünïcode ✓", 1, "fast"),
+        (2, "Agentic AI", "Planning", 2, "not a date", "How to plan?", "", 3, "creative"),
+    ],
+    [
+        (5, None, None, None, None, "Orphan question?", "Still answered", 2, None),
+    ],
+]
+
+
+def expected_columns() -> dict[str, list]:
+    rows = [row for row_group in ROW_GROUPS for row in row_group]
+    return {
+        "id": [1, 2, 5],
+        "topic": ["Agentic AI", "Agentic AI", None],
+        "subtopic": ["Tool use", "Planning", None],
+        "subtopic_id": [1, 2, None],
+        "created_at": [datetime(2025, 4, 1, 10, 0, 0), None, None],
+        "question": [row[5] for row in rows],
+        "answer": [row[6] for row in rows],
+        "answer_length": [len(row[6]) for row in rows],
+        "attempts": [1, 3, 2],
+        "answer_tier": ["fast", "creative", None],
+    }
+
+
+def export_and_check_manifest(tmp_path, use_parquet: bool) -> str:
+    base_path = str(tmp_path / "train")
+    shard, format = export_columnar(iter(ROW_GROUPS), base_path, use_parquet=use_parquet)
+    assert format == ("parquet" if use_parquet else "qacol")
+    assert shard["rows"] == 3
+    with open(shard["path"], "rb") as f:
+        assert shard["sha256"] == hashlib.sha256(f.read()).hexdigest()
+    with open(f"{base_path}.manifest.json", encoding="utf-8") as f:
+        assert json.load(f)["format"] == format
+    return shard["path"]
+
+
+def test_qacol_round_trip(tmp_path):
+    path = export_and_check_manifest(tmp_path, use_parquet=False)
+    assert path.endswith(".qacol")
+    assert read_columns(path) == expected_columns()
+
+
+def test_qacol_reads_only_the_requested_columns(tmp_path):
+    path = export_and_check_manifest(tmp_path, use_parquet=False)
+    columns = read_columns(path, ["answer_tier", "subtopic_id"])
+    assert columns == {"answer_tier": ["fast", "creative", None], "subtopic_id": [1, 2, None]}
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = export_and_check_manifest(tmp_path, use_parquet=True)
+    assert read_columns(path) == expected_columns()
+    assert list(read_columns(path, ["id"])) == ["id"]
+    assert set(read_columns(path)) == set(COLUMN_NAMES)
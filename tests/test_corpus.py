@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from agent import corpus
+from agent import db as db_module
+from agent.bm25 import idf
+from agent.corpus import index_corpus, retrieve, search_corpus
+
+
+def test_idf_stays_positive_for_common_terms():
+    assert idf(10, 10) > 0
+    assert idf(10, 9) < idf(10, 1)
+
+
+def test_terms_in_every_chunk_still_count(tmp_path):
+    (tmp_path / "a.txt").write_text("agents call tools")
+    (tmp_path / "b.txt").write_text("agents plan steps")
+    cursor = sqlite3.connect(":memory:").cursor()
+    assert index_corpus(cursor, str(tmp_path))["added"] == 2
+
+    passages = search_corpus(cursor, "agents", 2)
+    assert len(passages) == 2 and all(passage["score"] > 0 for passage in passages)
+    assert search_corpus(cursor, "agents tools", 1)[0]["source"] == "a.txt"
+
+
+def search_cost(cursor: sqlite3.Cursor, query: str, k: int) -> tuple[list[str], int]:
+    """Sources of the results and the SQLite VM instructions the search ran."""
+    steps = [0]
+
+    def count() -> int:
+        steps[0] += 1
+        return 0
+
+    cursor.connection.set_progress_handler(count, 1)
+    try:
+        return [passage["source"] for passage in search_corpus(cursor, query, k)], steps[0]
+    finally:
+        cursor.connection.set_progress_handler(None, 1)
+
+
+def test_search_cost_does_not_grow_with_common_word_chunks(tmp_path):
+    def index(filler_chunks: int) -> sqlite3.Cursor:
+        directory = tmp_path / str(filler_chunks)
+        directory.mkdir()
+        (directory / "tools.txt").write_text("Agents call external tools to fetch data.")
+        for i in range(filler_chunks):
+            (directory / f"filler{i}.txt").write_text("The agents and the data of the agents.")
+        cursor = sqlite3.connect(":memory:").cursor()
+        index_corpus(cursor, str(directory))
+        return cursor
+
+    small, large = index(20), index(400)
+    small_sources, small_cost = search_cost(small, "How do the agents use tools?", 1)
+    large_sources, large_cost = search_cost(large, "How do the agents use tools?", 1)
+    assert small_sources == large_sources == ["tools.txt"]
+    assert large_cost < small_cost * 1.2
+
+
+def test_common_terms_alone_read_a_bounded_number_of_postings(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus, "CORPUS_MAX_POSTINGS", 5)
+    for i in range(50):
+        (tmp_path / f"doc{i}.txt").write_text(f"Agents plan step {i}.")
+    cursor = sqlite3.connect(":memory:").cursor()
+    index_corpus(cursor, str(tmp_path))
+    assert len(search_corpus(cursor, "agents plan", 10)) == 5
+    assert search_corpus(cursor, "what is the", 3) == []
+
+
+@pytest.fixture
+def corpus_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_module, "_databases", {})
+    (tmp_path / "db").mkdir()
+    (tmp_path / "corpus").mkdir()
+    yield tmp_path / "corpus"
+    db_module.close_all()
+
+
+def test_every_event_loop_brings_the_index_up_to_date(corpus_dir):
+    (corpus_dir / "first.md").write_text("Retrieval grounds answers in documents.")
+
+    async def search(query: str) -> list[str]:
+        results = await asyncio.gather(*[retrieve(query, 1) for _ in range(3)])
+        return [passage["source"] for passages in results for passage in passages]
+
+    assert asyncio.run(search("retrieval")) == ["first.md"] * 3
+    (corpus_dir / "second.md").write_text("Planning splits a task into steps.")
+    assert asyncio.run(search("planning")) == ["second.md"] * 3
@@ -0,0 +1,60 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from agent.db import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    with database.write() as cursor:
+        cursor.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);")
+    yield database
+    database.close()
+
+
+def insert(name: str):
+    def query(cursor: sqlite3.Cursor) -> int:
+        cursor.execute("INSERT INTO items (name) VALUES (?);", (name,))
+        return cursor.lastrowid  # type: ignore
+    return query
+
+
+def insert_then_fail(cursor: sqlite3.Cursor):
+    cursor.execute("INSERT INTO items (name) VALUES ('half written');")
+    raise RuntimeError("job failed")
+
+
+def names(db: Database) -> list[str]:
+    with db.read() as cursor:
+        return [row[0] for row in cursor.execute("SELECT name FROM items ORDER BY id;")]
+
+
+def test_failed_job_is_rolled_back_without_undoing_the_rest_of_its_batch(db):
+    async def run() -> list[asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        jobs = [(query, loop, loop.create_future()) for query in (insert("a"), insert_then_fail, insert("a"), insert("b"))]
+        db._write_batch(jobs)
+        await asyncio.gather(*[future for _, _, future in jobs], return_exceptions=True)
+        return [future for _, _, future in jobs]
+
+    first, failed, duplicate, last = asyncio.run(run())
+    assert first.result() == 1
+    assert isinstance(failed.exception(), RuntimeError)
+    assert isinstance(duplicate.exception(), sqlite3.IntegrityError)
+    assert last.result() == 2
+    assert names(db) == ["a", "b"]
+    assert db.write_batches == 1 and db.write_jobs == 4
+
+
+def test_concurrent_writes_are_committed_and_readable(db):
+    async def run() -> list[int]:
+        return await asyncio.gather(*[db.awrite(insert(f"item {i}")) for i in range(20)])
+
+    row_ids = asyncio.run(run())
+    assert sorted(row_ids) == list(range(1, 21))
+    assert asyncio.run(db.aread(lambda cursor: cursor.execute("SELECT COUNT(*) FROM items;").fetchone()[0])) == 20
+    with db.read() as cursor:
+        assert cursor.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
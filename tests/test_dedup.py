@@ -0,0 +1,95 @@
+import random
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from agent import dedup
+from agent.dedup import band_buckets, find_duplicate, question_signature, rebuild_index
+from agent.queries import create_tables, insert_questions, insert_subtopics
+
+QUESTION = "How do autonomous agents decide which external tool to call for a multi step task?"
+REWORDED = "How do autonomous agents decide which external tool to call for a multi step task today?"
+UNRELATED = "What is the boiling point of water at the top of a high mountain compared with sea level?"
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    conn = sqlite3.connect(tmp_path / "dataset.db")
+    cursor = conn.cursor()
+    create_tables(cursor)
+    insert_subtopics(cursor, "Agentic AI", ["Tool use", "Planning"])
+    insert_subtopics(cursor, "Robotics", ["Manipulation"])
+    conn.commit()
+    yield cursor
+    conn.close()
+
+
+def duplicate_of(cursor: sqlite3.Cursor) -> dict[str, int | None]:
+    cursor.execute("SELECT id, duplicate_of FROM questions_answers ORDER BY id;")
+    return {f"q{qa_id}": original for qa_id, original in cursor.fetchall()}
+
+
+def lookup(cursor: sqlite3.Cursor, question: str, topic: str | None) -> int | None:
+    signature = question_signature(question)
+    return find_duplicate(cursor, signature, band_buckets(signature), topic)
+
+
+def test_find_duplicate_matches_near_duplicates_within_the_topic(cursor):
+    assert insert_questions(cursor, "", 1, [QUESTION, UNRELATED], 1) == 0
+    assert lookup(cursor, REWORDED, "Agentic AI") == 1
+    assert lookup(cursor, UNRELATED + " Explain.", "Agentic AI") == 2
+    assert lookup(cursor, REWORDED, "Robotics") is None
+    assert lookup(cursor, REWORDED, None) == 1
+    assert lookup(cursor, "Completely different words about cooking pasta at home tonight", "Agentic AI") is None
+
+
+def test_duplicates_are_flagged_per_topic_unless_configured(cursor, monkeypatch):
+    insert_questions(cursor, "", 1, [QUESTION], 1)
+    assert insert_questions(cursor, "", 2, [REWORDED], 1) == 1
+    assert insert_questions(cursor, "", 3, [REWORDED], 1) == 0
+    assert duplicate_of(cursor) == {"q1": None, "q2": 1, "q3": None}
+
+    monkeypatch.setattr(dedup, "DUPLICATE_ACROSS_TOPICS", True)
+    assert insert_questions(cursor, "", 3, [QUESTION], 1) == 1
+
+
+def test_rebuild_streams_chunks_and_matches_incremental_indexing(cursor, tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, "REBUILD_CHUNK_SIZE", 2)
+    insert_questions(cursor, "", 1, [QUESTION, UNRELATED], 1)
+    insert_questions(cursor, "", 2, [REWORDED], 1)
+    insert_questions(cursor, "", 3, [QUESTION, REWORDED], 1)
+    cursor.connection.commit()
+    incremental = duplicate_of(cursor)
+    assert incremental == {"q1": None, "q2": None, "q3": 1, "q4": None, "q5": 4}
+
+    assert rebuild_index(str(tmp_path / "dataset.db"), processes=2) == (3, 2)
+    assert duplicate_of(cursor) == incremental
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT qa_id) FROM question_lsh;")
+    assert cursor.fetchone() == (3 * dedup.DUPLICATE_LSH_BANDS, 3)
+
+
+def rebuild_peak_memory(path: str, count: int) -> int:
+    """Peak traced memory of rebuilding a database of `count` distinct questions."""
+    conn = sqlite3.connect(path)
+    create_tables(conn.cursor())
+    insert_subtopics(conn.cursor(), "Agentic AI", ["Tool use"])
+    rng = random.Random(count)
+    conn.executemany("INSERT INTO questions_answers (created_at, subtopic_id, question) VALUES ('', 1, ?);",
+                     [(" ".join(f"w{rng.randrange(5000)}" for _ in range(6)) + "?",) for _ in range(count)])
+    conn.commit()
+    conn.close()
+    tracemalloc.start()
+    try:
+        assert rebuild_index(path, processes=1) == (count, 0)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_rebuild_memory_does_not_grow_with_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, "REBUILD_CHUNK_SIZE", 10)
+    small = rebuild_peak_memory(str(tmp_path / "small.db"), 40)
+    large = rebuild_peak_memory(str(tmp_path / "large.db"), 200)
+    # Keeping the signatures in memory would cost over 1 KiB per question.
+    assert large < small + 100 * 1024
@@ -0,0 +1,81 @@
+import csv
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+
+from agent.export import export_incremental, export_rows
+from agent.queries import create_tables, insert_questions, insert_subtopics, update_answers, update_watermark
+
+ROWS = [(f"Question {i}?", f"Answer {i}, with a comma.") for i in range(5)]
+
+
+def read_manifest(base_path: str) -> dict:
+    with open(f"{base_path}.manifest.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sha256_of(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_shards_roll_over_by_row_count_and_manifest_hashes_match(tmp_path):
+    base_path = str(tmp_path / "train")
+    paths, rows = export_rows(ROWS, base_path, "jsonl", compress=True, max_rows=2, max_bytes=0)
+    assert rows == 5
+    assert [os.path.basename(path) for path in paths] == ["train-00000.jsonl.gz", "train-00001.jsonl.gz", "train-00002.jsonl.gz"]
+
+    manifest = read_manifest(base_path)
+    assert manifest["rows"] == 5 and manifest["format"] == "jsonl" and manifest["compressed"]
+    assert [shard["rows"] for shard in manifest["shards"]] == [2, 2, 1]
+    for path, shard in zip(paths, manifest["shards"]):
+        assert shard["path"] == os.path.basename(path)
+        assert shard["bytes"] == os.path.getsize(path)
+        assert shard["sha256"] == sha256_of(path)
+
+    lines = [json.loads(line) for path in paths for line in gzip.open(path, "rt", encoding="utf-8")]
+    assert [(line["instruction"], line["response"]) for line in lines] == ROWS
+
+
+def test_shards_roll_over_by_size_and_csv_shards_repeat_the_header(tmp_path):
+    base_path = str(tmp_path / "train")
+    paths, _ = export_rows(ROWS, base_path, "csv", compress=False, max_rows=0, max_bytes=40)
+    assert len(paths) > 1
+    exported = []
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            header, *rows = list(csv.reader(f))
+        assert header == ["Question", "Answer"]
+        exported.extend(tuple(row) for row in rows)
+    assert exported == ROWS
+    assert [shard["sha256"] for shard in read_manifest(base_path)["shards"]] == [sha256_of(path) for path in paths]
+
+
+def test_unsharded_and_empty_exports_write_one_file(tmp_path):
+    paths, rows = export_rows([], str(tmp_path / "empty"), "jsonl", compress=False, max_rows=0, max_bytes=0)
+    assert rows == 0
+    assert paths == [str(tmp_path / "empty.jsonl")]
+    assert read_manifest(str(tmp_path / "empty"))["shards"][0]["sha256"] == hashlib.sha256(b"").hexdigest()
+
+
+def test_incremental_export_only_writes_new_answers(tmp_path):
+    conn = sqlite3.connect(tmp_path / "dataset.db")
+    cursor = conn.cursor()
+    create_tables(cursor)
+    insert_subtopics(cursor, "Agentic AI", ["Tool use"])
+    insert_questions(cursor, "", 1, ["First question about tools?", "Second question about planning?"], 1)
+    update_answers(cursor, [("First answer", 1, "creative", 1)])
+
+    paths, rows, watermark = export_incremental(cursor, "nightly", str(tmp_path / "first"), "jsonl", compress=False, max_rows=0, max_bytes=0)
+    assert rows == 1
+    update_watermark(cursor, "nightly", watermark, "2025-04-01T00:00:00")
+    update_answers(cursor, [("Second answer", 1, "creative", 2)])
+
+    paths, rows, _ = export_incremental(cursor, "nightly", str(tmp_path / "second"), "jsonl", compress=False, max_rows=0, max_bytes=0)
+    assert rows == 1
+    with open(paths[0], encoding="utf-8") as f:
+        assert json.loads(f.readline())["response"] == "Second answer"
+    assert read_manifest(str(tmp_path / "second"))["incremental"] is True
+    conn.close()
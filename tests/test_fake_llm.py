@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+
+from benchmarks.fake_llm import FakeChatModel, parse_latency
+
+
+class Answer(BaseModel):
+    text: str
+    score: int
+    sources: list[str]
+
+
+def call_kwargs() -> dict:
+    tool = convert_to_openai_tool(Answer)
+    return {"tools": [tool], "tool_choice": {"type": "function", "function": {"name": tool["function"]["name"]}}}
+
+
+def test_sync_and_async_calls_fill_the_schema():
+    model = FakeChatModel(output_words=3, list_items=2)
+    message = model.invoke([HumanMessage("Why?")], **call_kwargs())
+    answer = Answer.model_validate(message.tool_calls[0]["args"])  # type: ignore
+    assert len(answer.text.split()) == 3 and len(answer.sources) == 2 and 1 <= answer.score <= 5
+
+    message = asyncio.run(model.ainvoke([HumanMessage("Why?")], **call_kwargs()))
+    Answer.model_validate(message.tool_calls[0]["args"])  # type: ignore
+    assert model.calls == 2
+
+
+def test_sync_call_inside_a_running_loop_is_rejected():
+    model = FakeChatModel()
+
+    async def run():
+        model.invoke([HumanMessage("Why?")], **call_kwargs())
+
+    with pytest.raises(RuntimeError, match="ainvoke"):
+        asyncio.run(run())
+
+
+def test_latency_specs():
+    assert parse_latency("const:0.2")(None) == 0.2  # type: ignore
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
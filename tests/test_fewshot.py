@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any
+
+import pytest
+from langchain_core.messages import BaseMessage
+
+from agent import fewshot, nodes
+from agent.fewshot import few_shot_stats, question_request, render_question_request, select_examples
+from agent.prompts import GENERATE_QUESTION_PROMPT, QUESTION_EXAMPLES
+from benchmarks.fake_llm import FakeChatModel
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(fewshot, "stats", dict.fromkeys(fewshot.stats, 0))
+    render_question_request.cache_clear()
+    yield
+    render_question_request.cache_clear()
+
+
+def test_examples_of_the_subtopic_come_first_in_relevance():
+    examples = select_examples("Agentic AI", "Multi-Agent Systems", k=3)
+    assert len(examples) == 3
+    assert ("Agentic AI", "Multi-Agent Systems") in [(topic, subtopic) for topic, subtopic, _ in examples]
+    assert all(topic == "Agentic AI" for topic, _, _ in examples)
+    # Selected examples keep their original order.
+    assert examples == sorted(examples, key=QUESTION_EXAMPLES.index)
+
+    privacy = select_examples("Responsible AI", "Privacy Protection", k=1)
+    assert [subtopic for _, subtopic, _ in privacy] == ["Privacy Protection"]
+
+
+def test_zero_or_too_many_examples_select_all_of_them():
+    assert select_examples("Agentic AI", "Memory", k=0) == QUESTION_EXAMPLES
+    assert select_examples("Agentic AI", "Memory", k=len(QUESTION_EXAMPLES)) == QUESTION_EXAMPLES
+
+
+def test_requests_are_rendered_once_and_savings_are_counted():
+    first = question_request("Agentic AI", "Multi-Agent Systems", num_questions=50)
+    assert question_request("Agentic AI", "Multi-Agent Systems", num_questions=50) == first
+    assert "How does multi-agent AI interaction differ from single-agent systems?" in first
+    assert first.endswith("generate 50 questions:\nTopic: Agentic AI, Subtopic: Multi-Agent Systems")
+
+    stats = few_shot_stats()
+    assert (stats["renders"], stats["calls"]) == (1, 2)
+    assert 0 < stats["sent_tokens"] < stats["full_tokens"]
+    assert stats["saved_tokens"] == stats["full_tokens"] - stats["sent_tokens"]
+    assert stats["saved_tokens_per_call"] == stats["saved_tokens"] / 2
+
+
+def test_question_generation_keeps_the_system_prompt_static(monkeypatch):
+    queries: list[list[BaseMessage]] = []
+
+    class Recording(FakeChatModel):
+        async def _agenerate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any):
+            queries.append(messages)
+            return await super()._agenerate(messages, *args, **kwargs)
+
+    monkeypatch.setattr(nodes, "creative_llm", Recording(output_words=3, list_items=2))
+    for subtopic in ("Multi-Agent Systems", "Reward Functions"):
+        asyncio.run(nodes.generate_question_sets({"topic": "Agentic AI", "subtopic": subtopic, "num_candidates": 1}))  # type: ignore
+
+    system, human = zip(*[(query[0].content, query[1].content) for query in queries])
+    assert system[0] == system[1] == GENERATE_QUESTION_PROMPT
+    assert "Subtopic: Multi-Agent Systems" in human[0] and "Subtopic: Reward Functions" in human[1]
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langgraph.graph import END, START, StateGraph
+from pydantic import BaseModel
+
+from agent import llm as llm_module
+from agent.llm import ainvoke_structured, record_usage, usage_stats
+from benchmarks.fake_llm import FakeChatModel
+
+
+class Verdict(BaseModel):
+    ok: bool
+
+
+class CachedPrefix(FakeChatModel):
+    """Fake model reporting the first `cached` prompt tokens of every call as served from the prompt cache."""
+    cached: int = 0
+
+    async def _agenerate(self, *args: Any, **kwargs: Any):
+        result = await super()._agenerate(*args, **kwargs)
+        for generation in result.generations:
+            generation.message.usage_metadata["input_token_details"] = {"cache_read": self.cached}  # type: ignore
+        return result
+
+
+class State(TypedDict):
+    verdict: bool
+
+
+@pytest.fixture(autouse=True)
+def fresh_usage(monkeypatch):
+    monkeypatch.setattr(llm_module, "usage", {})
+
+
+def test_cache_reads_are_attributed_to_the_calling_node():
+    model = CachedPrefix(deployment_name="judge", temperature=0.5, cached=64)
+    query = [SystemMessage(content="Static instructions. " * 100), HumanMessage(content="Is this fine?")]
+
+    async def judge(state: State):
+        return {"verdict": (await ainvoke_structured(model, Verdict, query)).ok}
+
+    builder = StateGraph(State)
+    builder.add_node("judge", judge)
+    builder.add_edge(START, "judge")
+    builder.add_edge("judge", END)
+    graph = builder.compile()
+
+    async def run():
+        for _ in range(2):
+            await graph.ainvoke({"verdict": False})
+        model.cached = 0
+        await graph.ainvoke({"verdict": False})
+        # Outside a graph run the node is unknown.
+        await ainvoke_structured(model, Verdict, query)
+
+    asyncio.run(run())
+    stats = usage_stats()
+    assert set(stats) == {"judge", "unknown"}
+    judge_stats = stats["judge"]
+    assert (judge_stats["calls"], judge_stats["cache_hit_calls"], judge_stats["cached_tokens"]) == (3, 2, 128)
+    assert judge_stats["cached_ratio"] == 128 / judge_stats["prompt_tokens"]
+    assert stats["unknown"]["calls"] == 1 and stats["unknown"]["cached_tokens"] == 0
+
+
+def test_openai_style_token_usage_is_read_when_messages_have_no_usage_metadata():
+    result = LLMResult(
+        generations=[[ChatGeneration(message=AIMessage(content=""))]],
+        llm_output={"token_usage": {"prompt_tokens": 1200, "completion_tokens": 30, "prompt_tokens_details": {"cached_tokens": 1024}}},
+    )
+    assert record_usage("grade_draft", result, 0.5) == (1200, 1024, 30)
+    stats = usage_stats()["grade_draft"]
+    assert stats["mean_seconds_cache_hit"] == 0.5 and stats["mean_seconds_cache_miss"] == 0.0
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from agent import ratelimit
+from agent.ratelimit import DeploymentLimiter, TokenBucket
+
+
+def frozen_clock(monkeypatch) -> list[float]:
+    now = [100.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_reservations_queue_up_as_debt(monkeypatch):
+    now = frozen_clock(monkeypatch)
+    bucket = TokenBucket(60)  # one unit per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == 2.0
+    assert bucket.reserve(3) == 5.0
+    now[0] += 5
+    assert bucket.reserve(1) == 1.0
+
+
+def test_credit_is_capped_and_debit_delays_later_reservations(monkeypatch):
+    frozen_clock(monkeypatch)
+    bucket = TokenBucket(60)
+    bucket.credit(1000)
+    assert bucket.tokens == 60
+    bucket.credit(-70)
+    assert bucket.reserve(5) == 15.0
+
+
+def test_waiters_sleep_concurrently():
+    bucket = TokenBucket(6000)  # 100 units per second
+    bucket.reserve(6000)
+
+    async def run() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*[bucket.take(5) for _ in range(4)])
+        return time.perf_counter() - start
+
+    # 20 units of debt take 0.2s to pay off, whatever the number of waiters.
+    assert 0.15 < asyncio.run(run()) < 0.35
+
+
+def test_cancelled_waiter_gives_its_units_back(monkeypatch):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+
+    async def run():
+        waiter = asyncio.ensure_future(bucket.take(30))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    assert bucket.tokens > -1
+
+
+def test_reconcile_corrects_the_token_budget(monkeypatch):
+    frozen_clock(monkeypatch)
+
+    async def run() -> DeploymentLimiter:
+        limiter = DeploymentLimiter("test", rpm=100, tpm=1000, max_concurrency=2)
+        async with limiter.acquire(400):
+            pass
+        limiter.reconcile(400, 250)
+        return limiter
+
+    limiter = asyncio.run(run())
+    # 400 reserved up front, 150 of it given back once the real usage is known.
+    assert limiter.tokens.tokens == 750
+    assert limiter.stats()["estimated_tokens"] == 400
+    assert limiter.stats()["actual_tokens"] == 250
@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from langchain_core.exceptions import OutputParserException
+
+from agent import retry
+from agent.retry import CircuitBreaker, CircuitOpenError, call_with_retry, retry_after_seconds
+
+
+def rate_limit_error(headers: dict[str, str]) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://example.invalid/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_retry_after_parsing():
+    assert retry_after_seconds(rate_limit_error({"retry-after": "7"})) == 7.0
+    assert retry_after_seconds(rate_limit_error({"retry-after-ms": "250", "retry-after": "7"})) == 0.25
+    assert retry_after_seconds(rate_limit_error({"retry-after-ms": "soon", "retry-after": "3"})) == 3.0
+    assert retry_after_seconds(rate_limit_error({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert retry_after_seconds(rate_limit_error({})) is None
+    assert retry_after_seconds(CircuitOpenError("gpt-4o", 12.5)) == 12.5
+    assert retry_after_seconds(ValueError("no response")) is None
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("gpt-4o", failure_threshold=2, cooldown_seconds=10)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as shed:
+        breaker.before_call()
+    assert shed.value.retry_after == 10
+
+    now[0] += 10
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # Only one probe goes out while the deployment's health is unknown.
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    now[0] += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "times_opened": 2, "shed_calls": 2}
+
+
+def failing_call(errors: list[BaseException]):
+    calls = []
+
+    async def call():
+        calls.append(None)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    return call, calls
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(retry, "backoff_delay", lambda attempt, error: 0.0)
+    monkeypatch.setattr(retry, "_breakers", {})
+
+
+def test_transient_errors_are_retried(no_backoff):
+    call, calls = failing_call([rate_limit_error({"retry-after": "1"}), asyncio.TimeoutError()])
+    assert asyncio.run(call_with_retry("gpt-4o", call)) == "ok"
+    assert len(calls) == 3
+
+
+def test_parse_errors_are_only_retried_for_sampled_calls(no_backoff):
+    call, calls = failing_call([OutputParserException("bad tool call")])
+    assert asyncio.run(call_with_retry("gpt-4o", call)) == "ok"
+    assert len(calls) == 2
+
+    call, calls = failing_call([OutputParserException("bad tool call")])
+    with pytest.raises(OutputParserException):
+        asyncio.run(call_with_retry("gpt-4o-mini", call, deterministic=True))
+    assert len(calls) == 1
+    assert retry.breaker_for("gpt-4o-mini").consecutive_failures == 0
@@ -0,0 +1,130 @@
+import asyncio
+import io
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agent import runner
+from agent.runner import EXIT_FAILED, EXIT_INTERRUPTED, EXIT_OK, EXIT_PARTIAL, exit_code, parse_args, print_events, run_modes, run_topics
+
+OPTIONS: runner.RunOptions = {"resume": False, "checkpoint_path": "", "recursion_limit": 100}
+
+
+def result(topic: str, mode: str, outcome: str = "succeeded", failed_items: int = 0) -> runner.ModeResult:
+    return {"topic": topic, "mode": mode, "outcome": outcome, "status": "", "failed_items": failed_items, "seconds": 0.0}
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Replace graph runs with a fake that fails the modes listed in `failing` and records every run."""
+    calls: list[tuple[str, str]] = []
+    failing: set[tuple[str, str]] = set()
+
+    async def fake_run_mode(compiled, topic, mode, options, events):
+        calls.append((topic, mode))
+        return result(topic, mode, "failed" if (topic, mode) in failing else "succeeded")
+
+    monkeypatch.setattr(runner, "run_mode", fake_run_mode)
+    monkeypatch.setattr(runner, "set_quota_share", lambda share: None)
+    return calls, failing
+
+
+def test_exit_codes():
+    assert exit_code([]) == EXIT_OK
+    assert exit_code([result("A", "question_generation")]) == EXIT_OK
+    assert exit_code([result("A", "response_generation", failed_items=2)]) == EXIT_PARTIAL
+    assert exit_code([result("A", "response_generation", failed_items=2), result("B", "question_generation", "failed")]) == EXIT_FAILED
+    assert exit_code([result("A", "output_jsonl", "skipped")]) == EXIT_OK
+
+
+def test_parse_args_validation():
+    args = parse_args(["-m", "question_generation", "-m", "output_jsonl", "-t", "Agentic AI"])
+    assert args.mode == ["question_generation", "output_jsonl"] and args.topic == ["Agentic AI"]
+    assert args.processes is None and not args.resume
+    for argv in ([], ["-m", "unknown"], ["-m", "question_generation", "-t", "Unknown"], ["-m", "question_generation", "-p", "0"]):
+        with pytest.raises(SystemExit) as raised:
+            parse_args(argv)
+        assert raised.value.code == 2
+
+
+def test_print_events_throttles_repeats_but_not_errors_or_completion():
+    events = queue.Queue()
+    for event in [
+        ("A", "m", "start", "starting"),
+        ("A", "m", "node", "call_gen"),
+        ("A", "m", "node", "call_gen"),
+        ("A", "m", "node", "save"),
+        ("A", "m", "node", "call_gen"),
+        ("A", "m", "progress", {"answered": 1, "failed": 0, "total": 3}),
+        ("A", "m", "progress", {"answered": 1, "failed": 1, "total": 3, "qa_id": 7, "subtopic_id": 2, "error": "ValueError()"}),
+        ("A", "m", "progress", {"answered": 2, "failed": 1, "total": 3}),
+        ("B", "m", "node", "call_gen"),
+        ("A", "m", "error", "RuntimeError: boom"),
+        None,
+    ]:
+        events.put(event)
+    stream = io.StringIO()
+    print_events(events, time.monotonic(), interval=60, stream=stream)
+    lines = [line.split("] ", 1)[1] for line in stream.getvalue().splitlines()]
+    assert lines == [
+        "A | m | starting",
+        "A | m | call_gen",
+        "A | m | save",
+        "A | m | call_gen (3)",
+        "A | m | answered 1/3, 1 failed (question 7 of subtopic 2: ValueError())",
+        "A | m | answered 2/3, 1 failed",
+        "B | m | call_gen",
+        "A | m | FAILED RuntimeError: boom",
+    ]
+
+
+def test_modes_after_a_failure_are_skipped(runs):
+    calls, failing = runs
+    failing.add(("A", "question_generation"))
+    results = asyncio.run(run_modes("A", ["subtopic_generation", "question_generation", "response_generation", "output_jsonl"], OPTIONS, queue.Queue()))
+    assert calls == [("A", "subtopic_generation"), ("A", "question_generation")]
+    assert [r["outcome"] for r in results] == ["succeeded", "failed", "skipped", "skipped"]
+    assert results[2]["status"] == "an earlier mode failed"
+
+
+def test_parallel_topics_are_reported_in_topic_order(monkeypatch):
+    delays = {"A": 0.2, "B": 0.1, "C": 0.0}
+
+    def fake_run_topic(topic, modes, options, events, quota_share):
+        time.sleep(delays[topic])
+        return [result(topic, mode) for mode in modes]
+
+    monkeypatch.setattr(runner, "run_topic", fake_run_topic)
+    monkeypatch.setattr(runner, "ProcessPoolExecutor", lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    results = run_topics(["A", "B", "C"], ["question_generation", "response_generation"], OPTIONS, 3, queue.Queue())
+    assert [(r["topic"], r["mode"]) for r in results] == [
+        (topic, mode) for topic in "ABC" for mode in ("question_generation", "response_generation")
+    ]
+
+
+def test_global_modes_run_once_after_the_topics(runs, monkeypatch):
+    calls, _ = runs
+    summaries: list[list[runner.ModeResult]] = []
+    monkeypatch.setattr(runner, "print_summary", summaries.append)
+    argv = ["-m", "output_jsonl", "-m", "question_generation", "-t", "Agentic AI", "-t", "Responsible AI", "-p", "1"]
+    assert runner.main(argv) == EXIT_OK
+    assert calls == [("Agentic AI", "question_generation"), ("Responsible AI", "question_generation"), ("*", "output_jsonl")]
+    assert [(r["topic"], r["mode"]) for r in summaries[0]][-1] == ("*", "output_jsonl")
+    assert runner.thread_id_for(runner.GLOBAL_TOPIC, "output_jsonl").endswith(":*:output_jsonl")
+
+
+def test_global_modes_are_skipped_after_a_failed_topic(runs):
+    calls, failing = runs
+    failing.add(("Agentic AI", "question_generation"))
+    assert runner.main(["-m", "question_generation", "-m", "output_csv", "-t", "Agentic AI", "-p", "1"]) == EXIT_FAILED
+    assert calls == [("Agentic AI", "question_generation")]
+
+
+def test_interrupt_exits_with_130(runs, monkeypatch):
+    def interrupted(*args):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(runner, "run_topics", interrupted)
+    assert runner.main(["-m", "question_generation", "-t", "Agentic AI", "-p", "1"]) == EXIT_INTERRUPTED
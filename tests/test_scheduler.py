@@ -0,0 +1,52 @@
+import asyncio
+
+from agent.scheduler import run_sliding_window
+
+
+def test_window_is_never_exceeded_and_refills_as_items_finish():
+    in_flight = 0
+    peak = 0
+    started: list[int] = []
+    results: dict[int, int | None] = {}
+
+    async def worker(item: int) -> int:
+        nonlocal in_flight, peak
+        started.append(item)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # Item 0 is slow; the others must keep flowing past it.
+        await asyncio.sleep(0.2 if item == 0 else 0.01)
+        in_flight -= 1
+        return item * 2
+
+    async def on_done(item: int, result: int | None, error: BaseException | None):
+        results[item] = result
+
+    counts = asyncio.run(run_sliding_window(range(10), worker, 3, on_done))
+    assert counts == (10, 0)
+    assert peak == 3
+    assert started == list(range(10))
+    assert results == {item: item * 2 for item in range(10)}
+    # Everything else finished while the slow item held its slot.
+    assert list(results)[-1] == 0
+
+
+def test_failures_and_cancelled_workers_are_reported():
+    errors: dict[int, BaseException | None] = {}
+
+    async def worker(item: int) -> int:
+        if item == 1:
+            raise ValueError("bad item")
+        if item == 2:
+            asyncio.current_task().cancel()  # type: ignore
+            await asyncio.sleep(1)
+        return item
+
+    async def on_done(item: int, result: int | None, error: BaseException | None):
+        errors[item] = error
+
+    counts = asyncio.run(run_sliding_window(range(4), worker, 2, on_done))
+    assert counts == (2, 2)
+    assert errors[0] is None and errors[3] is None
+    assert isinstance(errors[1], ValueError)
+    assert isinstance(errors[2], asyncio.CancelledError)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from agent import selection
+from agent.selection import BestCandidate, CandidateRanking, select_best
+
+CANDIDATES = [
+    "Agents call tools to fetch fresh data before answering.",
+    "Planning breaks a large task into ordered steps.",
+    "Memory lets an agent recall earlier turns of the conversation.",
+]
+
+
+@pytest.fixture
+def judge(monkeypatch):
+    """Replace the judge call with canned responses and record which schemas were asked for."""
+    monkeypatch.setattr(selection, "stats", dict.fromkeys(selection.stats, 0))
+    calls: list[str] = []
+    responses: dict[type, object] = {}
+
+    async def fake_ainvoke_structured(llm, schema, query):
+        calls.append(schema.__name__)
+        return responses[schema]
+
+    monkeypatch.setattr(selection, "ainvoke_structured", fake_ainvoke_structured)
+    return calls, responses
+
+
+def test_out_of_range_index_is_clamped(judge):
+    calls, responses = judge
+    responses[BestCandidate] = BestCandidate(best_index=7)
+    assert asyncio.run(select_best(None, "Pick one.", CANDIDATES, "Answer", strategy="index")) == 2
+    responses[BestCandidate] = BestCandidate(best_index=0)
+    assert asyncio.run(select_best(None, "Pick one.", CANDIDATES, "Answer", strategy="index")) == 0
+    assert calls == ["BestCandidate", "BestCandidate"]
+
+
+def test_ranking_skips_invalid_numbers_and_falls_back_to_the_first_candidate(judge):
+    _, responses = judge
+    responses[CandidateRanking] = CandidateRanking(ranking=[9, -1, 2, 1])
+    assert asyncio.run(select_best(None, "Rank them.", CANDIDATES, "Answer", strategy="ranking")) == 1
+    responses[CandidateRanking] = CandidateRanking(ranking=[])
+    assert asyncio.run(select_best(None, "Rank them.", CANDIDATES, "Answer", strategy="ranking")) == 0
+
+
+def test_tournament_maps_pair_winners_back_to_candidates(judge):
+    calls, responses = judge
+    responses[BestCandidate] = BestCandidate(best_index=2)
+    # Round one: (0, 1) -> 1 with 2 on a bye; round two: (1, 2) -> 2.
+    assert asyncio.run(select_best(None, "Pick one.", CANDIDATES, "Answer", strategy="tournament")) == 2
+    assert len(calls) == 2
+
+
+def test_near_identical_candidates_skip_the_judge(judge):
+    calls, _ = judge
+    candidates = [CANDIDATES[0], CANDIDATES[0] + " ", CANDIDATES[0].upper()]
+    assert asyncio.run(select_best(None, "Pick one.", candidates, "Answer")) == 0
+    assert asyncio.run(select_best(None, "Pick one.", candidates[:1], "Answer")) == 0
+    assert calls == []
+    assert selection.stats == {"selections": 2, "judge_calls_avoided": 1, "candidates_collapsed": 2}
+
+
+def test_unknown_strategy_is_rejected(judge):
+    with pytest.raises(ValueError, match="strategy"):
+        asyncio.run(select_best(None, "Pick one.", CANDIDATES, "Answer", strategy="vote"))
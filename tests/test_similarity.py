@@ -0,0 +1,39 @@
+from agent.similarity import MinHash, jaccard, near_duplicate_groups, shingles, stable_hash, text_similarity
+
+TEXT = "Agents call external tools to fetch fresh data before they answer a question."
+OTHER = "Planning splits a large goal into small ordered steps that can be checked."
+
+
+def test_jaccard_of_identical_disjoint_and_empty_text():
+    assert text_similarity(TEXT, TEXT.upper() + "  ") == 1.0
+    assert text_similarity(TEXT, OTHER) == 0.0
+    assert jaccard(set(), set()) == 1.0
+    assert jaccard(shingles(TEXT), set()) == 0.0
+
+
+def test_short_text_is_one_shingle():
+    assert shingles("Why tools?", size=3) == {stable_hash("why tools")}
+    assert shingles("", size=3) == set()
+
+
+def test_minhash_estimates_follow_jaccard():
+    minhash = MinHash(num_perm=128)
+    signature = minhash.signature(shingles(TEXT))
+    assert len(signature) == 128
+    assert MinHash.estimate(signature, minhash.signature(shingles(TEXT.lower()))) == 1.0
+    assert MinHash.estimate(signature, minhash.signature(shingles(OTHER))) < 0.05
+
+    edited = TEXT.replace("fresh data", "recent facts")
+    exact = text_similarity(TEXT, edited)
+    assert abs(MinHash.estimate(signature, minhash.signature(shingles(edited))) - exact) < 0.15
+
+
+def test_signatures_are_stable_for_the_same_seed():
+    assert MinHash(16, seed=7).signature(shingles(TEXT)) == MinHash(16, seed=7).signature(shingles(TEXT))
+    assert MinHash(16, seed=7).signature(shingles(TEXT)) != MinHash(16, seed=8).signature(shingles(TEXT))
+
+
+def test_near_duplicate_groups_keep_the_first_of_each_group():
+    texts = [TEXT, OTHER, TEXT + " ", OTHER.lower(), "Memory keeps earlier turns."]
+    assert near_duplicate_groups(texts, threshold=0.9) == [0, 1, 4]
+    assert near_duplicate_groups(texts, threshold=0.0) == [0]
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from agent import cache as cache_module
+from agent import tools
+from agent.cache import LLMCache
+from agent.tools import FakeSearchBackend, search, search_many, set_search_backend
+
+
+class CountingBackend(FakeSearchBackend):
+    """Fake backend that also records the peak number of concurrent searches."""
+
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def search(self, query: str, topic: str, max_results: int):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().search(query, topic, max_results)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "search_cache.db"), max_entries=100, max_age_seconds=60, table="search_cache")
+    monkeypatch.setattr(tools, "search_cache", cache)
+    monkeypatch.setattr(tools, "SEARCH_CACHE_ENABLED", True)
+    monkeypatch.setattr(tools, "stats", dict.fromkeys(tools.stats, 0))
+    backend = CountingBackend(latency=0.05)
+    set_search_backend(backend)
+    yield backend
+    set_search_backend(None)
+    cache.close()
+
+
+def test_results_are_cached_until_they_expire(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+
+    async def run():
+        first = await search("agent  memory", "general", 2)
+        # Whitespace differences hit the same cache entry.
+        assert await search("agent memory", "general", 2) == first
+        assert backend.calls == 1
+        now[0] += 61
+        assert await search("agent memory", "general", 2) is not None
+        assert backend.calls == 2
+
+    asyncio.run(run())
+    assert tools.stats["cache_hits"] == 1
+
+
+def test_concurrent_identical_queries_share_one_request(backend):
+    async def run():
+        return await asyncio.gather(*[search("agent memory", "news", 3) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert backend.calls == 1
+    assert all(result == results[0] for result in results)
+    assert tools.stats["collapsed"] == 4
+
+
+def test_search_many_keeps_query_order_under_the_concurrency_cap(backend):
+    queries = [f"query {i}" for i in range(10)]
+    results = asyncio.run(search_many(queries, "general", max_results=1, concurrency=3))
+    assert [result[0]["content"] for result in results] == [f"Result 1 for {query!r} (general)." for query in queries]  # type: ignore
+    assert backend.calls == 10
+    assert backend.peak == 3
@@ -0,0 +1,83 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from agent import db as db_module
+from agent.queries import create_tables, insert_questions, insert_subtopics
+from agent.writer import AnswerWriter
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_module, "_databases", {})
+    (tmp_path / "db").mkdir()
+    conn = sqlite3.connect(tmp_path / "db" / "writer.db")
+    conn.execute("CREATE TABLE answers (id INTEGER PRIMARY KEY, answer TEXT NOT NULL);")
+    conn.commit()
+    conn.close()
+    yield "writer.db"
+    db_module.close_all()
+
+
+def test_batches_commit_in_order(dataset):
+    async def run() -> list[int]:
+        writer = AnswerWriter(dataset, flush_interval=60, max_batch=100)
+        futures = [writer.enqueue("INSERT INTO answers (answer) VALUES (?);", (f"a{i}",)) for i in range(3)]
+        await writer.flush()
+        return [future.result() for future in futures]
+
+    assert asyncio.run(run()) == [1, 2, 3]
+
+
+def test_flush_raises_errors_of_unawaited_futures(dataset):
+    async def run():
+        writer = AnswerWriter(dataset, flush_interval=60, max_batch=1)
+        # max_batch=1 makes the flusher take this batch before flush() is called.
+        writer.enqueue("INSERT INTO answers (answer) VALUES (?);", (None,))
+        await asyncio.sleep(0.05)
+        assert not writer.pending
+        with pytest.raises(sqlite3.IntegrityError):
+            await writer.flush()
+        # The error is reported once; later flushes start clean.
+        writer.enqueue("INSERT INTO answers (answer) VALUES (?);", ("ok",))
+        await writer.flush()
+
+    asyncio.run(run())
+
+
+def test_flush_raises_errors_of_queued_statements(dataset):
+    async def run():
+        writer = AnswerWriter(dataset, flush_interval=60, max_batch=100)
+        ok = writer.enqueue("INSERT INTO answers (answer) VALUES (?);", ("ok",))
+        bad = writer.enqueue("INSERT INTO missing (answer) VALUES (?);", ("bad",))
+        with pytest.raises(sqlite3.OperationalError):
+            await writer.flush()
+        # The batch is written as one transaction, so the good statement fails too.
+        assert isinstance(ok.exception(), sqlite3.OperationalError)
+        assert bad.exception() is ok.exception()
+
+    asyncio.run(run())
+
+
+def test_answer_ids_are_reserved_without_waiting_for_a_flush(dataset):
+    conn = sqlite3.connect("db/writer.db")
+    create_tables(conn.cursor())
+    insert_subtopics(conn.cursor(), "Agentic AI", ["Tool use"])
+    insert_questions(conn.cursor(), "", 1, ["Why use tools?"], 1)
+    conn.commit()
+
+    async def run() -> list[int]:
+        writer = AnswerWriter(dataset, flush_interval=60, max_batch=100)
+        qa_ids = list(await asyncio.gather(*[writer.reserve_answer_id() for _ in range(3)]))
+        futures = [writer.insert_answer(qa_id, "", f"Question {qa_id}?", "Answer.", 1, 1, "fast") for qa_id in qa_ids]
+        assert not any(future.done() for future in futures)
+        await writer.flush()
+        assert [future.result() for future in futures] == qa_ids
+        return qa_ids
+
+    # Concurrent first reservations share one read and still get distinct ids.
+    assert sorted(asyncio.run(run())) == [2, 3, 4]
+    assert [row[0] for row in conn.execute("SELECT id FROM questions_answers ORDER BY id;")] == [1, 2, 3, 4]
+    conn.close()